@@ -0,0 +1,204 @@
+""" Benchmarks of the fetch, conversion, subsampling and rendering hot paths.
+
+Run from the benchmarks directory:
+
+    python bench_hot_paths.py --sizes 1e5 1e6
+    python bench_hot_paths.py --sizes 1e5 1e6 --save-baseline
+
+Every case reports throughput (points/s) and peak traced memory, and is compared against baseline.json.
+A case slower than the baseline by more than the tolerance, or using more memory than the memory tolerance allows,
+is reported as a regression and the run exits with 1.
+FetchLidar.get_dep runs readers.ept over a local EPT fixture and needs pdal; FetchLidar.get_dep:cached serves the
+same request from a TileCache, timing the cache read and conversion without pdal.
+"""
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import argparse
+import importlib.util
+import tempfile
+import tracemalloc
+import numpy as np
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+sys.path.append(os.path.abspath(os.path.join('../tests')))
+from vis import Vis
+from bounds import Bounds
+from config import Config
+from fetch_lidar import FetchLidar
+from gpd_helper import GPDHelper
+from point_cloud import PointCloud
+from sub_sampler import SubSampler
+from tile_cache import TileCache
+from ept_fixture import make_ept_fixture, make_points
+
+BASELINE = Path(__file__).parent / "baseline.json"
+BOUNDS = (-10436900, 5148000, -10435900, 5149000)
+EPSG = 3857
+VOXEL_SIZE = 5
+EPT_REGION = "BENCH_EPT"
+
+
+def get_structured_array(points: np.ndarray) -> np.ndarray:
+  """ Packs points into the structured layout returned by pdal.Pipeline.arrays.
+  """
+  array = np.empty(len(points), dtype=[("X", float), ("Y", float), ("Z", float),
+                                       ("Intensity", np.uint16), ("Classification", np.uint8)])
+  array["X"], array["Y"], array["Z"] = points[:, 0], points[:, 1], points[:, 2]
+  array["Intensity"] = 0
+  array["Classification"] = 2
+  return array
+
+
+def measure(function, repeat: int) -> tuple:
+  """ Times a function, then runs it once more under tracemalloc so tracing does not distort the timings.
+
+  Returns:
+      tuple: best wall time in seconds and peak traced memory in bytes
+  """
+  times = []
+  for _ in range(repeat):
+    gc.collect()
+    start = time.perf_counter()
+    function()
+    times.append(time.perf_counter() - start)
+  gc.collect()
+  tracemalloc.start()
+  function()
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return min(times), peak
+
+
+def get_fetch_request() -> tuple:
+  """ Bounds and crop polygon covering the whole benchmark cloud.
+  """
+  xmin, ymin, xmax, ymax = BOUNDS
+  polygon_str = f"POLYGON(({xmin} {ymin}, {xmin} {ymax}, {xmax} {ymax}, {xmax} {ymin}, {xmin} {ymin}))"
+  return Bounds(xmin, xmax, ymin, ymax), polygon_str
+
+
+def get_cases(n: int, ept_path: Path) -> dict:
+  """ Builds the benchmark cases for n points. Inputs are created up front and are not part of the timings.
+
+  Returns:
+      dict: case name to a function without arguments
+  """
+  points = make_points(n, BOUNDS)
+  array = get_structured_array(points)
+  helper = GPDHelper(EPSG, EPSG)
+  sampler = SubSampler(EPSG, EPSG, PointCloud.from_xyz(points, EPSG))
+  df = helper.get_dep([array])
+  # decimating a PointCloud only takes a strided view, the GeoDataFrame path extracts and rebuilds the points
+  df_sampler = SubSampler(EPSG, EPSG, df)
+  vis = Vis(df)
+  cases = {
+      "GPDHelper.get_dep": lambda: helper.get_dep([array]),
+      "SubSampler.decimation": lambda: df_sampler.decimation(20),
+      "SubSampler.grid_barycenter": lambda: sampler.grid_barycenter(VOXEL_SIZE),
+      "SubSampler.grid_candidate_center": lambda: sampler.grid_candidate_center(VOXEL_SIZE),
+      "Vis.get_points": vis.get_points,
+  }
+
+  bounds, polygon_str = get_fetch_request()
+  cache = TileCache(ept_path / f"cache_{n}", max_bytes=2 ** 40)
+  cached = FetchLidar(epsg=EPSG, as_point_cloud=True, cache=cache, profile="raw", in_memory=True)
+  pipe = cached.get_pipeline_definition(bounds.get_bound_str(), polygon_str, EPT_REGION,
+                                        EPT_REGION + "_" + bounds.get_bound_name())
+  cache.put(cache.get_key(EPT_REGION, bounds, pipe, EPSG), [array])
+  cases["FetchLidar.get_dep:cached"] = lambda: cached.get_dep(bounds, polygon_str, EPT_REGION)
+
+  if importlib.util.find_spec("pdal") is None:
+    print("pdal is not available, skipping FetchLidar.get_dep")
+    return cases
+  make_ept_fixture(ept_path / EPT_REGION, n, BOUNDS)
+  Config.USGS_3DEP_PUBLIC_DATA_PATH = str(ept_path) + "/"
+  fetcher = FetchLidar(epsg=EPSG, as_point_cloud=True, cache=None, profile="raw", in_memory=True)
+  cases["FetchLidar.get_dep"] = lambda: fetcher.get_dep(bounds, polygon_str, EPT_REGION)
+  return cases
+
+
+def run(sizes: list, repeat: int) -> dict:
+  """ Runs every case for every size.
+
+  Returns:
+      dict: "<case>:<n>" to seconds, points_per_s and peak_bytes
+  """
+  results = {}
+  ept_path = Path(tempfile.mkdtemp())
+  try:
+    for n in sizes:
+      for name, function in get_cases(n, ept_path).items():
+        seconds, peak = measure(function, repeat)
+        results[f"{name}:{n}"] = {'seconds': seconds, 'points_per_s': n / seconds, 'peak_bytes': peak}
+        print(f"{name:<34} {n:>12,d} pts  {n / seconds:>14,.0f} pts/s  {peak / 1024 ** 2:>10,.1f} MiB")
+  finally:
+    shutil.rmtree(ept_path, ignore_errors=True)
+  return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float, memory_tolerance: float) -> list:
+  """ Finds cases whose throughput dropped below the baseline by more than the tolerance,
+      or whose peak memory grew above it by more than the memory tolerance.
+
+  Returns:
+      list: (case, message)
+  """
+  regressions = []
+  for case, result in results.items():
+    if case not in baseline:
+      print(f"no baseline for {case}")
+      continue
+    expected = baseline[case]
+    if result['points_per_s'] < expected['points_per_s'] * (1 - tolerance):
+      regressions.append((case, f"{result['points_per_s']:,.0f} pts/s, baseline {expected['points_per_s']:,.0f} pts/s"))
+    # a small allowance keeps cases with almost no allocations from failing on noise
+    if result['peak_bytes'] > expected['peak_bytes'] * (1 + memory_tolerance) + 2 ** 20:
+      regressions.append((case, f"{result['peak_bytes']:,d} bytes peak, baseline {expected['peak_bytes']:,d} bytes"))
+  return regressions
+
+
+def main() -> int:
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--sizes", nargs="+", type=float, default=[1e5, 1e6],
+                      help="point cloud sizes, up to 1e8 (needs ~10 GB of memory)")
+  parser.add_argument("--repeat", type=int, default=3, help="timed runs per case, the best is kept")
+  parser.add_argument("--baseline", type=Path, default=BASELINE)
+  parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+  parser.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop, 0.2 is 20%%")
+  parser.add_argument("--memory-tolerance", type=float, default=0.2, help="allowed peak memory growth, 0.2 is 20%%")
+  parser.add_argument("--output", type=Path, help="also write the results as json")
+  args = parser.parse_args()
+
+  results = run([int(n) for n in args.sizes], args.repeat)
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(results, f, indent=2)
+  if args.save_baseline:
+    baseline = {}
+    if args.baseline.exists():
+      with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    baseline.update(results)
+    with open(args.baseline, 'w') as f:
+      json.dump(baseline, f, indent=2, sort_keys=True)
+      f.write("\n")
+    print(f"baseline saved to {args.baseline}")
+    return 0
+
+  if not args.baseline.exists():
+    print(f"no baseline at {args.baseline}, run with --save-baseline first")
+    return 0
+  with open(args.baseline, 'r') as f:
+    regressions = compare(results, json.load(f), args.tolerance, args.memory_tolerance)
+  for case, message in regressions:
+    print(f"REGRESSION {case}: {message}")
+  return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -6,6 +6,12 @@ class Config:
   ROOT_PATH = Path("../")
   REPO = "https://github.com/eandualem/PythonLidar"
   LOG_FILE = ROOT_PATH / "log/PythonLidara.log"
+  # better to have too much log than not enough
+  LOG_LEVEL = "DEBUG"
+  # levels of single subsystems by logger name, e.g. {"TileCache": "WARNING"}
+  LOG_LEVELS = {}
+  # info records per second of per-request and per-tile loggers
+  LOG_RATE_LIMIT = 5
   DATA_PATH = ROOT_PATH / "data/"
   ASSETS_PATH = ROOT_PATH / "assets/"
   LAZ_PATH = DATA_PATH / "laz"
@@ -13,3 +19,36 @@ class Config:
   SHP_PATH = DATA_PATH / "shp"
   IMG_PATH = DATA_PATH / "img"
   USGS_3DEP_PUBLIC_DATA_PATH = "https://s3-us-west-2.amazonaws.com/usgs-lidar-public/"
+  FETCH_WORKERS = None
+  FETCH_POLL_INTERVAL = 0.5
+  METADATA_WORKERS = 32
+  METADATA_CHECKPOINT = DATA_PATH / "usgs_3dep_metadata.checkpoint.jsonl"
+  CHUNK_SIZE = 1_000_000
+  # threads reprojecting coordinate chunks, None for a single thread
+  TRANSFORM_WORKERS = None
+  # points per run of the spatial index of LAZ files, the default LAZ chunk size
+  LAZ_INDEX_CHUNK_SIZE = 50_000
+  CACHE_PATH = DATA_PATH / "cache"
+  CACHE_MAX_BYTES = 10 * 1024 ** 3
+  TILE_SIZE = 500
+  TILE_BUFFER = 20
+  JOBS_PATH = DATA_PATH / "jobs"
+  # most points fetched by one pipeline, and estimates above which requests are rejected
+  PLAN_POINT_BUDGET = 50_000_000
+  PLAN_MAX_POINTS = 2_000_000_000
+  # edge length in meters (EPSG:3857) of the cells grouping the features of a batch fetch into one read
+  BATCH_CLUSTER_SIZE = 1000
+  LOD_LEVELS = 3
+  PREVIEW_POINT_BUDGET = 100_000
+  # cell edge length of rasters gridded from points, and cells per edge of a tile of a parallel run
+  RASTER_RESOLUTION = 1.0
+  RASTER_TILE_SIZE = 1024
+  # worker processes of voxel grid sampling, and the smallest cloud split between them
+  SAMPLER_WORKERS = 1
+  SAMPLER_PARALLEL_MIN_POINTS = 1_000_000
+  # points per leaf of KD-trees and threads of neighbor queries, -1 uses every core
+  KDTREE_LEAF_SIZE = 16
+  KDTREE_WORKERS = -1
+  # grid cells along the longer side of a heat map, and most points drawn in a 3D view
+  RENDER_BINS = 1000
+  RENDER_POINT_BUDGET = 500_000
@@ -0,0 +1,104 @@
+import numpy as np
+from pathlib import Path
+from bounds import Bounds
+from lazy_import import lazy_import
+from point_reader import get_laspy_dimension, get_structured_points
+
+laspy = lazy_import("laspy")
+
+# laszip layers holding a dimension, other layers are not decompressed
+DIMENSION_LAYERS = {
+    "classification": "CLASSIFICATION",
+    "intensity": "INTENSITY",
+    "scan_angle": "SCAN_ANGLE",
+    "user_data": "USER_DATA",
+    "point_source_id": "POINT_SOURCE_ID",
+    "gps_time": "GPS_TIME",
+    "red": "RGB",
+    "green": "RGB",
+    "blue": "RGB",
+    "nir": "NIR",
+    "synthetic": "FLAGS",
+    "key_point": "FLAGS",
+    "withheld": "FLAGS",
+    "overlap": "FLAGS",
+    "scan_direction_flag": "FLAGS",
+    "edge_of_flight_line": "FLAGS",
+}
+
+
+class CopcPointReader:
+  """ Reads a local Cloud Optimized Point Cloud like a local EPT resource: bounds and level of detail queries
+      only read and decompress the octree nodes they need, found through the COPC hierarchy and read by byte range.
+  """
+
+  def __init__(self, path: Path) -> None:
+    """
+    Args:
+        path (Path): .copc.laz file, e.g. written by the "copc" pipeline profile.
+    """
+    self.path = Path(path)
+    with laspy.CopcReader.open(self.path) as reader:
+      self.header = reader.header
+      self.info = reader.copc_info
+
+  def _get_selection(self, dimensions: list):
+    """ Decompresses X, Y, Z and returns plus the layers of the requested dimensions.
+    """
+    selection = laspy.DecompressionSelection.base() | laspy.DecompressionSelection.Z
+    for dimension in dimensions:
+      layer = DIMENSION_LAYERS.get(get_laspy_dimension(dimension))
+      if layer is not None:
+        selection |= laspy.DecompressionSelection[layer]
+    return selection
+
+  def _get_bounds(self, bounds: Bounds):
+    if bounds is None:
+      return None
+    return laspy.copc.Bounds(mins=np.array([bounds.xmin, bounds.ymin]),
+                             maxs=np.array([bounds.xmax, bounds.ymax]))
+
+  def _get_levels(self, level, resolution: float):
+    if isinstance(level, int):
+      return range(level, level + 1)
+    if level is None and resolution is not None:
+      # same depth selection as EptResource.get_depth_end, a resolution at or above the root spacing reads the root only
+      return range(0, max(1, int(np.ceil(np.log2(self.info.spacing / resolution) - 1e-9)) + 1))
+    return level
+
+  def get_nodes(self, bounds: Bounds = None, level=None, resolution: float = None) -> list:
+    """ Lists the octree nodes a query would read, without reading any point.
+
+    Args:
+        bounds (Bounds, optional): Area in the coordinates of the file. Defaults to None, the whole file.
+        level (int | range, optional): Octree level(s) to read. Defaults to None, every level.
+        resolution (float, optional): Coarsest point spacing to read, selects levels like readers.ept. Defaults to None.
+
+    Returns:
+        list: dicts with key (level, x, y, z), points and bytes of every node
+    """
+    with laspy.CopcReader.open(self.path) as reader:
+      query_bounds = self._get_bounds(bounds)
+      if query_bounds is not None:
+        query_bounds = query_bounds.ensure_3d(reader.header.mins, reader.header.maxs)
+      nodes = laspy.copc.load_octree_for_query(reader.source, reader.copc_info, reader.root_page,
+                                               query_bounds, self._get_levels(level, resolution))
+    return [{'key': (n.key.level, n.key.x, n.key.y, n.key.z), 'points': n.point_count, 'bytes': n.byte_size}
+            for n in nodes if n.point_count > 0]
+
+  def read(self, bounds: Bounds = None, level=None, resolution: float = None, dimensions: list = None) -> np.ndarray:
+    """ Reads the points of the octree nodes overlapping bounds, clipped to bounds.
+
+    Args:
+        bounds (Bounds, optional): Area in the coordinates of the file, edges included. Defaults to None, the whole file.
+        level (int | range, optional): Octree level(s) to read, 0 is the coarsest. Defaults to None, every level.
+        resolution (float, optional): Coarsest point spacing to read, selects levels like readers.ept. Defaults to None.
+        dimensions (list, optional): Dimensions besides X, Y and Z, PDAL or laspy names. Defaults to None.
+
+    Returns:
+        np.ndarray: Structured array of scaled X, Y, Z and the requested dimensions
+    """
+    dimensions = list(dimensions or [])
+    with laspy.CopcReader.open(self.path, decompression_selection=self._get_selection(dimensions)) as reader:
+      record = reader.query(self._get_bounds(bounds), level=self._get_levels(level, resolution))
+    return get_structured_points(record, dimensions)
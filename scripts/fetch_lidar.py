@@ -1,13 +1,109 @@
-import pdal
+import os
+import math
+import multiprocessing
+import multiprocessing.connection
+import time
 import json
+import shapely
+import numpy as np
 import pandas as pd
-import geopandas as gpd
 from bounds import Bounds
 from config import Config
 from log import get_logger
 from gpd_helper import GPDHelper
 from file_handler import FileHandler
+from pathlib import Path
+from tile_cache import TileCache
+from pipeline_builder import PipelineBuilder
+from point_cloud import PointCloud
+from profiler import PipelineProfiler, measure_stage
+from metadata_index import MetadataIndex, get_shared_index
+from lazy_import import lazy_import
+from transform import transform_xy, transform_geometries
 from shapely.geometry import Polygon
+from tiling import Tile, TileJob, TilePlanner
+from query_planner import QueryPlanner
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+pdal = lazy_import("pdal")
+
+_worker_fetch_lidar = None
+
+
+def _init_worker(options: dict) -> None:
+  """ Creates one FetchLidar per worker process so the metadata is loaded once per process.
+  """
+  global _worker_fetch_lidar
+  _worker_fetch_lidar = FetchLidar(**options)
+
+
+def _fetch_region(bounds: Bounds, polygon_str: str, region: str, resolution: float = None):
+  """ Runs FetchLidar.get_dep inside a worker process.
+  """
+  return _worker_fetch_lidar.get_dep(bounds, polygon_str, region, resolution)
+
+
+def _run_region(connection, options: dict, bounds: Bounds, polygon_str: str, region: str,
+                resolution: float = None) -> None:
+  """ Fetches one region in a worker process of its own and sends (succeeded, result or error message) back.
+  """
+  try:
+    _init_worker(options)
+    connection.send((True, _fetch_region(bounds, polygon_str, region, resolution)))
+  except Exception as e:
+    connection.send((False, f"{type(e).__name__}: {e}"))
+  finally:
+    connection.close()
+
+
+def _start_region(options: dict, bounds: Bounds, polygon_str: str, region: str, resolution: float = None) -> tuple:
+  """ Starts _run_region in a new process.
+
+  Returns:
+      tuple: the process and the receiving end of its pipe
+  """
+  context = multiprocessing.get_context()
+  receiver, sender = context.Pipe(duplex=False)
+  process = context.Process(target=_run_region, daemon=True,
+                            args=(sender, options, bounds, polygon_str, region, resolution))
+  process.start()
+  sender.close()
+  return process, receiver
+
+
+def _receive_region(process, receiver) -> tuple:
+  """ Waits for the result of a process started by _start_region.
+
+  Returns:
+      tuple: whether the fetch succeeded and its result or error message
+  """
+  try:
+    succeeded, data = receiver.recv()
+  except EOFError:
+    succeeded, data = False, None
+  receiver.close()
+  process.join()
+  if not succeeded and data is None:
+    data = f"worker exited with code {process.exitcode}"
+  return succeeded, data
+
+
+def _stop_region(process, receiver) -> None:
+  """ Stops a process started by _start_region, a running pipeline cannot be cancelled otherwise.
+  """
+  process.terminate()
+  process.join()
+  receiver.close()
+
+
+def _fetch_tile(tile: Tile, region: str) -> PointCloud:
+  """ Fetches the buffered area of a tile inside a worker process and clips the buffer off.
+  """
+  cloud = _worker_fetch_lidar.get_dep(tile.buffered, tile.polygon_str, region)
+  if cloud is None:
+    raise RuntimeError(f"fetching tile {tile.id} of {region} failed")
+  return tile.clip(cloud, _worker_fetch_lidar._input_epsg)
 
 
 class FetchLidar:
@@ -16,17 +112,49 @@ class FetchLidar:
       For more details on how pipelines are defined; see http://www.pdal.io/pipeline.htm
   """
 
-  def __init__(self, epsg: int = 26915):
+  def __init__(self, epsg: int = 26915, dimensions: list = None, as_point_cloud: bool = False,
+               cache: TileCache = None, profile="default", in_memory: bool = False,
+               profiler: PipelineProfiler = None):
     """ 
     Args:
         epsg (int, optional): Input coordinate reference system. Defaults to 26915.
+        dimensions (list, optional): Extra PDAL dimensions kept as columns of the fetched data,
+            e.g. gpd_helper.EXTRA_DIMENSIONS. Defaults to None.
+        as_point_cloud (bool, optional): Return fetched data as PointCloud instead of GeoDataFrame. Defaults to False.
+        cache (TileCache, optional): Cache serving repeated fetches from local disk. Defaults to None.
+        profile (str | list, optional): Pipeline profile, see pipeline_builder.PROFILES. Defaults to "default".
+        in_memory (bool, optional): Skip the LAS/GDAL writer stages. Defaults to False.
+        profiler (PipelineProfiler, optional): Records stage timings, point counts and memory of every fetch.
+            Defaults to None.
     """
     self._input_epsg = 3857
     self.output_epsg = epsg
+    self.dimensions = dimensions
+    self.as_point_cloud = as_point_cloud
+    self.cache = cache
+    self.profile = profile
+    self.in_memory = in_memory
+    self.profiler = profiler
     self._file_handler = FileHandler()
     self._logger = get_logger("GetData")
-    self._metadata = self._file_handler.read_csv("usgs_3dep_metadata")
+    self._request_logger = get_logger("GetData.requests", rate=Config.LOG_RATE_LIMIT)
+    self._metadata_index = get_shared_index()
+    self._metadata = self._metadata_index.metadata
     self._gdf_helper = GPDHelper(self._input_epsg, self.output_epsg)
+    self._pipeline_builder = PipelineBuilder(self._file_handler.read_json("usgs_3dep_pipeline"))
+
+  def _get_worker_options(self, **overrides) -> dict:
+    """ Constructor arguments recreating this fetcher inside a worker process.
+    """
+    options = {'epsg': self.output_epsg,
+               'dimensions': self.dimensions,
+               'as_point_cloud': self.as_point_cloud,
+               'cache': self.cache,
+               'profile': self.profile,
+               'in_memory': self.in_memory,
+               'profiler': self.profiler}
+    options.update(overrides)
+    return options
 
   def get_pipeline(self, bounds: str, polygon_str: str, region: str, filename: str):
     """ Loads Pipeline template from JSON file and 
@@ -41,34 +169,49 @@ class FetchLidar:
     Returns:
         pdal pipeline object
     """
-    pipe = self._file_handler.read_json("usgs_3dep_pipeline")
-    pipe['pipeline'][0]['filename'] = Config.USGS_3DEP_PUBLIC_DATA_PATH + \
-        region + "/ept.json"
-    pipe['pipeline'][0]['bounds'] = bounds
-    pipe['pipeline'][1]['polygon'] = polygon_str
-    pipe['pipeline'][6]['out_srs'] = f'EPSG:{self.output_epsg}'
-    pipe['pipeline'][7]['filename'] = str(
-        Config.LAZ_PATH / str(filename + ".laz"))
-    pipe['pipeline'][8]['filename'] = str(
-        Config.TIF_PATH / str(filename + ".tif"))
-    return pdal.Pipeline(json.dumps(pipe))
-
-  def get_bound_metadata(self, bounds: Bounds) -> pd.DataFrame:
+    return pdal.Pipeline(json.dumps(self.get_pipeline_definition(bounds, polygon_str, region, filename)))
+
+  def get_pipeline_definition(self, bounds: str, polygon_str: str, region: str, filename: str,
+                              profile=None, in_memory: bool = None, resolution: float = None) -> dict:
+    """ Assembles the stages of the pipeline template for a profile and fills them in, see get_pipeline.
+
+    Args:
+        profile (str | list, optional): Pipeline profile, see pipeline_builder.PROFILES. Defaults to the fetcher's profile.
+        in_memory (bool, optional): Skip the LAS/GDAL writer stages. Defaults to the fetcher's setting.
+        resolution (float, optional): readers.ept resolution in meters, only octree levels at least this
+            dense are read. Defaults to None, reading at full density.
+
+    Returns:
+        dict: pipeline definition
+    """
+    options = {
+        'read_data': {'filename': Config.USGS_3DEP_PUBLIC_DATA_PATH + region + "/ept.json",
+                      'bounds': bounds},
+        'crop': {'polygon': polygon_str},
+        'reprojection': {'out_srs': f'EPSG:{self.output_epsg}'},
+        'writers_las': {'filename': str(Config.LAZ_PATH / str(filename + ".laz"))},
+        'writers_gdal': {'filename': str(Config.TIF_PATH / str(filename + ".tif"))},
+        'writers_copc': {'filename': str(Config.LAZ_PATH / str(filename + ".copc.laz"))},
+    }
+    if resolution is not None:
+      options['read_data']['resolution'] = resolution
+    return self._pipeline_builder.build(self.profile if profile is None else profile,
+                                        self.in_memory if in_memory is None else in_memory,
+                                        options)
+
+  def get_bound_metadata(self, bounds: Bounds, predicate: str = "contains") -> pd.DataFrame:
     """ Searches for regions that satisfy input polygon boundary.
 
     Args:
         bounds (Bounds): Geometry object describing the boundary of interest for fetching point cloud data
+        predicate (str, optional): "contains" for regions enclosing the boundary,
+            "intersects" to also include regions that partially overlap it. Defaults to "contains".
 
     Returns:
-        pd.DataFrame: Resource metadata for regions enclosing the given boundary.
+        pd.DataFrame: Resource metadata for regions matching the given boundary.
     """
 
-    filtered_df = self._metadata.loc[
-        (self._metadata['xmin'] <= bounds.xmin)
-        & (self._metadata['xmax'] >= bounds.xmax)
-        & (self._metadata['ymin'] <= bounds.ymin)
-        & (self._metadata['ymax'] >= bounds.ymax)
-    ]
+    filtered_df = self._metadata_index.query(bounds, predicate)
     return filtered_df[["filename", "region", "year"]]
 
   def check_valid_bound(self, bounds: Bounds, regions: list) -> bool:
@@ -90,47 +233,290 @@ class FetchLidar:
 
     return True
 
-  def get_dep(self, bounds: Bounds, polygon_str: str, region: list) -> gpd.GeoDataFrame:
+  def get_dep(self, bounds: Bounds, polygon_str: str, region: list, resolution: float = None):
     """ Executes pdal pipeline and fetches point cloud data from a public repository.
-        Using GDfHelper class creates Geopandas data frame containing geometry and elevation of the point cloud data.
+        Using GDfHelper class creates Geopandas data frame containing geometry and elevation of the point cloud data,
+        or a PointCloud when the fetcher was created with as_point_cloud.
 
     Args:
         bounds (Bounds): Geometry object describing the boundary of interest for fetching point cloud data
         polygon_str (str): Geometry object describing the boundary of the requested location.
         region (list): Point cloud data location for a specific boundary on the AWS cloud storage EPT resource. 
+        resolution (float, optional): Coarsest point spacing in meters to fetch, see get_resolution. Defaults to None.
 
     Returns:
-        gpd.GeoDataFrame: Geopandas data frame containing geometry and elevation
+        gpd.GeoDataFrame | PointCloud: Geopandas data frame containing geometry and elevation
     """
     filename = region + "_" + bounds.get_bound_name()
-    pl = self.get_pipeline(bounds.get_bound_str(),
-                           polygon_str, region, filename)
+    if resolution is not None:
+      filename += f"_r{resolution:g}"
+    pipe = self.get_pipeline_definition(bounds.get_bound_str(),
+                                        polygon_str, region, filename, resolution=resolution)
+    record = None
+    if self.profiler is not None:
+      record = self.profiler.start(region, bounds.get_bound_name(), self.profile)
     try:
-      pl.execute()
-      dep_data = self._gdf_helper.get_dep(pl.arrays)
-      self._logger.info(f"successfully read geodata: {filename}")
+      arrays = self._execute(pipe, region, bounds, record)
+      points = sum(len(a) for a in arrays)
+      conversion = "PointCloud.from_arrays" if self.as_point_cloud else "GPDHelper.get_dep"
+      with measure_stage(record, conversion, points_in=points) as stage:
+        if self.as_point_cloud:
+          dep_data = PointCloud.from_arrays(arrays, self.output_epsg, self.dimensions)
+        else:
+          dep_data = self._gdf_helper.get_dep(arrays, self.dimensions)
+        stage['points_out'] = len(dep_data)
+      if record is not None:
+        self.profiler.finish(record, len(dep_data))
+      self._request_logger.info(f"successfully read geodata: {filename}")
       return dep_data
-    except RuntimeError as e:
+    except Exception as e:
+      # failed fetches are exported too, they are often the slow ones
+      if record is not None:
+        self.profiler.finish(record, 0, error=f"{type(e).__name__}: {e}")
+      if not isinstance(e, RuntimeError):
+        raise
       self._logger.exception(f"error reading geodata, error: {e}")
 
-  def fetch_lidar_data(self, polygon: Polygon, regions: list) -> list:
+  def iter_dep(self, bounds: Bounds, polygon_str: str, region: str, chunk_size: int = None,
+               resolution: float = None):
+    """ Streams the output of the pdal pipeline as chunks instead of materializing it, see get_dep.
+        Streamable pipelines run in pdal's stream mode, so memory is bounded by the chunk size.
+        Pipelines with stages that need every point at once, like filters.smrf of the ground profiles,
+        are executed in full and their output is handed out in chunks.
+        With a cache, chunks are stored as they pass and the entry is added once the stream completes.
+
+    Args:
+        bounds (Bounds): Geometry object describing the boundary of interest for fetching point cloud data
+        polygon_str (str): Geometry object describing the boundary of the requested location.
+        region (str): Point cloud data location on the AWS cloud storage EPT resource.
+        chunk_size (int, optional): Most points per chunk. Defaults to Config.CHUNK_SIZE.
+        resolution (float, optional): Coarsest point spacing in meters to fetch. Defaults to None.
+
+    Yields:
+        PointCloud: Points of a chunk in the output CRS
+
+    Raises:
+        RuntimeError: The pipeline failed, possibly after some chunks were yielded,
+            so consumers never mistake a partial stream for a complete one.
+    """
+    chunk_size = chunk_size or Config.CHUNK_SIZE
+    filename = region + "_" + bounds.get_bound_name()
+    if resolution is not None:
+      filename += f"_r{resolution:g}"
+    pipe = self.get_pipeline_definition(bounds.get_bound_str(),
+                                        polygon_str, region, filename, resolution=resolution)
+    files = self._get_output_files(pipe)
+    cached = None
+    if self.cache is not None:
+      key = self.cache.get_key(region, bounds, pipe, self.output_epsg)
+      cached = self.cache.get(key, restore=files)
+    arrays = None
+    try:
+      if cached is not None:
+        arrays = self._iter_slices(cached['arrays'], chunk_size)
+      else:
+        pl = pdal.Pipeline(json.dumps(pipe))
+        if pl.streamable:
+          arrays = pl.iterator(chunk_size=chunk_size)
+        else:
+          self._logger.warning(f"pipeline of {filename} cannot stream, its output is chunked after execution")
+          pl.execute()
+          arrays = self._iter_slices(pl.arrays, chunk_size)
+        if self.cache is not None:
+          arrays = self.cache.put_stream(key, arrays, files)
+      points = 0
+      for array in arrays:
+        points += len(array)
+        yield PointCloud.from_arrays([array], self.output_epsg, self.dimensions)
+      self._request_logger.info(f"successfully streamed geodata: {filename}, {points} points")
+    except RuntimeError as e:
+      self._logger.exception(f"error streaming geodata, error: {e}")
+      raise
+    finally:
+      # an abandoned stream leaves nothing half-written in the cache
+      if hasattr(arrays, 'close'):
+        arrays.close()
+
+  def _iter_slices(self, arrays: list, chunk_size: int):
+    """ Hands out materialized arrays as views of at most chunk_size points.
+    """
+    for array in arrays:
+      for start in range(0, len(array), chunk_size):
+        yield array[start:start + chunk_size]
+
+  def _get_output_files(self, pipe: dict) -> list:
+    """ Paths of the files the writer stages of a pipeline definition write.
+    """
+    return [Path(stage['filename']) for stage in pipe['pipeline'] if stage['type'].startswith('writers.')]
+
+  def _execute(self, pipe: dict, region: str, bounds: Bounds, record=None) -> list:
+    """ Executes a pipeline definition, serving it from the tile cache when an identical fetch was done before.
+
+    Args:
+        record (FetchRecord, optional): Profiling record the stages are measured into. Defaults to None.
+
+    Returns:
+        list: Structured arrays of the pipeline output
+    """
+    files = self._get_output_files(pipe)
+    if self.cache is not None:
+      key = self.cache.get_key(region, bounds, pipe, self.output_epsg)
+      with measure_stage(record, "cache") as stage:
+        cached = self.cache.get(key, restore=files)
+        if cached is not None:
+          stage['points_out'] = sum(len(a) for a in cached['arrays'])
+      if cached is not None:
+        if record is not None:
+          record.cached = True
+        return cached['arrays']
+
+    if record is not None and self.profiler.per_stage:
+      arrays = self._execute_stages(pipe, record)
+    else:
+      with measure_stage(record, "pipeline") as stage:
+        pl = pdal.Pipeline(json.dumps(pipe))
+        pl.execute()
+        arrays = pl.arrays
+        stage['points_out'] = sum(len(a) for a in arrays)
+      if record is not None:
+        record.add_pipeline_stages(pipe, pl.metadata)
+    if self.cache is not None:
+      self.cache.put(key, arrays, files)
+    return arrays
+
+  def _execute_stages(self, pipe: dict, record) -> list:
+    """ Executes a pipeline one stage at a time, feeding the arrays of a stage into the next one,
+        so wall time and point counts of every stage can be recorded. Only used with PipelineProfiler.per_stage,
+        as splitting the pipeline changes how it runs.
+
+    Returns:
+        list: Structured arrays of the pipeline output
+    """
+    arrays = None
+    srs = f'EPSG:{self._input_epsg}'
+    for stage in pipe['pipeline']:
+      stage = {k: v for k, v in stage.items() if k != 'inputs'}
+      # arrays passed between pipelines carry no spatial reference, so writers get it explicitly
+      if stage['type'] == 'filters.reprojection':
+        srs = stage['out_srs']
+      elif stage['type'] in ('writers.las', 'writers.copc'):
+        stage.setdefault('a_srs', srs)
+      elif stage['type'] == 'writers.gdal':
+        stage.setdefault('override_srs', srs)
+      points_in = 0 if arrays is None else sum(len(a) for a in arrays)
+      with record.stage(stage['tag'], stage['type'], points_in) as metric:
+        definition = json.dumps({'pipeline': [stage]})
+        pl = pdal.Pipeline(definition) if arrays is None else pdal.Pipeline(definition, arrays=arrays)
+        pl.execute()
+        arrays = pl.arrays
+        metric['points_out'] = sum(len(a) for a in arrays)
+    return arrays
+
+  def get_regions(self, bound: Bounds, regions: list, predicate: str = "contains") -> pd.DataFrame:
+    """ Resolves the regions to fetch, either from the given list or by searching the metadata.
+
+    Args:
+        bound (Bounds): Geometry object describing the boundary of interest for fetching point cloud data
+        regions (list): Point cloud data location for a specific boundary on the AWS cloud storage EPT resource. 
+        predicate (str, optional): Region lookup predicate used when no regions are given. Defaults to "contains".
+
+    Returns:
+        pd.DataFrame: Resource metadata for the regions to fetch.
+    """
+    if len(regions) == 0:
+      return self.get_bound_metadata(bound, predicate)
+
+    regions = self._metadata[self._metadata['filename'].isin(regions)]
+    if self.check_valid_bound(bound, regions) is False:
+      self._logger.exception("The boundary is not within the region provided")
+    return regions
+
+  def _iter_concurrent(self, bound: Bounds, polygon_str: str, regions: pd.DataFrame,
+                       workers: int = None, timeout: float = None):
+    """ Runs get_dep for every region in worker processes and yields (position, result) pairs as they finish.
+        Every region gets a process of its own, started once a worker slot is free,
+        so a timed out region or an abandoned generator stops its process without waiting for the pipeline.
+        Profiler and cache are copied into every process, profiler hooks therefore run in the worker.
+    """
+    workers = workers or Config.FETCH_WORKERS or os.cpu_count()
+    options = self._get_worker_options()
+    queued = deque(enumerate(row for _, row in regions.iterrows()))
+    running = {}
+    try:
+      while queued or running:
+        while queued and len(running) < workers:
+          position, row = queued.popleft()
+          process, receiver = _start_region(options, bound, polygon_str, row['filename'])
+          # the timeout counts from the start of the region's process, not from when it was queued
+          running[receiver] = (process, position, row, time.monotonic())
+
+        for receiver in multiprocessing.connection.wait(list(running), timeout=Config.FETCH_POLL_INTERVAL):
+          process, position, row, _ = running.pop(receiver)
+          succeeded, data = _receive_region(process, receiver)
+          if not succeeded:
+            self._logger.error(f"error featching geo data for {row['filename']}, error: {data}")
+          elif data is not None:
+            yield position, {'year': row['year'],
+                             'region': row['region'],
+                             'geo_data': data,
+                             }
+
+        now = time.monotonic()
+        for receiver, (process, position, row, started) in list(running.items()):
+          if timeout is not None and now - started > timeout:
+            del running[receiver]
+            _stop_region(process, receiver)
+            self._logger.error(f"fetching geo data for {row['filename']} timed out after {timeout}s")
+    finally:
+      for receiver, (process, *_) in running.items():
+        _stop_region(process, receiver)
+
+  def iter_lidar_data(self, polygon: Polygon, regions: list, predicate: str = "contains",
+                      workers: int = None, timeout: float = None):
+    """ Fetches lidar point cloud data for every region concurrently, each region in a process of its own,
+        yielding each result as soon as its pipeline finishes.
+
+    Args:
+        polygon (Polygon): Geometry object describing the boundary of the requested location.
+        regions (list): Point cloud data location for a specific boundary on the AWS cloud storage EPT resource. 
+        predicate (str, optional): Region lookup predicate used when no regions are given. Defaults to "contains".
+        workers (int, optional): Number of regions fetched at once. Defaults to Config.FETCH_WORKERS or the number of CPUs.
+        timeout (float, optional): Seconds a single region may run before it is abandoned. Defaults to None.
+
+    Yields:
+        dict: year, region and geo_data of a finished region, in completion order.
+    """
+    bound, polygon_str = self._gdf_helper.get_bound_from_polygon(polygon)
+    regions = self.get_regions(bound, regions, predicate)
+    if len(regions) == 0:
+      return
+    for _, result in self._iter_concurrent(bound, polygon_str, regions, workers, timeout):
+      yield result
+
+  def fetch_lidar_data(self, polygon: Polygon, regions: list, predicate: str = "contains",
+                       workers: int = 1, timeout: float = None) -> list:
     """ Fetches lidar point cloud data from EPT resources from AWS cloud storage. 
 
     Args:
         polygon (Polygon): Geometry object describing the boundary of the requested location.
         regions (list): Point cloud data location for a specific boundary on the AWS cloud storage EPT resource. 
+        predicate (str, optional): Region lookup predicate used when no regions are given,
+            "contains" or "intersects". Defaults to "contains".
+        workers (int, optional): Number of regions fetched concurrently, values above 1 fetch every region
+            in a process of its own. Defaults to 1.
+        timeout (float, optional): Per-region timeout in seconds, only used with workers above 1. Defaults to None.
 
     Returns:
         list: List of geopandas data frame for all regions enclosing the boundary
     """
 
     bound, polygon_str = self._gdf_helper.get_bound_from_polygon(polygon)
-    if len(regions) == 0:
-      regions = self.get_bound_metadata(bound)
-    else:
-      regions = self._metadata[self._metadata['filename'].isin(regions)]
-      if self.check_valid_bound(bound, regions) is False:
-        self._logger.exception("The boundary is not within the region provided")
+    regions = self.get_regions(bound, regions, predicate)
+
+    if (workers is None or workers > 1) and len(regions) > 0:
+      results = sorted(self._iter_concurrent(bound, polygon_str, regions, workers, timeout),
+                       key=lambda result: result[0])
+      return [data for _, data in results]
 
     list_geo_data = []
     for index, row in regions.iterrows():
@@ -145,3 +531,353 @@ class FetchLidar:
         self._logger.exception(
             f"error featching geo data for {row['filename']}, error: {e}")
     return list_geo_data
+
+  def _get_batch_geometries(self, features) -> np.ndarray:
+    """ Geometries of the features in EPSG:3857, features without a CRS are taken to be in the output CRS.
+    """
+    crs = features.geometry.crs
+    src = self.output_epsg if crs is None else crs.to_epsg() or crs
+    return transform_geometries(np.asarray(features.geometry.values, dtype=object), src, self._input_epsg)
+
+  def plan_batch(self, features, regions: list = [], predicate: str = "contains",
+                 cluster_size: float = None) -> list:
+    """ Groups the features of a batch into clustered reads without fetching anything:
+        features sharing a region whose centers fall in the same cluster_size cell are read together,
+        with the bounds of all of them and their union as crop polygon.
+
+    Args:
+        features (gpd.GeoDataFrame): Polygons to fetch, e.g. building footprints or parcels.
+        regions (list, optional): Regions to fetch from. Defaults to [], searching the metadata for every feature.
+        predicate (str, optional): Region lookup predicate, "contains" or "intersects". Defaults to "contains".
+        cluster_size (float, optional): Edge length of a cluster cell in meters. Defaults to Config.BATCH_CLUSTER_SIZE.
+
+    Returns:
+        list: dicts with filename, region, year, bounds, polygon_str and the positions of the features of every read
+    """
+    geometries = self._get_batch_geometries(features)
+    if len(regions) == 0:
+      matches = self._metadata_index.query_bulk(geometries, predicate)
+    else:
+      index = MetadataIndex(self._metadata[self._metadata['filename'].isin(regions)])
+      matches = index.query_bulk(geometries, predicate)
+
+    size = cluster_size or Config.BATCH_CLUSTER_SIZE
+    boxes = shapely.bounds(geometries)
+    cells = np.floor((boxes[:, :2] + boxes[:, 2:]) / 2 / size).astype(np.int64)
+    plan = []
+    for filename, group in matches.groupby('filename', sort=False):
+      positions = group['input_index'].to_numpy()
+      _, inverse, counts = np.unique(cells[positions], axis=0, return_inverse=True, return_counts=True)
+      clusters = np.split(positions[np.argsort(inverse.ravel(), kind='stable')], np.cumsum(counts)[:-1])
+      for members in clusters:
+        xmin, ymin = boxes[members, :2].min(axis=0)
+        xmax, ymax = boxes[members, 2:].max(axis=0)
+        plan.append({'filename': filename,
+                     'region': group['region'].iloc[0],
+                     'year': group['year'].iloc[0],
+                     'bounds': Bounds(xmin, xmax, ymin, ymax),
+                     'polygon_str': shapely.union_all(geometries[members]).wkt,
+                     'features': members})
+    return plan
+
+  def clip_features(self, cloud: PointCloud, geometries) -> list:
+    """ Splits the points of a clustered read between its features with vectorized point in polygon tests.
+
+    Args:
+        cloud (PointCloud): Points fetched for the cluster.
+        geometries: Array-like of polygons in EPSG:3857.
+
+    Returns:
+        list: PointCloud of every geometry, in order
+    """
+    x, y = cloud.x, cloud.y
+    if cloud.epsg != self._input_epsg:
+      x, y = transform_xy(x, y, cloud.epsg, self._input_epsg)
+    # points sorted along x, so the bounding box of a feature selects a contiguous slice
+    order = np.argsort(x, kind='stable')
+    x, y = x[order], y[order]
+    clipped = []
+    for geometry in geometries:
+      xmin, ymin, xmax, ymax = geometry.bounds
+      candidates = np.arange(np.searchsorted(x, xmin, side='left'), np.searchsorted(x, xmax, side='right'))
+      candidates = candidates[(y[candidates] >= ymin) & (y[candidates] <= ymax)]
+      inside = candidates[shapely.contains_xy(geometry, x[candidates], y[candidates])]
+      clipped.append(cloud[np.sort(order[inside])])
+    return clipped
+
+  def _iter_clusters(self, plan: list, workers: int = 1):
+    """ Fetches every clustered read of a plan as a PointCloud and yields (cluster, cloud) pairs in plan order.
+    """
+    if workers is not None and workers <= 1:
+      fetcher = self if self.as_point_cloud else FetchLidar(**self._get_worker_options(as_point_cloud=True))
+      for cluster in plan:
+        yield cluster, fetcher.get_dep(cluster['bounds'], cluster['polygon_str'], cluster['filename'])
+      return
+
+    workers = workers or Config.FETCH_WORKERS or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=min(workers, len(plan)),
+                             initializer=_init_worker,
+                             initargs=(self._get_worker_options(as_point_cloud=True),)) as executor:
+      futures = [executor.submit(_fetch_region, c['bounds'], c['polygon_str'], c['filename']) for c in plan]
+      for cluster, future in zip(plan, futures):
+        try:
+          yield cluster, future.result()
+        except Exception as e:
+          self._logger.exception(f"error featching geo data for {cluster['filename']}, error: {e}")
+
+  def fetch_batch(self, features, regions: list = [], predicate: str = "contains",
+                  cluster_size: float = None, workers: int = 1) -> dict:
+    """ Fetches lidar point cloud data for many small polygons, e.g. building footprints or parcels.
+        Nearby polygons sharing a region are fetched with one EPT read per cluster (see plan_batch),
+        so octree nodes are read once instead of once per polygon, and the points are then split between
+        the polygons locally.
+
+    Args:
+        features (gpd.GeoDataFrame | str): Polygons to fetch, or a shapefile read with FileHandler.read_shp.
+        regions (list, optional): Regions to fetch from. Defaults to [], searching the metadata for every feature.
+        predicate (str, optional): Region lookup predicate, "contains" or "intersects". Defaults to "contains".
+        cluster_size (float, optional): Edge length of a cluster cell in meters. Defaults to Config.BATCH_CLUSTER_SIZE.
+        workers (int, optional): Number of clusters fetched concurrently, values above 1 use a process pool
+            whose workers run the profiler hooks. Defaults to 1.
+
+    Returns:
+        dict: Index label of every feature to a list of year, region and geo_data dicts, one per region
+    """
+    if isinstance(features, (str, Path)):
+      features = self._file_handler.read_shp(str(features))
+    geometries = self._get_batch_geometries(features)
+    shapely.prepare(geometries)
+    plan = self.plan_batch(features, regions, predicate, cluster_size)
+    self._logger.info(f"fetching {len(features)} features as {len(plan)} clustered reads")
+
+    results = {label: [] for label in features.index}
+    if len(plan) == 0:
+      return results
+    for cluster, cloud in self._iter_clusters(plan, workers):
+      if cloud is None:
+        continue
+      members = cluster['features']
+      for position, data in zip(members, self.clip_features(cloud, geometries[members])):
+        results[features.index[position]].append({'year': cluster['year'],
+                                                  'region': cluster['region'],
+                                                  'geo_data': data if self.as_point_cloud else data.to_geodataframe()})
+    return results
+
+  def stream_lidar_data(self, polygon: Polygon, region: str, chunk_size: int = None, resolution: float = None):
+    """ Streams lidar point cloud data of one region in chunks, for fetches larger than memory.
+        The chunks can be folded into Rasterizer.rasterize_chunks, ChunkSubSampler or FileHandler.write_point_chunks.
+
+    Args:
+        polygon (Polygon): Geometry object describing the boundary of the requested location.
+        region (str): Point cloud data location on the AWS cloud storage EPT resource.
+        chunk_size (int, optional): Most points per chunk. Defaults to Config.CHUNK_SIZE.
+        resolution (float, optional): Coarsest point spacing in meters to fetch. Defaults to None.
+
+    Yields:
+        PointCloud: Points of a chunk in the output CRS
+
+    Raises:
+        RuntimeError: The pipeline failed, see iter_dep.
+    """
+    bound, polygon_str = self._gdf_helper.get_bound_from_polygon(polygon)
+    yield from self.iter_dep(bound, polygon_str, region, chunk_size, resolution)
+
+  def plan_lidar_data(self, polygon: Polygon, regions: list, predicate: str = "contains",
+                      planner: QueryPlanner = None) -> list:
+    """ Dry run of a fetch: estimates points and bytes of every region from the EPT hierarchy
+        and decides how each would be fetched, without running a pipeline.
+
+    Args:
+        polygon (Polygon): Geometry object describing the boundary of the requested location.
+        regions (list): Point cloud data location for a specific boundary on the AWS cloud storage EPT resource.
+        predicate (str, optional): Region lookup predicate used when no regions are given. Defaults to "contains".
+        planner (QueryPlanner, optional): Planner with the budget and strategy. Defaults to a QueryPlanner().
+
+    Returns:
+        list: QueryPlanner.plan of every region, with year added
+    """
+    bound, polygon_str = self._gdf_helper.get_bound_from_polygon(polygon)
+    return self._plan(bound, polygon_str, regions, predicate, planner)
+
+  def _plan(self, bound: Bounds, polygon_str: str, regions: list, predicate: str = "contains",
+            planner: QueryPlanner = None) -> list:
+    """ plan_lidar_data for a polygon already reprojected to the EPT coordinate system.
+    """
+    planner = planner or QueryPlanner()
+    area = shapely.from_wkt(polygon_str).area
+    plans = []
+    for _, row in self.get_regions(bound, regions, predicate).iterrows():
+      try:
+        plan = planner.plan(row['filename'], bound, area)
+      except (OSError, RuntimeError, ValueError) as e:
+        self._logger.error(f"error planning {row['filename']}, error: {e}")
+        continue
+      plan['year'] = row['year']
+      plans.append(plan)
+    return plans
+
+  def fetch_planned(self, polygon: Polygon, regions: list, predicate: str = "contains",
+                    planner: QueryPlanner = None, workers: int = None) -> list:
+    """ Fetches every region the way plan_lidar_data decided: in one pipeline, at a coarser resolution
+        or as tiles. Rejected regions are skipped.
+
+    Args:
+        polygon (Polygon): Geometry object describing the boundary of the requested location.
+        regions (list): Point cloud data location for a specific boundary on the AWS cloud storage EPT resource.
+        predicate (str, optional): Region lookup predicate used when no regions are given. Defaults to "contains".
+        planner (QueryPlanner, optional): Planner with the budget and strategy. Defaults to a QueryPlanner().
+        workers (int, optional): Number of worker processes of tiled fetches. Defaults to Config.FETCH_WORKERS.
+
+    Returns:
+        list: year, region, geo_data and the plan of every fetched region
+    """
+    bound, polygon_str = self._gdf_helper.get_bound_from_polygon(polygon)
+    list_geo_data = []
+    for plan in self._plan(bound, polygon_str, regions, predicate, planner):
+      region = plan['region']
+      if plan['action'] == "reject":
+        self._logger.error(f"skipping {region}, about {plan['points']} points exceed the planner limits")
+        continue
+      if plan['action'] == "tile":
+        data = self.fetch_tiled(polygon, region, plan['tile_size'], workers=workers)
+      else:
+        data = self.get_dep(bound, polygon_str, region, plan['resolution'])
+      if data is not None:
+        list_geo_data.append({'year': plan['year'],
+                              'region': region,
+                              'geo_data': data,
+                              'plan': plan})
+    return list_geo_data
+
+  def fetch_tiled(self, polygon: Polygon, region: str, tile_size: float = None, buffer: float = None,
+                  workers: int = None, resume: bool = True):
+    """ Fetches a large polygon from one region as a grid of buffered tiles run concurrently.
+        Each tile is fetched with an overlap buffer so ground classification has no edge artifacts,
+        the buffer is clipped off and the tiles are merged. Finished tiles are recorded on disk,
+        so running the same request again after a failure only fetches the missing tiles.
+
+    Args:
+        polygon (Polygon): Geometry object describing the boundary of the requested location.
+        region (str): Point cloud data location on the AWS cloud storage EPT resource.
+        tile_size (float, optional): Edge length of a tile in meters. Defaults to Config.TILE_SIZE.
+        buffer (float, optional): Overlap around every tile in meters. Defaults to Config.TILE_BUFFER.
+        workers (int, optional): Number of regions fetched at once. Defaults to Config.FETCH_WORKERS or the number of CPUs.
+        resume (bool, optional): Reuse tiles finished by an earlier run of the same request. Defaults to True.
+
+    Returns:
+        gpd.GeoDataFrame | PointCloud: Merged points of all tiles
+    """
+    _, polygon_str = self._gdf_helper.get_bound_from_polygon(polygon)
+    area = shapely.from_wkt(polygon_str)
+    planner = TilePlanner(tile_size, buffer)
+    tiles = planner.plan(area)
+    job = TileJob(region, area, planner, self.output_epsg,
+                  pipeline=self._pipeline_builder.build(self.profile, self.in_memory))
+    if not resume:
+      job.completed.clear()
+    pending = job.pending(tiles)
+    self._logger.info(
+        f"fetching {region} as {len(tiles)} tiles, {len(tiles) - len(pending)} already completed")
+
+    failed = []
+    if len(pending) > 0:
+      workers = workers or Config.FETCH_WORKERS or os.cpu_count()
+      with ProcessPoolExecutor(max_workers=min(workers, len(pending)),
+                               initializer=_init_worker,
+                               initargs=(self._get_worker_options(as_point_cloud=True),)) as executor:
+        futures = {executor.submit(_fetch_tile, tile, region): tile for tile in pending}
+        for future in as_completed(futures):
+          tile = futures[future]
+          try:
+            job.complete(tile, future.result())
+          except Exception as e:
+            failed.append(tile.id)
+            self._logger.error(f"error fetching tile {tile.id} of {region}, error: {e}")
+
+    if len(failed) > 0:
+      raise RuntimeError(
+          f"{len(failed)} of {len(tiles)} tiles of {region} failed, run the request again to resume")
+
+    if len(tiles) == 0:
+      cloud = PointCloud.from_xyz(np.empty((0, 3)), self.output_epsg)
+    else:
+      cloud = PointCloud.concat([job.load(tile) for tile in tiles])
+    return cloud if self.as_point_cloud else cloud.to_geodataframe()
+
+  def get_resolution(self, bounds: Bounds, point_budget: int) -> float:
+    """ Estimates the readers.ept resolution returning about point_budget points for a boundary,
+        assuming the points are spread evenly over it.
+
+    Args:
+        bounds (Bounds): Boundary in EPSG:3857.
+        point_budget (int): Number of points wanted.
+
+    Returns:
+        float: Point spacing in meters
+    """
+    if point_budget <= 0:
+      raise ValueError(f"point_budget must be positive, got {point_budget}")
+    area = (bounds.xmax - bounds.xmin) * (bounds.ymax - bounds.ymin)
+    return math.sqrt(area / point_budget)
+
+  def fetch_lod(self, polygon: Polygon, region: str, resolution: float = None, point_budget: int = None):
+    """ Fetches a region at a reduced level of detail, e.g. for previews.
+
+    Args:
+        polygon (Polygon): Geometry object describing the boundary of the requested location.
+        region (str): Point cloud data location on the AWS cloud storage EPT resource.
+        resolution (float, optional): Coarsest point spacing in meters to fetch. Defaults to None.
+        point_budget (int, optional): Approximate number of points wanted, used when no resolution is given. Defaults to None.
+
+    Returns:
+        gpd.GeoDataFrame | PointCloud: Geopandas data frame containing geometry and elevation
+    """
+    bound, polygon_str = self._gdf_helper.get_bound_from_polygon(polygon)
+    if resolution is None and point_budget is not None:
+      resolution = self.get_resolution(bound, point_budget)
+    return self.get_dep(bound, polygon_str, region, resolution)
+
+  def iter_progressive(self, polygon: Polygon, region: str, levels: int = None,
+                       point_budget: int = None, resolution: float = None):
+    """ Fetches a region progressively: coarse octree levels come back first and are refined until full density.
+        Each level is fetched in a worker process while the previous one is consumed, so a caller
+        stopping after a preview only waits for the level it took; the level running then is stopped.
+        Coarse levels are previews and run the "raw" profile in memory, only the final level runs
+        the fetcher's profile with its ground filters and writers.
+
+    Args:
+        polygon (Polygon): Geometry object describing the boundary of the requested location.
+        region (str): Point cloud data location on the AWS cloud storage EPT resource.
+        levels (int, optional): Number of coarse levels before the final one. Defaults to Config.LOD_LEVELS.
+        point_budget (int, optional): Approximate number of points of the coarsest level. Defaults to Config.PREVIEW_POINT_BUDGET.
+        resolution (float, optional): Resolution of the final level, None for full density. Defaults to None.
+
+    Yields:
+        dict: level, resolution and geo_data, from coarse to fine.
+    """
+    levels = Config.LOD_LEVELS if levels is None else levels
+    bound, polygon_str = self._gdf_helper.get_bound_from_polygon(polygon)
+    point_budget = Config.PREVIEW_POINT_BUDGET if point_budget is None else point_budget
+    coarsest = self.get_resolution(bound, point_budget)
+    resolutions = [coarsest / 2 ** level for level in range(levels)]
+    resolutions = [r for r in resolutions if resolution is None or r > resolution] + [resolution]
+
+    preview_options = self._get_worker_options(profile="raw", in_memory=True)
+    options = [preview_options] * (len(resolutions) - 1) + [self._get_worker_options()]
+    running = _start_region(options[0], bound, polygon_str, region, resolutions[0])
+    try:
+      for level, r in enumerate(resolutions):
+        succeeded, data = _receive_region(*running)
+        running = None
+        if level + 1 < len(resolutions):
+          running = _start_region(options[level + 1], bound, polygon_str, region, resolutions[level + 1])
+        if not succeeded:
+          self._logger.error(f"error fetching level {level} of {region}, error: {data}")
+          continue
+        if data is not None:
+          yield {'level': level,
+                 'resolution': r,
+                 'geo_data': data}
+    finally:
+      if running is not None:
+        _stop_region(*running)
@@ -1,8 +1,18 @@
+from __future__ import annotations
+import os
 import json
-import laspy
+import numpy as np
 import pandas as pd
 from config import Config
 from log import get_logger
+from lazy_import import lazy_import
+from point_cloud import PointCloud
+from point_reader import PointReader, get_laspy_dimension
+from copc_reader import CopcPointReader
+
+laspy = lazy_import("laspy")
+gpd = lazy_import("geopandas")
+pyproj = lazy_import("pyproj")
 
 
 class FileHandler():
@@ -64,6 +74,61 @@ class FileHandler():
     except Exception:
       self._logger.exception(f"{name} not found")
 
+  def read_shp(self, name: str) -> gpd.GeoDataFrame:
+    """ Reads a shapefile (or any vector file geopandas reads) into a geopandas data frame
+
+    Args:
+        name (str): The name of a shapefile under Config.SHP_PATH, or the path of a vector file.
+
+    Returns:
+        gpd.GeoDataFrame: one row per feature
+    """
+    path = Config.SHP_PATH / str(name + '.shp')
+    if not path.exists():
+      path = name
+    try:
+      df = gpd.read_file(path)
+      self._logger.info(f"{name} read successfully")
+      return df
+    except Exception:
+      self._logger.exception(f"{name} not found")
+
+  def save_npy(self, array: np.ndarray, name: str) -> None:
+    """ Saves a NumPy array to disk, replacing an existing file atomically
+        so processes memory-mapping the old file keep a consistent view.
+
+    Args:
+        array (np.ndarray): array to be saved, structured arrays keep their dtype
+        name (str): The name of the file to be stored.
+    """
+    try:
+      path = Config.ASSETS_PATH / str(name + '.npy')
+      tmp = Config.ASSETS_PATH / str(name + f'.{os.getpid()}.tmp.npy')
+      np.save(tmp, array, allow_pickle=False)
+      os.replace(tmp, path)
+      self._logger.info(f"{name} is saved successfully in npy format")
+    except Exception:
+      self._logger.exception(f"{name} save failed")
+
+  def read_npy(self, name: str, mmap_mode: str = 'r') -> np.ndarray:
+    """ Reads a NumPy array from disk, memory-mapped by default so pages are loaded on access
+        and shared between processes.
+
+    Args:
+        name (str): The name of the file to read.
+        mmap_mode (str, optional): np.load memory-map mode, None reads the whole file. Defaults to 'r'.
+
+    Returns:
+        np.ndarray: array
+    """
+    try:
+      path = Config.ASSETS_PATH / str(name + '.npy')
+      array = np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+      self._logger.info(f"{name} read successfully")
+      return array
+    except FileNotFoundError:
+      self._logger.exception(f"{name} not found")
+
   def read_txt(self, name: str) -> list:
     """ Reads JSON file from disk
 
@@ -99,3 +164,120 @@ class FileHandler():
       return las
     except Exception:
       self._logger.exception(f"{name} not found")
+
+  def read_point_header(self, name: str) -> laspy.LasHeader:
+    """ Reads only the header of a laz file, without decompressing any point
+
+    Args:
+        name (str): The name of the file to read.
+
+    Returns:
+        laspy.LasHeader: header holding point count, scales, offsets and bounds
+    """
+    path = Config.LAZ_PATH / str(name + '.laz')
+    with laspy.open(path) as reader:
+      return reader.header
+
+  def read_point_chunks(self, name: str, chunk_size: int = None):
+    """ Reads a laz file in fixed-size chunks, so files larger than memory can be processed
+
+    Args:
+        name (str): The name of the file to read.
+        chunk_size (int, optional): Number of points per chunk. Defaults to Config.CHUNK_SIZE.
+
+    Yields:
+        np.ndarray: An (n, 3) array of scaled x, y, z coordinates
+    """
+    path = Config.LAZ_PATH / str(name + '.laz')
+    with laspy.open(path) as reader:
+      for chunk in reader.chunk_iterator(chunk_size or Config.CHUNK_SIZE):
+        yield np.column_stack((chunk.x, chunk.y, chunk.z))
+    self._logger.info(f"{name} streamed successfully")
+
+  def write_point_chunks(self, chunks, name: str, epsg: int = None, scale: float = 0.01) -> int:
+    """ Writes points arriving in chunks to a laz file, holding only one chunk in memory
+
+    Args:
+        chunks (iterable): (n, 3) coordinate arrays or PointClouds, e.g. from FetchLidar.iter_dep.
+            Dimensions of a PointCloud named like LAS dimensions, e.g. Intensity, are written as well.
+        name (str): The name of the file to write under Config.LAZ_PATH.
+        epsg (int, optional): Coordinate reference system stored in the header. Defaults to the one of
+            PointCloud chunks.
+        scale (float, optional): Precision of the stored coordinates. Defaults to 0.01.
+
+    Returns:
+        int: number of points written
+    """
+    path = Config.LAZ_PATH / str(name + '.laz')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    writer = None
+    try:
+      for chunk in chunks:
+        if writer is None:
+          # the offset comes from the first chunk, the writer grows the header bounds chunk by chunk
+          header = laspy.LasHeader(point_format=6, version="1.4")
+          header.scales = np.array([scale] * 3)
+          xyz = chunk.xyz() if isinstance(chunk, PointCloud) else chunk
+          header.offsets = np.floor(xyz.min(axis=0)) if len(xyz) > 0 else np.zeros(3)
+          if epsg is None and isinstance(chunk, PointCloud):
+            epsg = chunk.epsg
+          if epsg is not None:
+            header.add_crs(pyproj.CRS.from_epsg(epsg))
+          writer = laspy.open(path, mode='w', header=header)
+        record = laspy.ScaleAwarePointRecord.zeros(len(chunk), header=writer.header)
+        if isinstance(chunk, PointCloud):
+          record.x, record.y, record.z = chunk.x, chunk.y, chunk.z
+          for dimension in chunk.extra_dimensions:
+            field = get_laspy_dimension(dimension)
+            if field in record.point_format.dimension_names:
+              record[field] = chunk.points[dimension]
+        else:
+          record.x, record.y, record.z = chunk[:, 0], chunk[:, 1], chunk[:, 2]
+        writer.write_points(record)
+        written += len(chunk)
+    finally:
+      if writer is not None:
+        writer.close()
+    self._logger.info(f"{name} written with {written} points successfully")
+    return written
+
+  def read_point_window(self, name: str, bounds=None, dimensions: list = None, stride: int = 1) -> np.ndarray:
+    """ Reads the points of a las or laz file inside bounds without loading the whole file,
+        see PointReader. A .las file is preferred over a .laz file of the same name.
+
+    Args:
+        name (str): The name of the file to read.
+        bounds (Bounds, optional): Area to read, in the coordinates of the file. Defaults to None, the whole file.
+        dimensions (list, optional): Dimensions besides X, Y and Z, e.g. ["Intensity"]. Defaults to None.
+        stride (int, optional): Keep every n-th point of the file. Defaults to 1.
+
+    Returns:
+        np.ndarray: Structured array of X, Y, Z and the requested dimensions
+    """
+    path = Config.LAZ_PATH / str(name + '.las')
+    if not path.exists():
+      path = Config.LAZ_PATH / str(name + '.laz')
+    points = PointReader(path).read(bounds, dimensions, stride)
+    self._logger.info(f"{name} read {len(points)} points successfully")
+    return points
+
+  def read_copc(self, name: str, bounds=None, level=None, resolution: float = None,
+                dimensions: list = None) -> np.ndarray:
+    """ Reads the points of a COPC file inside bounds, decompressing only the octree nodes needed,
+        see CopcPointReader.
+
+    Args:
+        name (str): The name of the file to read, without the .copc.laz extension.
+        bounds (Bounds, optional): Area to read, in the coordinates of the file. Defaults to None, the whole file.
+        level (int | range, optional): Octree level(s) to read, 0 is the coarsest. Defaults to None, every level.
+        resolution (float, optional): Coarsest point spacing to read. Defaults to None, full density.
+        dimensions (list, optional): Dimensions besides X, Y and Z, e.g. ["Intensity"]. Defaults to None.
+
+    Returns:
+        np.ndarray: Structured array of X, Y, Z and the requested dimensions
+    """
+    path = Config.LAZ_PATH / str(name + '.copc.laz')
+    points = CopcPointReader(path).read(bounds, level, resolution, dimensions)
+    self._logger.info(f"{name} read {len(points)} points successfully")
+    return points
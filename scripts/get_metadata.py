@@ -2,11 +2,16 @@ import re
 import json
 import urllib3
 import pandas as pd
+from pathlib import Path
+from config import Config
 from log import get_logger
 from file_handler import FileHandler
+from metadata_index import CATALOG_NAME, to_catalog
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 DEFAULT_URL = "https://s3-us-west-2.amazonaws.com/usgs-lidar-public/"
 DEFAULT_FILENAME = "usgs_3dep_filenames"
+COLUMNS = ['filename', 'region', 'year', 'xmin', 'xmax', 'ymin', 'ymax', 'points']
 
 
 class GetMetadata():
@@ -22,7 +27,7 @@ class GetMetadata():
     """
     self.url = target_url
     self.filename = name
-    self._http = urllib3.PoolManager()
+    self._http = urllib3.PoolManager(maxsize=Config.METADATA_WORKERS)
     self._file_handler = FileHandler()
     self._logger = get_logger("GetMetadata")
 
@@ -44,37 +49,128 @@ class GetMetadata():
     else:
       return (resource_location, None)
 
-  def get_metadata(self):
-    """ Extracts metadata for all EPT resources on AWS
+  def _load_checkpoint(self, checkpoint: Path) -> dict:
+    """ Reads the records of an earlier (possibly interrupted) crawl, the last entry of a resource wins.
     """
-    filenames = self._file_handler.read_txt(self.filename)
-    df = pd.DataFrame(columns=['filename', 'region',
-                      'year', 'xmin', 'xmax', 'ymin', 'ymax', 'points'])
+    entries = {}
+    if checkpoint is None or not checkpoint.exists():
+      return entries
+    with open(checkpoint, 'r') as f:
+      for line in f:
+        try:
+          entry = json.loads(line)
+          entries[entry['resource']] = entry
+        except (ValueError, KeyError):
+          # a crawl killed mid-write leaves a truncated last line
+          self._logger.warning(f"skipping corrupt checkpoint line in {checkpoint}")
+    return entries
+
+  def _fetch_resource(self, resource: str, cached: dict = None) -> tuple:
+    """ Requests ept.json of one EPT resource, conditionally if validators of an earlier crawl are known.
+
+    Args:
+        resource (str): Name of EPT resource location
+        cached (dict, optional): Checkpoint entry of the resource. Defaults to None.
+
+    Returns:
+        tuple: HTTP status and the checkpoint entry describing the resource, None if the request failed.
+    """
+    headers = {}
+    if cached is not None:
+      if cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+      if cached.get('last_modified'):
+        headers['If-Modified-Since'] = cached['last_modified']
+
+    r = self._http.request('GET', self.url + resource + "ept.json", headers=headers)
+    if r.status == 304:
+      return r.status, cached
+    if r.status != 200:
+      return r.status, None
+
+    j = json.loads(r.data)
+    region, year = self.get_name_and_year(resource)
+    record = {
+        'filename': resource.replace('/', ''),
+        'region': region,
+        'year': year,
+        'xmin': j['bounds'][0],
+        'xmax': j['bounds'][3],
+        'ymin': j['bounds'][1],
+        'ymax': j['bounds'][4],
+        'points': j['points']}
+    return r.status, {'resource': resource,
+                      'etag': r.headers.get('ETag'),
+                      'last_modified': r.headers.get('Last-Modified'),
+                      'record': record}
+
+  def crawl(self, filenames: list, workers: int = None, checkpoint: Path = None,
+            refresh: bool = False) -> pd.DataFrame:
+    """ Fetches ept.json of many EPT resources concurrently and accumulates the metadata column by column.
+        Every finished resource is appended to the checkpoint file, so an interrupted crawl resumes where it stopped.
+
+    Args:
+        filenames (list): EPT resource locations relative to the target url.
+        workers (int, optional): Number of concurrent requests. Defaults to Config.METADATA_WORKERS.
+        checkpoint (Path, optional): JSON lines file recording finished resources. Defaults to None.
+        refresh (bool, optional): Revalidate resources found in the checkpoint with conditional requests
+            (ETag/Last-Modified) instead of skipping them. Defaults to False.
+
+    Returns:
+        pd.DataFrame: Metadata in the order of filenames, resources that failed are left out.
+    """
+    workers = workers or Config.METADATA_WORKERS
+    entries = self._load_checkpoint(checkpoint)
+    todo = [f for f in filenames if refresh or f not in entries]
+    self._logger.info(
+        f"crawling {len(todo)} of {len(filenames)} resources with {workers} workers")
+
+    checkpoint_file = None
+    if checkpoint is not None:
+      checkpoint.parent.mkdir(parents=True, exist_ok=True)
+      checkpoint_file = open(checkpoint, 'a')
+
+    try:
+      with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(self._fetch_resource, f, entries.get(f)): f for f in todo}
+        for index, future in enumerate(as_completed(futures)):
+          f = futures[future]
+          try:
+            status, entry = future.result()
+          except Exception:
+            self._logger.exception(f"Connection problem at: {f}")
+            continue
+          if entry is None:
+            self._logger.error(f"Connection problem at: {f}, status: {status}")
+            continue
+          entries[f] = entry
+          if checkpoint_file is not None and status == 200:
+            checkpoint_file.write(json.dumps(entry) + "\n")
+            checkpoint_file.flush()
+          if(index % 100 == 0):
+            print(f"Read progress: {((index / len(todo)) * 100):.2f}%")
+    finally:
+      if checkpoint_file is not None:
+        checkpoint_file.close()
 
-    index = 0
+    columns = {c: [] for c in COLUMNS}
     for f in filenames:
-      r = self._http.request('GET', self.url + f + "ept.json")
-      if r.status == 200:
-        j = json.loads(r.data)
-        region, year = self.get_name_and_year(f)
-
-        df = df.append({
-            'filename': f.replace('/', ''),
-            'region': region,
-            'year': year,
-            'xmin': j['bounds'][0],
-            'xmax': j['bounds'][3],
-            'ymin': j['bounds'][1],
-            'ymax': j['bounds'][4],
-            'points': j['points']}, ignore_index=True)
-
-        if(index % 100 == 0):
-          print(f"Read progress: {((index / len(filenames)) * 100):.2f}%")
-        index += 1
-      else:
-        self._logger.exception(f"Connection problem at: {f}")
-        # return
-    self._file_handler.save_csv(df, "usgs_3dep_metadata")
+      if f in entries:
+        for c in COLUMNS:
+          columns[c].append(entries[f]['record'][c])
+    return pd.DataFrame(columns, columns=COLUMNS)
+
+  def get_metadata(self, workers: int = None, refresh: bool = False):
+    """ Extracts metadata for all EPT resources on AWS and stores it as CSV and as the binary catalog loaded by FetchLidar
+
+    Args:
+        workers (int, optional): Number of concurrent requests. Defaults to Config.METADATA_WORKERS.
+        refresh (bool, optional): Revalidate already crawled resources and refetch only the changed ones. Defaults to False.
+    """
+    filenames = self._file_handler.read_txt(self.filename)
+    df = self.crawl(filenames, workers, Config.METADATA_CHECKPOINT, refresh)
+    self._file_handler.save_csv(df, CATALOG_NAME)
+    self._file_handler.save_npy(to_catalog(df), CATALOG_NAME)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,16 @@
+from __future__ import annotations
 import numpy as np
-import geopandas as gpd
+import shapely
+from lazy_import import lazy_import
 from bounds import Bounds
 from log import get_logger
 from file_handler import FileHandler
-from shapely.geometry import Point, Polygon
+from transform import transform_xy, transform_geometries
+from shapely.geometry import Polygon
+
+gpd = lazy_import("geopandas")
+
+EXTRA_DIMENSIONS = ["Intensity", "Classification", "ReturnNumber"]
 
 
 class GPDHelper:
@@ -31,51 +38,63 @@ class GPDHelper:
     Returns:
         gpd.GeoDataFrame
     """
-    df['geometry'] = df['geometry'].to_crs(self.output_epsg)
-    df = df.set_crs(self.output_epsg)
+    # CRSs without an EPSG code, e.g. from ESRI .prj files, are passed on as they are
+    src = df.crs.to_epsg() or df.crs
+    geometry = np.asarray(df.geometry.values)
+    if len(geometry) > 0 and (shapely.get_type_id(geometry) == shapely.GeometryType.POINT).all():
+      # point coordinates are reprojected as arrays, without going through shapely geometries
+      x, y = transform_xy(shapely.get_x(geometry), shapely.get_y(geometry), src, self.output_epsg, inplace=True)
+      z = shapely.get_z(geometry) if shapely.has_z(geometry).any() else None
+      geometry = gpd.points_from_xy(x, y, z)
+    else:
+      geometry = transform_geometries(geometry, src, self.output_epsg)
+    df['geometry'] = gpd.GeoSeries(geometry, index=df.index, crs=self.output_epsg)
+    df = df.set_crs(self.output_epsg, allow_override=True)
     return df
 
-  def get_dep_points(self, array_of_points: np.ndarray) -> gpd.GeoDataFrame:
+  def get_dep_points(self, array_of_points: np.ndarray, columns: dict = None) -> gpd.GeoDataFrame:
     """ Constructs a Geopandas data frame having an elevation column and a geometry column representing point cloud data in a given coordinate reference system.
 
     Args:
         array_data (np.ndarray): A point cloud data from pdal pipeline
+        columns (dict, optional): Additional per-point columns, name to array. Defaults to None.
 
     Returns:
         gpd.GeoDataFrame: A geopandas data frame containing geometry and elevation.
     """
-    
-    geometry_points = [Point(x, y) for x, y in zip(array_of_points[:, 0], array_of_points[:, 1])]
-    elevations = np.array(array_of_points[:, 2])
-
-    df = gpd.GeoDataFrame(columns=["elevation", "geometry"])
-    df['elevation'] = elevations
-    df['geometry'] = geometry_points
-    df = df.set_geometry("geometry")
-    df.set_crs(epsg=self.output_epsg, inplace=True)
-    return df
+    array_of_points = np.atleast_2d(np.asarray(array_of_points, dtype=float))
+    return self._get_geo_data_frame(array_of_points[:, 0], array_of_points[:, 1],
+                                    array_of_points[:, 2], columns)
 
-  def get_dep(self, array_data: np.ndarray) -> gpd.GeoDataFrame:
+  def get_dep(self, array_data: list, dimensions: list = None) -> gpd.GeoDataFrame:
     """ Constructs a Geopandas data frame having an elevation column 
         and a geometry column representing point cloud data in a given coordinate reference system.
 
     Args:
-        array_data (np.ndarray): A point cloud data in a numpy format
+        array_data (list): Point cloud arrays in a numpy format, all arrays of the pipeline output are concatenated.
+        dimensions (list, optional): Extra PDAL dimensions carried as columns,
+            e.g. EXTRA_DIMENSIONS (Intensity, Classification, ReturnNumber). Defaults to None.
 
     Returns:
         gpd.GeoDataFrame: A geopandas data frame containing geometry and elevation.
     """
-
-    for i in array_data:
-      geometry_points = [Point(x, y) for x, y in zip(i["X"], i["Y"])]
-      elevations = np.array(i["Z"])
-
-      df = gpd.GeoDataFrame(columns=["elevation", "geometry"])
-      df['elevation'] = elevations
-      df['geometry'] = geometry_points
-      df = df.set_geometry("geometry")
-      df.set_crs(epsg=self.output_epsg, inplace=True)
-    return df
+    arrays = [a for a in array_data if len(a) > 0]
+    if len(arrays) == 0:
+      return self._get_geo_data_frame(np.empty(0), np.empty(0), np.empty(0))
+
+    fields = ["X", "Y", "Z"] + [d for d in (dimensions or []) if d in arrays[0].dtype.names]
+    points = np.concatenate([a[fields] for a in arrays]) if len(arrays) > 1 else arrays[0]
+    columns = {d: points[d] for d in fields[3:]}
+    return self._get_geo_data_frame(points["X"], points["Y"], points["Z"], columns)
+
+  def _get_geo_data_frame(self, x: np.ndarray, y: np.ndarray, z: np.ndarray,
+                          columns: dict = None) -> gpd.GeoDataFrame:
+    """ Builds the geometry column from coordinate arrays in bulk, without a per point Python loop.
+    """
+    data = {'elevation': np.asarray(z)}
+    data.update(columns or {})
+    geometry = gpd.points_from_xy(x, y, crs=f"EPSG:{self.output_epsg}")
+    return gpd.GeoDataFrame(data, geometry=geometry, crs=f"EPSG:{self.output_epsg}")
 
   def get_polygon_str(self, x_cord, y_cord) -> str:
     """ Compute Polygons Cropping string used when building Pdal crop pipeline.
@@ -103,11 +122,9 @@ class GPDHelper:
     Returns:
         tuple: A tuple of Bounds object and a string of a given polygon in a form accepted by the pdal pipeline.
     """
-    polygon_df = gpd.GeoDataFrame([polygon], columns=['geometry'])
-    polygon_df.set_crs(epsg=self.output_epsg, inplace=True)
-    polygon_df['geometry'] = polygon_df['geometry'].to_crs(epsg=self.input_epsg)
-    xmin, ymin, xmax, ymax = polygon_df['geometry'][0].bounds
+    polygon = transform_geometries(polygon, self.output_epsg, self.input_epsg)
+    xmin, ymin, xmax, ymax = polygon.bounds
     bound = Bounds(xmin, xmax, ymin, ymax)
-    x_cord, y_cord = polygon_df['geometry'][0].exterior.coords.xy
+    x_cord, y_cord = polygon.exterior.coords.xy
     polygon_str = self.get_polygon_str(x_cord, y_cord)
     return bound, polygon_str
@@ -0,0 +1,37 @@
+import sys
+import types
+import importlib
+
+
+class LazyModule(types.ModuleType):
+  """ Stand-in for a heavy module that is imported on first attribute access,
+      so importing the package does not pay for dependencies a process never uses.
+  """
+
+  def __init__(self, name: str) -> None:
+    super().__init__(name)
+    self._module = None
+
+  def _load(self) -> types.ModuleType:
+    if self._module is None:
+      self._module = importlib.import_module(self.__name__)
+    return self._module
+
+  def __getattr__(self, attr: str):
+    return getattr(self._load(), attr)
+
+  def __dir__(self) -> list:
+    return dir(self._load())
+
+
+def lazy_import(name: str) -> types.ModuleType:
+  """ Returns the module if it is imported already, otherwise a LazyModule importing it on first use.
+
+  Args:
+      name (str): Module name, e.g. "geopandas" or "matplotlib.pyplot".
+
+  Returns:
+      module
+  """
+  module = sys.modules.get(name)
+  return module if module is not None else LazyModule(name)
@@ -1,10 +1,21 @@
-import logging
+import os
 import sys
-from logging.handlers import TimedRotatingFileHandler
+import time
+import queue
+import atexit
+import logging
+import threading
+import multiprocessing.util
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
 from config import Config
 
 FORMATTER = logging.Formatter("%(asctime)s — %(name)s — %(levelname)s — %(message)s")
 
+_lock = threading.Lock()
+_listener = None
+_listener_pid = None
+_finalizer_pid = None
+
 
 def get_console_handler():
   console_handler = logging.StreamHandler(sys.stdout)
@@ -18,12 +29,145 @@ def get_file_handler():
   return file_handler
 
 
-def get_logger(logger_name):
+def _stop_listener() -> None:
+  """ Flushes the queue and closes the handlers of this process.
+  """
+  global _listener
+  with _lock:
+    if _listener is not None and _listener_pid == os.getpid():
+      _listener.stop()
+      for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+def _reset_after_fork() -> None:
+  # the lock may have been held by another thread of the parent at the time of the fork
+  global _lock
+  _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+  os.register_at_fork(after_in_child=_reset_after_fork)
+# registered once, forked children inherit it and stopping a listener that is not running does nothing
+atexit.register(_stop_listener)
+
+
+def _get_listener() -> QueueListener:
+  """ Returns the background writer of this process, starting it on first use.
+      A forked worker does not inherit the writer thread of its parent, so it starts its own.
+  """
+  global _listener, _listener_pid, _finalizer_pid
+  if _listener is not None and _listener_pid == os.getpid():
+    return _listener
+  with _lock:
+    if _listener is None or _listener_pid != os.getpid():
+      _listener = QueueListener(queue.SimpleQueue(), get_console_handler(), get_file_handler(),
+                                respect_handler_level=True)
+      _listener_pid = os.getpid()
+      _listener.start()
+      if _finalizer_pid != _listener_pid:
+        # worker processes of multiprocessing leave through os._exit and never run atexit hooks,
+        # and start with an empty finalizer registry, so this is registered once per process
+        multiprocessing.util.Finalize(None, _stop_listener, exitpriority=0)
+        _finalizer_pid = _listener_pid
+  return _listener
+
+
+class _ProcessQueueHandler(QueueHandler):
+  """ QueueHandler writing to the background writer of the current process.
+  """
+
+  def __init__(self) -> None:
+    super().__init__(None)
+
+  def enqueue(self, record: logging.LogRecord) -> None:
+    _get_listener().queue.put_nowait(record)
+
+
+# the only handler attached to loggers, so loggers never hold files or streams of their own
+QUEUE_HANDLER = _ProcessQueueHandler()
+
+
+class RateLimitFilter(logging.Filter):
+  """ Lets at most `rate` records per second through, with bursts of up to `burst` records.
+      Warnings and errors always pass. The number of dropped records is added to the next record that passes.
+  """
+
+  def __init__(self, rate: float, burst: int = None) -> None:
+    super().__init__()
+    self.rate = rate
+    self.burst = burst or max(1, int(rate))
+    self._tokens = float(self.burst)
+    self._updated = time.monotonic()
+    self._suppressed = 0
+    self._lock = threading.Lock()
+
+  def filter(self, record: logging.LogRecord) -> bool:
+    with self._lock:
+      now = time.monotonic()
+      self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+      self._updated = now
+      if record.levelno < logging.WARNING:
+        if self._tokens < 1:
+          self._suppressed += 1
+          return False
+        self._tokens -= 1
+      if self._suppressed > 0:
+        record.msg = f"{record.getMessage()} ({self._suppressed} similar messages suppressed)"
+        record.args = None
+        self._suppressed = 0
+    return True
+
+
+class SampleFilter(logging.Filter):
+  """ Lets every n-th record through. Warnings and errors always pass.
+  """
+
+  def __init__(self, every: int) -> None:
+    super().__init__()
+    self.every = every
+    self._count = 0
+    self._lock = threading.Lock()
+
+  def filter(self, record: logging.LogRecord) -> bool:
+    if record.levelno >= logging.WARNING:
+      return True
+    with self._lock:
+      self._count += 1
+      return (self._count - 1) % self.every == 0
+
+
+def set_level(logger_name: str, level) -> None:
+  """ Changes the level of a subsystem at runtime, e.g. set_level("TileCache", "WARNING").
+  """
+  logging.getLogger(logger_name).setLevel(level)
+
+
+def get_logger(logger_name, rate: float = None, sample: int = None):
+  """ Returns a logger writing through the shared background writer.
+      Calling it again for the same name returns the same logger without adding handlers.
+
+  Args:
+      logger_name (str): Subsystem name, levels are configured per name in Config.LOG_LEVELS.
+          Dotted names like "GetData.requests" inherit the level of their subsystem.
+      rate (float, optional): Limit of info and debug records per second, for per-tile and per-request messages.
+          Defaults to None.
+      sample (int, optional): Keep only every n-th info and debug record. Defaults to None.
+
+  Returns:
+      logging.Logger
+  """
   logger = logging.getLogger(logger_name)
-  # better to have too much log than not enough
-  logger.setLevel(logging.DEBUG)
-  logger.addHandler(get_console_handler())
-  logger.addHandler(get_file_handler())
-  # with this pattern, it's rarely necessary to propagate the error up to parent
-  logger.propagate = False
+  with _lock:
+    if QUEUE_HANDLER not in logger.handlers:
+      subsystem = logger_name.split(".")[0]
+      logger.setLevel(Config.LOG_LEVELS.get(logger_name, Config.LOG_LEVELS.get(subsystem, Config.LOG_LEVEL)))
+      logger.addHandler(QUEUE_HANDLER)
+    if rate is not None and not any(isinstance(f, RateLimitFilter) for f in logger.filters):
+      logger.addFilter(RateLimitFilter(rate))
+    if sample is not None and not any(isinstance(f, SampleFilter) for f in logger.filters):
+      logger.addFilter(SampleFilter(sample))
+    # with this pattern, it's rarely necessary to propagate the error up to parent
+    logger.propagate = False
   return logger
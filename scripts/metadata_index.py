@@ -0,0 +1,188 @@
+import threading
+import numpy as np
+import pandas as pd
+import shapely
+from bounds import Bounds
+from config import Config
+from file_handler import FileHandler
+from shapely.strtree import STRtree
+
+CATALOG_NAME = "usgs_3dep_metadata"
+STRING_COLUMNS = ["filename", "region"]
+NUMERIC_COLUMNS = {'year': np.float64, 'xmin': np.float64, 'xmax': np.float64,
+                   'ymin': np.float64, 'ymax': np.float64, 'points': np.int64}
+
+PREDICATES = {
+    # predicate(input_geometry, region_geometry) as evaluated by STRtree.query,
+    # covered_by rather than within so boundaries on the edge of a region still match
+    "contains": "covered_by",
+    "intersects": "intersects",
+}
+
+
+class MetadataIndex:
+  """ An STR-packed R-tree built once over the 3DEP metadata catalog.
+      Answers which EPT resources contain, intersect or are nearest to a boundary
+      without scanning every row of the catalog.
+  """
+
+  def __init__(self, metadata: pd.DataFrame) -> None:
+    """
+    Args:
+        metadata (pd.DataFrame): Resource metadata having xmin, xmax, ymin and ymax columns in EPSG:3857.
+    """
+    self.metadata = metadata.reset_index(drop=True)
+    self._boxes = shapely.box(self.metadata['xmin'].to_numpy(),
+                              self.metadata['ymin'].to_numpy(),
+                              self.metadata['xmax'].to_numpy(),
+                              self.metadata['ymax'].to_numpy())
+    self._tree = STRtree(self._boxes)
+
+  def __len__(self) -> int:
+    return len(self.metadata)
+
+  def _get_predicate(self, predicate: str) -> str:
+    if predicate not in PREDICATES:
+      raise ValueError(
+          f"unknown predicate '{predicate}', expected one of {list(PREDICATES)}")
+    return PREDICATES[predicate]
+
+  @staticmethod
+  def _get_geometry(bounds: Bounds):
+    """ The boundary as geometry, a point or a line when it has no width or height.
+    """
+    if bounds.xmin == bounds.xmax and bounds.ymin == bounds.ymax:
+      return shapely.Point(bounds.xmin, bounds.ymin)
+    if bounds.xmin == bounds.xmax or bounds.ymin == bounds.ymax:
+      return shapely.LineString([(bounds.xmin, bounds.ymin), (bounds.xmax, bounds.ymax)])
+    return shapely.box(bounds.xmin, bounds.ymin, bounds.xmax, bounds.ymax)
+
+  def query(self, bounds: Bounds, predicate: str = "contains") -> pd.DataFrame:
+    """ Searches for regions satisfying a spatial predicate against the boundary.
+
+    Args:
+        bounds (Bounds): Boundary of interest in EPSG:3857.
+        predicate (str, optional): "contains" keeps regions fully enclosing the boundary,
+            "intersects" also keeps regions partially overlapping it. Defaults to "contains".
+
+    Returns:
+        pd.DataFrame: Resource metadata rows in catalog order.
+    """
+    geometry = self._get_geometry(bounds)
+    idx = self._tree.query(geometry, predicate=self._get_predicate(predicate))
+    return self.metadata.iloc[np.sort(idx)]
+
+  def contains(self, bounds: Bounds) -> pd.DataFrame:
+    """ Returns regions that fully enclose the boundary.
+    """
+    return self.query(bounds, "contains")
+
+  def intersects(self, bounds: Bounds) -> pd.DataFrame:
+    """ Returns regions that fully or partially overlap the boundary.
+    """
+    return self.query(bounds, "intersects")
+
+  def nearest(self, bounds: Bounds, max_distance: float = None) -> pd.DataFrame:
+    """ Returns the region(s) closest to the boundary, useful when a boundary falls outside every survey.
+
+    Args:
+        bounds (Bounds): Boundary of interest in EPSG:3857.
+        max_distance (float, optional): Ignore regions further than this distance (in meters). Defaults to None.
+
+    Returns:
+        pd.DataFrame: Resource metadata with an additional distance column. Equidistant regions are all returned.
+    """
+    geometry = self._get_geometry(bounds)
+    idx, distance = self._tree.query_nearest(
+        geometry, max_distance=max_distance, return_distance=True, all_matches=True)
+    df = self.metadata.iloc[idx].copy()
+    df['distance'] = distance
+    return df
+
+  def query_bulk(self, geometries, predicate: str = "intersects") -> pd.DataFrame:
+    """ Resolves many geometries against the catalog in a single vectorized call.
+
+    Args:
+        geometries: Array-like of shapely geometries (or a GeoSeries) in EPSG:3857.
+        predicate (str, optional): "contains" or "intersects". Defaults to "intersects".
+
+    Returns:
+        pd.DataFrame: One row per (input geometry, region) match, with an input_index column
+            holding the position of the input geometry followed by the region metadata.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    input_idx, region_idx = self._tree.query(
+        geometries, predicate=self._get_predicate(predicate))
+    order = np.lexsort((region_idx, input_idx))
+    input_idx, region_idx = input_idx[order], region_idx[order]
+    df = self.metadata.iloc[region_idx].reset_index(drop=True)
+    df.insert(0, 'input_index', input_idx)
+    return df
+
+
+def to_catalog(metadata: pd.DataFrame) -> np.ndarray:
+  """ Packs the metadata into a fixed-width structured array, the binary catalog format.
+      Missing years are stored as NaN.
+
+  Args:
+      metadata (pd.DataFrame): Metadata with the columns of GetMetadata.
+
+  Returns:
+      np.ndarray: structured array, one record per EPT resource
+  """
+  dtype = [(c, f"U{max(1, metadata[c].astype(str).str.len().max())}") for c in STRING_COLUMNS]
+  dtype += list(NUMERIC_COLUMNS.items())
+  catalog = np.empty(len(metadata), dtype=dtype)
+  for column in STRING_COLUMNS:
+    catalog[column] = metadata[column].astype(str).to_numpy()
+  for column, column_type in NUMERIC_COLUMNS.items():
+    catalog[column] = metadata[column].to_numpy(dtype=column_type)
+  return catalog
+
+
+def from_catalog(catalog: np.ndarray) -> pd.DataFrame:
+  """ Unpacks a binary catalog into the metadata data frame.
+  """
+  return pd.DataFrame({c: catalog[c] for c in catalog.dtype.names})
+
+
+def load_catalog(name: str = CATALOG_NAME) -> pd.DataFrame:
+  """ Loads the metadata from the memory-mapped binary catalog, which avoids parsing the CSV.
+      The catalog is regenerated from the CSV when it is missing or older than the CSV.
+
+  Args:
+      name (str, optional): Name of the metadata files in the assets directory. Defaults to CATALOG_NAME.
+
+  Returns:
+      pd.DataFrame: Resource metadata
+  """
+  file_handler = FileHandler()
+  csv = Config.ASSETS_PATH / f"{name}.csv"
+  npy = Config.ASSETS_PATH / f"{name}.npy"
+  if npy.exists() and (not csv.exists() or npy.stat().st_mtime >= csv.stat().st_mtime):
+    catalog = file_handler.read_npy(name)
+    if catalog is not None:
+      return from_catalog(catalog)
+  metadata = file_handler.read_csv(name)
+  file_handler.save_npy(to_catalog(metadata), name)
+  return metadata
+
+
+_shared_lock = threading.Lock()
+_shared_indexes = {}
+
+
+def get_shared_index(name: str = CATALOG_NAME) -> MetadataIndex:
+  """ Returns the process-wide MetadataIndex of a catalog, loading it on first use.
+      Worker processes forked after the first call inherit it without loading it again.
+
+  Args:
+      name (str, optional): Name of the metadata files in the assets directory. Defaults to CATALOG_NAME.
+
+  Returns:
+      MetadataIndex
+  """
+  with _shared_lock:
+    if name not in _shared_indexes:
+      _shared_indexes[name] = MetadataIndex(load_catalog(name))
+    return _shared_indexes[name]
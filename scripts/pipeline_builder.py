@@ -0,0 +1,80 @@
+import copy
+
+WRITER_PREFIX = "writers."
+
+# stages of usgs_3dep_pipeline.json by tag, in execution order
+PROFILES = {
+    # points as stored in the EPT resource
+    "raw": ["read_data", "crop", "reprojection"],
+    # ground points classified by SMRF
+    "ground": ["read_data", "crop", "no_noise", "wipe_classes", "groundify", "classify", "reprojection"],
+    # ground points rasterized into an IDW GeoTIFF
+    "dtm": ["read_data", "crop", "no_noise", "wipe_classes", "groundify", "classify", "reprojection",
+            "writers_gdal"],
+    # ground points written as LAZ and rasterized, the original behaviour
+    "default": ["read_data", "crop", "no_noise", "wipe_classes", "groundify", "classify", "reprojection",
+                "writers_las", "writers_gdal"],
+    # ground points written as COPC, queryable by bounds and level without reading the whole file
+    "copc": ["read_data", "crop", "no_noise", "wipe_classes", "groundify", "classify", "reprojection",
+             "writers_copc"],
+}
+
+
+class PipelineBuilder:
+  """ Assembles pdal pipeline definitions from the tagged stages of a template.
+      Stages are looked up by tag rather than position and chained in the order a profile lists them.
+  """
+
+  def __init__(self, template: dict) -> None:
+    """
+    Args:
+        template (dict): Pipeline template, every stage must carry a unique tag.
+    """
+    self.stages = {stage['tag']: stage for stage in template['pipeline']}
+
+  def get_tags(self, profile, in_memory: bool = False) -> list:
+    """ Resolves a profile into the list of stage tags to run.
+
+    Args:
+        profile (str | list): Name of a profile in PROFILES, or an explicit list of tags.
+        in_memory (bool, optional): Leave out every writer stage. Defaults to False.
+
+    Returns:
+        list: stage tags
+    """
+    if isinstance(profile, str):
+      if profile not in PROFILES:
+        raise ValueError(f"unknown pipeline profile '{profile}', expected one of {list(PROFILES)}")
+      profile = PROFILES[profile]
+    unknown = [tag for tag in profile if tag not in self.stages]
+    if len(unknown) > 0:
+      raise ValueError(f"pipeline template has no stages tagged {unknown}")
+    if in_memory:
+      profile = [tag for tag in profile if not self.stages[tag]['type'].startswith(WRITER_PREFIX)]
+    return list(profile)
+
+  def build(self, profile="default", in_memory: bool = False, options: dict = None) -> dict:
+    """ Builds a pipeline definition.
+
+    Args:
+        profile (str | list, optional): Name of a profile in PROFILES, or an explicit list of tags. Defaults to "default".
+        in_memory (bool, optional): Skip the LAS/GDAL writers, results are only available as arrays. Defaults to False.
+        options (dict, optional): Stage options by tag, e.g. {"crop": {"polygon": ...}}.
+            Options of stages not in the profile are ignored. Defaults to None.
+
+    Returns:
+        dict: pipeline definition
+    """
+    options = options or {}
+    stages = []
+    previous = None
+    for tag in self.get_tags(profile, in_memory):
+      stage = copy.deepcopy(self.stages[tag])
+      stage.update(options.get(tag, {}))
+      if previous is None:
+        stage.pop('inputs', None)
+      else:
+        stage['inputs'] = [previous]
+      stages.append(stage)
+      previous = tag
+    return {'pipeline': stages}
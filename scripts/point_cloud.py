@@ -0,0 +1,246 @@
+from __future__ import annotations
+import numpy as np
+from lazy_import import lazy_import
+from bounds import Bounds
+from point_index import PointIndex
+from transform import transform_xy
+
+gpd = lazy_import("geopandas")
+
+DEFAULT_SCALE = (0.01, 0.01, 0.01)
+COORDINATES = ("X", "Y", "Z")
+
+
+class PointCloud:
+  """ A compact, array-backed point cloud: a NumPy structured array with X, Y, Z (and optionally
+      other PDAL dimensions) plus its coordinate reference system and bounds.
+      Coordinates can be stored LAS-style as int32 with a scale and offset per axis.
+  """
+
+  __slots__ = ("points", "epsg", "bounds", "scale", "offset", "_index")
+
+  def __init__(self, points: np.ndarray, epsg: int, bounds: Bounds = None,
+               scale: np.ndarray = None, offset: np.ndarray = None) -> None:
+    """
+    Args:
+        points (np.ndarray): Structured array having at least X, Y and Z fields.
+        epsg (int): Coordinate reference system of the coordinates.
+        bounds (Bounds, optional): Horizontal extent of the points. Computed from the points when omitted.
+        scale (np.ndarray, optional): Per-axis scale of quantized int32 coordinates. Defaults to None.
+        offset (np.ndarray, optional): Per-axis offset of quantized int32 coordinates. Defaults to None.
+    """
+    self.points = points
+    self.epsg = epsg
+    self.scale = None if scale is None else np.asarray(scale, dtype=float)
+    self.offset = None if offset is None else np.asarray(offset, dtype=float)
+    self.bounds = bounds if bounds is not None else self._compute_bounds()
+    self._index = None
+
+  @classmethod
+  def from_arrays(cls, array_data: list, epsg: int, dimensions: list = None,
+                  quantize: bool = False, scale: tuple = DEFAULT_SCALE) -> "PointCloud":
+    """ Builds a point cloud from the arrays of a pdal pipeline.
+
+    Args:
+        array_data (list): Structured arrays from pdal.Pipeline.arrays, all of them are concatenated.
+        epsg (int): Coordinate reference system of the arrays.
+        dimensions (list, optional): Extra PDAL dimensions to keep. Defaults to None.
+        quantize (bool, optional): Store coordinates as scaled int32. Defaults to False.
+        scale (tuple, optional): Per-axis scale used when quantizing. Defaults to DEFAULT_SCALE.
+
+    Returns:
+        PointCloud
+    """
+    arrays = [a for a in array_data if len(a) > 0]
+    if len(arrays) == 0:
+      return cls.from_xyz(np.empty((0, 3)), epsg)
+
+    fields = list(COORDINATES) + [d for d in (dimensions or []) if d in arrays[0].dtype.names]
+    dtype = [(f, np.float64 if f in COORDINATES else arrays[0].dtype[f]) for f in fields]
+    points = np.empty(sum(len(a) for a in arrays), dtype=dtype)
+    start = 0
+    for a in arrays:
+      for f in fields:
+        points[f][start:start + len(a)] = a[f]
+      start += len(a)
+
+    cloud = cls(points, epsg)
+    return cloud.quantize(scale) if quantize else cloud
+
+  @classmethod
+  def from_xyz(cls, xyz: np.ndarray, epsg: int, columns: dict = None) -> "PointCloud":
+    """ Builds a point cloud from an (n, 3) coordinate array.
+
+    Args:
+        xyz (np.ndarray): Coordinates, one point per row.
+        epsg (int): Coordinate reference system of the coordinates.
+        columns (dict, optional): Extra per-point dimensions, name to array. Defaults to None.
+
+    Returns:
+        PointCloud
+    """
+    xyz = np.asarray(xyz, dtype=float).reshape(-1, 3)
+    columns = columns or {}
+    dtype = [(f, np.float64) for f in COORDINATES] + [(k, np.asarray(v).dtype) for k, v in columns.items()]
+    points = np.empty(len(xyz), dtype=dtype)
+    for i, f in enumerate(COORDINATES):
+      points[f] = xyz[:, i]
+    for k, v in columns.items():
+      points[k] = v
+    return cls(points, epsg)
+
+  @classmethod
+  def from_geodataframe(cls, df: gpd.GeoDataFrame) -> "PointCloud":
+    """ Builds a point cloud from a geopandas data frame of points with an elevation column.
+        Numeric columns other than elevation are kept as dimensions.
+    """
+    columns = {c: df[c].to_numpy() for c in df.columns
+               if c not in ("geometry", "elevation") and np.issubdtype(df[c].dtype, np.number)}
+    xyz = np.column_stack((df.geometry.x.to_numpy(), df.geometry.y.to_numpy(),
+                           df['elevation'].to_numpy()))
+    return cls.from_xyz(xyz, df.crs.to_epsg(), columns)
+
+  @classmethod
+  def concat(cls, clouds: list) -> "PointCloud":
+    """ Concatenates point clouds sharing a coordinate reference system and dimensions.
+    """
+    clouds = [c for c in clouds if c is not None]
+    if len(clouds) == 0:
+      raise ValueError("no point clouds to concatenate")
+    if len(clouds) == 1:
+      return clouds[0]
+    epsg = clouds[0].epsg
+    if any(c.epsg != epsg for c in clouds):
+      raise ValueError("point clouds have different coordinate reference systems")
+    if clouds[0].is_quantized:
+      scale = clouds[0].scale
+      offset = np.min([c.offset for c in clouds], axis=0)
+      return cls.concat([c.dequantize() for c in clouds]).quantize(scale, offset)
+    return cls(np.concatenate([c.points for c in clouds]), epsg)
+
+  def __len__(self) -> int:
+    return len(self.points)
+
+  def __getitem__(self, index) -> "PointCloud":
+    """ Selects points by slice, index array or boolean mask.
+    """
+    return PointCloud(self.points[index], self.epsg, None, self.scale, self.offset)
+
+  def __repr__(self) -> str:
+    return f"PointCloud({len(self)} points, EPSG:{self.epsg}, dimensions={self.dimensions})"
+
+  @property
+  def is_quantized(self) -> bool:
+    return self.scale is not None
+
+  @property
+  def dimensions(self) -> list:
+    return list(self.points.dtype.names)
+
+  @property
+  def extra_dimensions(self) -> list:
+    return [d for d in self.points.dtype.names if d not in COORDINATES]
+
+  @property
+  def nbytes(self) -> int:
+    return self.points.nbytes
+
+  def _coordinate(self, axis: int) -> np.ndarray:
+    values = self.points[COORDINATES[axis]]
+    if self.is_quantized:
+      return values * self.scale[axis] + self.offset[axis]
+    return values
+
+  @property
+  def x(self) -> np.ndarray:
+    return self._coordinate(0)
+
+  @property
+  def y(self) -> np.ndarray:
+    return self._coordinate(1)
+
+  @property
+  def z(self) -> np.ndarray:
+    return self._coordinate(2)
+
+  def xyz(self) -> np.ndarray:
+    """ Returns the coordinates as an (n, 3) float array.
+    """
+    xyz = np.empty((len(self), 3))
+    for axis in range(3):
+      xyz[:, axis] = self._coordinate(axis)
+    return xyz
+
+  def get_index(self) -> PointIndex:
+    """ Returns the KD-tree of the coordinates, built on first use and kept with the cloud.
+    """
+    if self._index is None:
+      self._index = PointIndex(self.xyz())
+    return self._index
+
+  def _compute_bounds(self) -> Bounds:
+    if len(self) == 0:
+      return None
+    x, y = self.x, self.y
+    return Bounds(float(x.min()), float(x.max()), float(y.min()), float(y.max()))
+
+  def quantize(self, scale: tuple = DEFAULT_SCALE, offset: tuple = None) -> "PointCloud":
+    """ Stores coordinates as int32 counts of scale from offset, the LAS way.
+
+    Args:
+        scale (tuple, optional): Per-axis scale. Defaults to DEFAULT_SCALE.
+        offset (tuple, optional): Per-axis offset. Defaults to the floored minimum of each axis.
+
+    Returns:
+        PointCloud: A quantized copy.
+    """
+    xyz = self.xyz()
+    scale = np.asarray(scale, dtype=float)
+    if offset is None:
+      offset = np.floor(xyz.min(axis=0)) if len(xyz) > 0 else np.zeros(3)
+    offset = np.asarray(offset, dtype=float)
+    counts = np.round((xyz - offset) / scale)
+    if len(counts) > 0 and (counts.max() > np.iinfo(np.int32).max or counts.min() < np.iinfo(np.int32).min):
+      raise ValueError("coordinates do not fit into int32 with the given scale and offset")
+
+    dtype = [(f, np.int32) for f in COORDINATES] + [(f, self.points.dtype[f]) for f in self.extra_dimensions]
+    points = np.empty(len(self), dtype=dtype)
+    for axis, f in enumerate(COORDINATES):
+      points[f] = counts[:, axis]
+    for f in self.extra_dimensions:
+      points[f] = self.points[f]
+    return PointCloud(points, self.epsg, self.bounds, scale, offset)
+
+  def dequantize(self) -> "PointCloud":
+    """ Returns a copy having float64 coordinates.
+    """
+    if not self.is_quantized:
+      return self
+    columns = {f: self.points[f] for f in self.extra_dimensions}
+    return PointCloud.from_xyz(self.xyz(), self.epsg, columns)
+
+  def to_crs(self, epsg: int) -> "PointCloud":
+    """ Reprojects the coordinates to another coordinate reference system.
+    """
+    if epsg == self.epsg:
+      return self
+    x, y = transform_xy(self.x, self.y, self.epsg, epsg)
+    xyz = np.column_stack((x, y, self.z))
+    columns = {f: self.points[f] for f in self.extra_dimensions}
+    cloud = PointCloud.from_xyz(xyz, epsg, columns)
+    return cloud.quantize(self.scale) if self.is_quantized else cloud
+
+  def to_geodataframe(self, dimensions: list = None) -> gpd.GeoDataFrame:
+    """ Converts to a geopandas data frame with elevation and geometry columns, only done on demand.
+
+    Args:
+        dimensions (list, optional): Extra dimensions to add as columns. Defaults to all of them.
+
+    Returns:
+        gpd.GeoDataFrame
+    """
+    dimensions = self.extra_dimensions if dimensions is None else dimensions
+    data = {'elevation': self.z}
+    data.update({d: self.points[d] for d in dimensions})
+    crs = f"EPSG:{self.epsg}"
+    return gpd.GeoDataFrame(data, geometry=gpd.points_from_xy(self.x, self.y, crs=crs), crs=crs)
@@ -0,0 +1,141 @@
+import math
+import numpy as np
+from config import Config
+from lazy_import import lazy_import
+
+spatial = lazy_import("scipy.spatial")
+
+
+class PointIndex:
+  """ KD-tree over the coordinates of a point cloud for neighborhood operations: batched kNN and radius queries
+      spread over all cores, local density and the statistical and radius outlier filters of PDAL's filters.outlier.
+  """
+
+  def __init__(self, points: np.ndarray, leafsize: int = None, workers: int = None) -> None:
+    """
+    Args:
+        points (np.ndarray): An (n, 2) or (n, 3) array of coordinates, best in a projected CRS.
+        leafsize (int, optional): Points per leaf of the tree. Defaults to Config.KDTREE_LEAF_SIZE.
+        workers (int, optional): Threads per query, -1 uses every core. Defaults to Config.KDTREE_WORKERS.
+    """
+    self.points = np.ascontiguousarray(points, dtype=float)
+    self.workers = workers or Config.KDTREE_WORKERS
+    self.tree = spatial.cKDTree(self.points, leafsize=leafsize or Config.KDTREE_LEAF_SIZE,
+                                compact_nodes=False, balanced_tree=False)
+
+  def __len__(self) -> int:
+    return len(self.points)
+
+  def _batches(self, queries: np.ndarray, batch_size: int):
+    """ Splits queries into batches, so the result arrays of one batch bound the memory of a query.
+    """
+    batch_size = batch_size or Config.CHUNK_SIZE
+    for start in range(0, len(queries), batch_size):
+      yield start, queries[start:start + batch_size]
+
+  def knn(self, k: int, queries: np.ndarray = None, batch_size: int = None) -> tuple:
+    """ Finds the k nearest neighbors of every query point.
+
+    Args:
+        k (int): Number of neighbors.
+        queries (np.ndarray, optional): Query coordinates. Defaults to None, the indexed points themselves,
+            in which case every point is left out of its own neighbors.
+        batch_size (int, optional): Query points per batch. Defaults to Config.CHUNK_SIZE.
+
+    Returns:
+        tuple: (n, k) distances and (n, k) indices of the neighbors, nearest first
+    """
+    own = queries is None
+    queries = self.points if own else np.asarray(queries, dtype=float)
+    distances = np.empty((len(queries), k))
+    indices = np.empty((len(queries), k), dtype=np.int64)
+    for start, batch in self._batches(queries, batch_size):
+      d, i = self.tree.query(batch, k=k + own, workers=self.workers)
+      d, i = d.reshape(len(batch), -1), i.reshape(len(batch), -1)
+      distances[start:start + len(batch)] = d[:, own:]
+      indices[start:start + len(batch)] = i[:, own:]
+    return distances, indices
+
+  def radius_count(self, radius: float, queries: np.ndarray = None, batch_size: int = None) -> np.ndarray:
+    """ Counts the points within radius of every query point, without building the neighbor lists.
+
+    Args:
+        radius (float): Search radius.
+        queries (np.ndarray, optional): Query coordinates. Defaults to None, the indexed points themselves,
+            in which case a point does not count itself.
+        batch_size (int, optional): Query points per batch. Defaults to Config.CHUNK_SIZE.
+
+    Returns:
+        np.ndarray: Number of neighbors per query point
+    """
+    own = queries is None
+    queries = self.points if own else np.asarray(queries, dtype=float)
+    counts = np.empty(len(queries), dtype=np.int64)
+    for start, batch in self._batches(queries, batch_size):
+      counts[start:start + len(batch)] = self.tree.query_ball_point(batch, radius, workers=self.workers,
+                                                                     return_length=True)
+    return counts - own
+
+  def radius(self, radius: float, queries: np.ndarray = None, batch_size: int = None) -> list:
+    """ Finds the points within radius of every query point.
+
+    Args:
+        radius (float): Search radius.
+        queries (np.ndarray, optional): Query coordinates. Defaults to None, the indexed points themselves,
+            in which case every point is left out of its own neighbors.
+        batch_size (int, optional): Query points per batch. Defaults to Config.CHUNK_SIZE.
+
+    Returns:
+        list: Index array of the neighbors of every query point
+    """
+    own = queries is None
+    queries = self.points if own else np.asarray(queries, dtype=float)
+    neighbors = []
+    for start, batch in self._batches(queries, batch_size):
+      found = self.tree.query_ball_point(batch, radius, workers=self.workers)
+      for offset, indices in enumerate(found):
+        indices = np.asarray(indices, dtype=np.int64)
+        neighbors.append(indices[indices != start + offset] if own else indices)
+    return neighbors
+
+  def density(self, k: int = 8) -> np.ndarray:
+    """ Estimates the local density of every point as k points in the ball reaching its k-th nearest neighbor.
+
+    Args:
+        k (int, optional): Number of neighbors. Defaults to 8.
+
+    Returns:
+        np.ndarray: Points per unit area (2D index) or volume (3D index)
+    """
+    distances, _ = self.knn(k)
+    dimension = self.points.shape[1]
+    unit_ball = math.pi ** (dimension / 2) / math.gamma(dimension / 2 + 1)
+    with np.errstate(divide="ignore"):
+      return k / (unit_ball * distances[:, -1] ** dimension)
+
+  def statistical_outliers(self, mean_k: int = 8, multiplier: float = 2.0) -> np.ndarray:
+    """ Flags points whose mean distance to their mean_k neighbors exceeds the global mean of those distances
+        by more than multiplier standard deviations, like filters.outlier method "statistical".
+
+    Args:
+        mean_k (int, optional): Number of neighbors. Defaults to 8.
+        multiplier (float, optional): Standard deviations above the mean that are still inliers. Defaults to 2.
+
+    Returns:
+        np.ndarray: Boolean mask, True for outliers
+    """
+    distances, _ = self.knn(mean_k)
+    mean = distances.mean(axis=1)
+    return mean > mean.mean() + multiplier * mean.std()
+
+  def radius_outliers(self, radius: float = 1.0, min_k: int = 2) -> np.ndarray:
+    """ Flags points having fewer than min_k neighbors within radius, like filters.outlier method "radius".
+
+    Args:
+        radius (float, optional): Search radius. Defaults to 1.
+        min_k (int, optional): Least number of neighbors of an inlier. Defaults to 2.
+
+    Returns:
+        np.ndarray: Boolean mask, True for outliers
+    """
+    return self.radius_count(radius) < min_k
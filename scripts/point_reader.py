@@ -0,0 +1,190 @@
+import os
+import re
+import numpy as np
+from pathlib import Path
+from config import Config
+from bounds import Bounds
+from lazy_import import lazy_import
+
+laspy = lazy_import("laspy")
+
+INDEX_SUFFIX = ".chunks.npz"
+CHUNK_DTYPE = [("start", np.int64), ("count", np.int64),
+               ("xmin", np.float64), ("xmax", np.float64), ("ymin", np.float64), ("ymax", np.float64)]
+
+
+def get_laspy_dimension(name: str) -> str:
+  """ Maps a PDAL dimension name to its laspy name, e.g. ReturnNumber to return_number.
+  """
+  return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+
+def get_structured_points(record, dimensions: list) -> np.ndarray:
+  """ Copies a laspy point record into a structured array of scaled X, Y, Z and the dimensions.
+  """
+  dtype = [("X", np.float64), ("Y", np.float64), ("Z", np.float64)]
+  values = [record.x, record.y, record.z]
+  for dimension in dimensions:
+    value = np.asarray(record[get_laspy_dimension(dimension)])
+    dtype.append((dimension, value.dtype))
+    values.append(value)
+  output = np.empty(len(values[0]), dtype=dtype)
+  for (name, _), value in zip(dtype, values):
+    output[name] = value
+  return output
+
+
+class ChunkBoundsIndex:
+  """ Bounding box of every run of chunk_size points of a LAZ file, in file order.
+      LAZ is compressed in independent chunks, so a window read only decompresses the runs whose box intersects it.
+      This is not a spatial index like LAX: it only skips runs when the file is spatially ordered,
+      e.g. sorted or written tile by tile. In a file with shuffled points every run spans the whole extent
+      and a window read decompresses the whole file.
+      The index is stored next to the file and rebuilt when the file changes.
+  """
+
+  def __init__(self, chunks: np.ndarray, chunk_size: int) -> None:
+    """
+    Args:
+        chunks (np.ndarray): Structured array with CHUNK_DTYPE, one record per run of points.
+        chunk_size (int): Number of points per run.
+    """
+    self.chunks = chunks
+    self.chunk_size = chunk_size
+
+  @staticmethod
+  def get_path(path: Path) -> Path:
+    return Path(str(path) + INDEX_SUFFIX)
+
+  @staticmethod
+  def _get_signature(path: Path) -> np.ndarray:
+    stat = os.stat(path)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+  @classmethod
+  def build(cls, path: Path, chunk_size: int = None) -> "ChunkBoundsIndex":
+    """ Builds the index with one pass over the file and stores it next to the file.
+
+    Args:
+        path (Path): LAZ file.
+        chunk_size (int, optional): Points per run, best a multiple of the LAZ chunk size. Defaults to Config.LAZ_INDEX_CHUNK_SIZE.
+
+    Returns:
+        ChunkBoundsIndex
+    """
+    chunk_size = chunk_size or Config.LAZ_INDEX_CHUNK_SIZE
+    records = []
+    start = 0
+    with laspy.open(path) as reader:
+      for points in reader.chunk_iterator(chunk_size):
+        if len(points) == 0:
+          continue
+        x, y = points.x, points.y
+        records.append((start, len(points), x.min(), x.max(), y.min(), y.max()))
+        start += len(points)
+    index = cls(np.array(records, dtype=CHUNK_DTYPE), chunk_size)
+    tmp = Path(str(path) + f".{os.getpid()}.tmp.npz")
+    np.savez(tmp, chunks=index.chunks, chunk_size=chunk_size, signature=cls._get_signature(path))
+    os.replace(tmp, cls.get_path(path))
+    return index
+
+  @classmethod
+  def load(cls, path: Path, chunk_size: int = None) -> "ChunkBoundsIndex":
+    """ Loads the stored index of a file, building it when it is missing, stale or of another chunk size.
+    """
+    chunk_size = chunk_size or Config.LAZ_INDEX_CHUNK_SIZE
+    try:
+      with np.load(cls.get_path(path), allow_pickle=False) as stored:
+        if (int(stored['chunk_size']) == chunk_size
+                and np.array_equal(stored['signature'], cls._get_signature(path))):
+          return cls(stored['chunks'], chunk_size)
+    except (FileNotFoundError, ValueError, KeyError):
+      pass
+    return cls.build(path, chunk_size)
+
+  def query(self, bounds: Bounds) -> np.ndarray:
+    """ Returns the runs whose bounding box intersects the bounds.
+    """
+    c = self.chunks
+    hit = ((c['xmax'] >= bounds.xmin) & (c['xmin'] <= bounds.xmax)
+           & (c['ymax'] >= bounds.ymin) & (c['ymin'] <= bounds.ymax))
+    return c[hit]
+
+
+class PointReader:
+  """ Reads a window of a local LAS/LAZ file: the points inside bounds, a subset of dimensions and every n-th point.
+      Uncompressed LAS is memory-mapped, so only the pages holding requested points are read.
+      LAZ goes through a ChunkBoundsIndex, so in a spatially ordered file only the chunks overlapping the window
+      are decompressed.
+  """
+
+  def __init__(self, path: Path) -> None:
+    """
+    Args:
+        path (Path): LAS or LAZ file.
+    """
+    self.path = Path(path)
+    with laspy.open(self.path) as reader:
+      self.header = reader.header
+    self.is_compressed = self.path.suffix.lower() == ".laz"
+
+  def _get_mask(self, X: np.ndarray, Y: np.ndarray, bounds: Bounds) -> np.ndarray:
+    """ Bounds test on the raw integer coordinates, which avoids scaling every point.
+    """
+    scales, offsets = self.header.scales, self.header.offsets
+    xmin = np.ceil((bounds.xmin - offsets[0]) / scales[0])
+    xmax = np.floor((bounds.xmax - offsets[0]) / scales[0])
+    ymin = np.ceil((bounds.ymin - offsets[1]) / scales[1])
+    ymax = np.floor((bounds.ymax - offsets[1]) / scales[1])
+    return (X >= xmin) & (X <= xmax) & (Y >= ymin) & (Y <= ymax)
+
+  def _read_las(self, bounds: Bounds, dimensions: list, stride: int) -> np.ndarray:
+    point_format = self.header.point_format
+    data = np.memmap(self.path, dtype=point_format.dtype(), mode='r',
+                     offset=self.header.offset_to_point_data, shape=(self.header.point_count,))
+    data = data[::stride]
+    if bounds is None:
+      selected = np.arange(len(data))
+    else:
+      selected = np.flatnonzero(self._get_mask(data['X'], data['Y'], bounds))
+    record = laspy.ScaleAwarePointRecord(np.asarray(data[selected]), point_format,
+                                         self.header.scales, self.header.offsets)
+    return get_structured_points(record, dimensions)
+
+  def _read_laz(self, bounds: Bounds, dimensions: list, stride: int, chunk_size: int) -> np.ndarray:
+    if bounds is None:
+      chunks = [(0, self.header.point_count)]
+    else:
+      chunks = [(c['start'], c['count']) for c in ChunkBoundsIndex.load(self.path, chunk_size).query(bounds)]
+    parts = []
+    with laspy.open(self.path) as reader:
+      for start, count in chunks:
+        reader.seek(start)
+        record = reader.read_points(count)
+        # stride counts points from the start of the file, so results do not depend on the index
+        selected = np.arange(start, start + count) % stride == 0
+        if bounds is not None:
+          selected &= self._get_mask(record.X, record.Y, bounds)
+        parts.append(get_structured_points(record[selected], dimensions))
+    if len(parts) == 0:
+      return get_structured_points(laspy.ScaleAwarePointRecord.zeros(0, header=self.header), dimensions)
+    return np.concatenate(parts)
+
+  def read(self, bounds: Bounds = None, dimensions: list = None, stride: int = 1,
+           chunk_size: int = None) -> np.ndarray:
+    """ Reads a window of the file.
+
+    Args:
+        bounds (Bounds, optional): Area to read, in the coordinates of the file, edges included. Defaults to None, the whole file.
+        dimensions (list, optional): Dimensions besides X, Y and Z, PDAL or laspy names,
+            e.g. ["Intensity", "Classification"]. Defaults to None.
+        stride (int, optional): Keep every n-th point of the file, like SubSampler.decimation. Defaults to 1.
+        chunk_size (int, optional): Points per run of the LAZ index. Defaults to Config.LAZ_INDEX_CHUNK_SIZE.
+
+    Returns:
+        np.ndarray: Structured array of scaled X, Y, Z and the requested dimensions, in file order
+    """
+    dimensions = list(dimensions or [])
+    if self.is_compressed:
+      return self._read_laz(bounds, dimensions, stride, chunk_size)
+    return self._read_las(bounds, dimensions, stride)
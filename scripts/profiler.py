@@ -0,0 +1,325 @@
+import os
+import sys
+import json
+import time
+import socket
+from pathlib import Path
+from log import get_logger
+from contextlib import contextmanager, nullcontext
+
+try:
+  import fcntl
+except ImportError:
+  # no advisory locks on this platform, writers shared by several processes are then not synchronized
+  fcntl = None
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+# upper bounds in seconds of the fetch duration histogram
+LATENCY_BUCKETS = [0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]
+METRIC_PREFIX = "pythonlidar"
+# keys under which pdal stages report point counts in the pipeline metadata
+COUNT_KEYS = ("count", "num_points", "points")
+
+
+def get_peak_rss() -> int:
+  """ Peak resident set size of the current process in bytes, 0 where it is not available.
+  """
+  if resource is None:
+    return 0
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # kilobytes on Linux, bytes on macOS
+  return peak if sys.platform == "darwin" else peak * 1024
+
+
+class FetchRecord:
+  """ Measurements of a single fetch: wall time, points in and out of every pipeline stage,
+      time of the Python-side conversion and memory. The peak RSS is the high-water mark of the whole process,
+      which earlier work may have set, peak_rss_increase is how much the fetch raised it.
+  """
+
+  def __init__(self, region: str, bounds: str, profile) -> None:
+    """
+    Args:
+        region (str): EPT resource name.
+        bounds (str): Bound name of the fetch.
+        profile (str | list): Pipeline profile that was executed.
+    """
+    self.region = region
+    self.bounds = bounds
+    self.profile = profile
+    self.cached = False
+    self.started = time.time()
+    self.seconds = None
+    self.points = 0
+    self.error = None
+    self.process_peak_rss = 0
+    self.peak_rss_increase = 0
+    self.stages = []
+    self._start = time.perf_counter()
+    self._start_peak_rss = get_peak_rss()
+
+  @contextmanager
+  def stage(self, tag: str, type: str = None, points_in: int = 0):
+    """ Times a stage, the caller sets points_out on the yielded dict.
+
+    Args:
+        tag (str): Stage tag, e.g. "groundify", or the name of a conversion step.
+        type (str, optional): pdal stage type, e.g. "filters.smrf". Defaults to None.
+        points_in (int, optional): Number of points entering the stage. Defaults to 0.
+    """
+    stage = {'tag': tag, 'type': type, 'points_in': points_in, 'points_out': 0}
+    start = time.perf_counter()
+    try:
+      yield stage
+    finally:
+      stage['seconds'] = time.perf_counter() - start
+      self.stages.append(stage)
+
+  def add_stage(self, tag: str, type: str = None, points_in: int = None, points_out: int = None,
+                seconds: float = None) -> None:
+    """ Adds a stage measured elsewhere, e.g. read from the pipeline metadata. Unknown values stay None.
+    """
+    self.stages.append({'tag': tag, 'type': type, 'points_in': points_in, 'points_out': points_out,
+                        'seconds': seconds})
+
+  def add_pipeline_stages(self, pipe: dict, metadata) -> None:
+    """ Adds every stage of an executed pipeline with the point counts pdal reports in its metadata.
+        pdal reports no per-stage wall time, so seconds stay None, and points stay None for stages
+        reporting no count.
+
+    Args:
+        pipe (dict): Executed pipeline definition.
+        metadata (str | dict): Metadata of the executed pdal.Pipeline.
+    """
+    if isinstance(metadata, str):
+      metadata = json.loads(metadata) if metadata else {}
+    metadata = (metadata or {}).get('metadata', metadata or {})
+    occurrences = {}
+    points_in = None
+    for stage in pipe['pipeline']:
+      entry = metadata.get(stage.get('tag')) or metadata.get(stage['type'])
+      if isinstance(entry, list):
+        # stages of the same type are listed in pipeline order
+        index = occurrences.get(stage['type'], 0)
+        occurrences[stage['type']] = index + 1
+        entry = entry[index] if index < len(entry) else None
+      points_out = None
+      if isinstance(entry, dict):
+        points_out = next((entry[k] for k in COUNT_KEYS if isinstance(entry.get(k), int)), None)
+      self.add_stage(stage.get('tag', stage['type']), stage['type'], points_in, points_out)
+      points_in = points_out
+
+  def finish(self, points: int, error: str = None) -> None:
+    self.seconds = time.perf_counter() - self._start
+    self.points = points
+    self.error = error
+    self.process_peak_rss = get_peak_rss()
+    self.peak_rss_increase = self.process_peak_rss - self._start_peak_rss
+
+  def to_dict(self) -> dict:
+    return {'region': self.region,
+            'bounds': self.bounds,
+            'profile': self.profile,
+            'cached': self.cached,
+            'started': self.started,
+            'seconds': self.seconds,
+            'points': self.points,
+            'error': self.error,
+            'process_peak_rss': self.process_peak_rss,
+            'peak_rss_increase': self.peak_rss_increase,
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'stages': self.stages}
+
+
+def measure_stage(record: FetchRecord, tag: str, type: str = None, points_in: int = 0):
+  """ FetchRecord.stage, or a context doing nothing when profiling is off.
+  """
+  if record is None:
+    return nullcontext({})
+  return record.stage(tag, type, points_in)
+
+
+class PipelineProfiler:
+  """ Collects a FetchRecord for every fetch and hands it to the registered hooks,
+      e.g. JsonLinesWriter or PrometheusTextfileWriter.
+      By default a pipeline runs exactly as it does without profiling: it is timed as a whole and every stage
+      is recorded with the point counts pdal reports in the pipeline metadata, pdal reports no per-stage time.
+      per_stage is intrusive: every stage then runs as a pipeline of its own, point arrays are copied between
+      stages and writers get their spatial reference set explicitly. Stage timings include that overhead,
+      streaming is lost and the output may differ from the unprofiled pipeline, so use it only for diagnosis.
+      Profiling is per process: concurrent fetches send a copy of the profiler to every worker process and
+      the hooks run there, records never reach the profiler of the parent. Hooks therefore have to be picklable
+      and should write somewhere shared, like JsonLinesWriter and PrometheusTextfileWriter, which lock their files.
+      A hook collecting records in memory only sees fetches run in its own process.
+  """
+
+  def __init__(self, hooks: list = None, per_stage: bool = False) -> None:
+    """
+    Args:
+        hooks (list, optional): Callables receiving the record of every finished fetch as dict. Defaults to None.
+        per_stage (bool, optional): Run and time every pipeline stage separately instead of the pipeline
+            as a whole, see above. Defaults to False.
+    """
+    self.hooks = list(hooks or [])
+    self.per_stage = per_stage
+    self._logger = get_logger("PipelineProfiler")
+
+  def __getstate__(self) -> dict:
+    state = self.__dict__.copy()
+    del state['_logger']
+    return state
+
+  def __setstate__(self, state: dict) -> None:
+    self.__dict__.update(state)
+    self._logger = get_logger("PipelineProfiler")
+
+  def add_hook(self, hook) -> None:
+    self.hooks.append(hook)
+
+  def start(self, region: str, bounds: str, profile) -> FetchRecord:
+    return FetchRecord(region, bounds, profile)
+
+  def finish(self, record: FetchRecord, points: int, error: str = None) -> None:
+    """ Completes a record and passes it to every hook, a failing hook does not fail the fetch.
+
+    Args:
+        record (FetchRecord): Record returned by start.
+        points (int): Number of points the fetch returned.
+        error (str, optional): Why the fetch failed, None when it succeeded. Defaults to None.
+    """
+    record.finish(points, error)
+    data = record.to_dict()
+    for hook in self.hooks:
+      try:
+        hook(data)
+      except Exception as e:
+        self._logger.error(f"profiler hook {hook} failed, error: {e}")
+
+
+@contextmanager
+def _locked(path: Path):
+  path.parent.mkdir(parents=True, exist_ok=True)
+  with open(path.with_name(path.name + ".lock"), 'a') as lock_file:
+    if fcntl is not None:
+      fcntl.flock(lock_file, fcntl.LOCK_EX)
+    try:
+      yield
+    finally:
+      if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class JsonLinesWriter:
+  """ Profiler hook appending every record as one JSON line.
+  """
+
+  def __init__(self, path: Path) -> None:
+    self.path = Path(path)
+
+  def __call__(self, record: dict) -> None:
+    with _locked(self.path):
+      with open(self.path, 'a') as f:
+        f.write(json.dumps(record) + "\n")
+
+
+class PrometheusTextfileWriter:
+  """ Profiler hook maintaining cumulative metrics in the Prometheus text format,
+      for the textfile collector of the node exporter. Totals are kept in a JSON file next to the textfile,
+      so several processes can share one writer.
+  """
+
+  def __init__(self, path: Path) -> None:
+    """
+    Args:
+        path (Path): Output file, should end in .prom for the textfile collector.
+    """
+    self.path = Path(path)
+    self.state_path = self.path.with_name(self.path.name + ".json")
+
+  def _read_state(self) -> dict:
+    try:
+      with open(self.state_path, 'r') as f:
+        return json.load(f)
+    except (FileNotFoundError, ValueError):
+      return {'fetches': {}, 'failures': {}, 'stages': {}, 'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+              'seconds': 0.0, 'count': 0, 'peak_rss': 0}
+
+  def _update(self, state: dict, record: dict) -> None:
+    key = f"{record['region']}|{int(record['cached'])}"
+    fetches = state['fetches'].setdefault(key, {'count': 0, 'seconds': 0.0, 'points': 0})
+    fetches['count'] += 1
+    fetches['seconds'] += record['seconds']
+    fetches['points'] += record['points']
+    if record.get('error') is not None:
+      failures = state.setdefault('failures', {})
+      failures[record['region']] = failures.get(record['region'], 0) + 1
+    for stage in record['stages']:
+      stages = state['stages'].setdefault(stage['tag'], {'count': 0, 'seconds': 0.0, 'in': 0, 'out': 0})
+      stages['count'] += 1
+      # values pdal does not report are None and left out of the totals
+      stages['seconds'] += stage['seconds'] or 0.0
+      stages['in'] += stage['points_in'] or 0
+      stages['out'] += stage['points_out'] or 0
+    bucket = next((i for i, le in enumerate(LATENCY_BUCKETS) if record['seconds'] <= le), len(LATENCY_BUCKETS))
+    state['buckets'][bucket] += 1
+    state['seconds'] += record['seconds']
+    state['count'] += 1
+    state['peak_rss'] = max(state['peak_rss'], record['process_peak_rss'])
+
+  def render(self, state: dict) -> str:
+    """ Formats the cumulative state as Prometheus text exposition.
+    """
+    p = METRIC_PREFIX
+    lines = [f"# HELP {p}_fetches_total Finished fetches.", f"# TYPE {p}_fetches_total counter"]
+    for key, fetches in sorted(state['fetches'].items()):
+      region, cached = key.split("|")
+      lines.append(f'{p}_fetches_total{{region="{region}",cached="{cached}"}} {fetches["count"]}')
+    lines += [f"# HELP {p}_fetch_failures_total Failed fetches, also counted in fetches_total.",
+              f"# TYPE {p}_fetch_failures_total counter"]
+    for region, count in sorted(state.get('failures', {}).items()):
+      lines.append(f'{p}_fetch_failures_total{{region="{region}"}} {count}')
+    lines += [f"# HELP {p}_fetched_points_total Points returned by fetches.",
+              f"# TYPE {p}_fetched_points_total counter"]
+    for key, fetches in sorted(state['fetches'].items()):
+      region, cached = key.split("|")
+      lines.append(f'{p}_fetched_points_total{{region="{region}",cached="{cached}"}} {fetches["points"]}')
+
+    lines += [f"# HELP {p}_fetch_duration_seconds Wall time of fetches.",
+              f"# TYPE {p}_fetch_duration_seconds histogram"]
+    cumulative = 0
+    for le, count in zip(LATENCY_BUCKETS + ["+Inf"], state['buckets']):
+      cumulative += count
+      lines.append(f'{p}_fetch_duration_seconds_bucket{{le="{le}"}} {cumulative}')
+    lines.append(f"{p}_fetch_duration_seconds_sum {state['seconds']}")
+    lines.append(f"{p}_fetch_duration_seconds_count {state['count']}")
+
+    lines += [f"# HELP {p}_stage_seconds_total Wall time spent in a pipeline stage.",
+              f"# TYPE {p}_stage_seconds_total counter"]
+    for tag, stage in sorted(state['stages'].items()):
+      lines.append(f'{p}_stage_seconds_total{{stage="{tag}"}} {stage["seconds"]}')
+    lines += [f"# HELP {p}_stage_points_total Points entering and leaving a pipeline stage.",
+              f"# TYPE {p}_stage_points_total counter"]
+    for tag, stage in sorted(state['stages'].items()):
+      lines.append(f'{p}_stage_points_total{{stage="{tag}",direction="in"}} {stage["in"]}')
+      lines.append(f'{p}_stage_points_total{{stage="{tag}",direction="out"}} {stage["out"]}')
+
+    lines += [f"# HELP {p}_process_peak_rss_bytes Highest process-wide peak resident set size of a fetching process.",
+              f"# TYPE {p}_process_peak_rss_bytes gauge",
+              f"{p}_process_peak_rss_bytes {state['peak_rss']}"]
+    return "\n".join(lines) + "\n"
+
+  def __call__(self, record: dict) -> None:
+    with _locked(self.path):
+      state = self._read_state()
+      self._update(state, record)
+      for path, content in ((self.state_path, json.dumps(state)), (self.path, self.render(state))):
+        # the collector may read at any time, so files are replaced atomically
+        tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+        with open(tmp, 'w') as f:
+          f.write(content)
+        os.replace(tmp, path)
@@ -1,26 +1,67 @@
 from vis import Vis
-import geopandas as gpd
 from fetch_lidar import FetchLidar
 from sub_sampler import SubSampler
+from rasterizer import Rasterizer
 from shapely.geometry import Polygon
-from fcache.cache import FileCache
+from tile_cache import TileCache
+from profiler import PipelineProfiler
+from query_planner import QueryPlanner
 
 
 class PythonLidar:
   """ PythonLidar is an open-source python package for retrieving, transforming, and visualizing point cloud data obtained through an aerial LiDAR survey. Using the package, you can select a region of interest, and download the related point cloud dataset with its metadata in different file formats (.laz, .tif, or as an ASCII file), perform transformation and visualization using the downloaded data.
   """
-  def __init__(self, epsg=26915):
+  def __init__(self, epsg=26915, as_point_cloud: bool = False, cache: bool = False,
+               profile="default", in_memory: bool = False, profiler: PipelineProfiler = None,
+               dimensions: list = None):
     self.output_epsg = epsg
     self._input_epsg = 3857
-    self._fetch_lidar = FetchLidar(self.output_epsg)
-    self._cache = FileCache('PythonLidar')
+    self._cache = TileCache() if cache else None
+    self._fetch_lidar = FetchLidar(self.output_epsg, dimensions, as_point_cloud=as_point_cloud, cache=self._cache,
+                                   profile=profile, in_memory=in_memory, profiler=profiler)
 
-  def fetch_lidar(self, polygon: Polygon, regions=[]):
-    return self._fetch_lidar.fetch_lidar_data(polygon, regions)
+  def fetch_lidar(self, polygon: Polygon, regions=[], predicate: str = "contains",
+                  workers: int = 1, timeout: float = None):
+    return self._fetch_lidar.fetch_lidar_data(polygon, regions, predicate, workers, timeout)
 
-  def get_renderer(self, df: gpd.GeoDataFrame) -> Vis:
+  def iter_lidar(self, polygon: Polygon, regions=[], predicate: str = "contains",
+                 workers: int = None, timeout: float = None):
+    return self._fetch_lidar.iter_lidar_data(polygon, regions, predicate, workers, timeout)
+
+  def stream_lidar(self, polygon: Polygon, region: str, chunk_size: int = None, resolution: float = None):
+    return self._fetch_lidar.stream_lidar_data(polygon, region, chunk_size, resolution)
+
+  def fetch_lidar_batch(self, features, regions=[], predicate: str = "contains",
+                        cluster_size: float = None, workers: int = 1):
+    return self._fetch_lidar.fetch_batch(features, regions, predicate, cluster_size, workers)
+
+  def plan_lidar(self, polygon: Polygon, regions=[], predicate: str = "contains", planner: QueryPlanner = None):
+    return self._fetch_lidar.plan_lidar_data(polygon, regions, predicate, planner)
+
+  def fetch_lidar_planned(self, polygon: Polygon, regions=[], predicate: str = "contains",
+                          planner: QueryPlanner = None, workers: int = None):
+    return self._fetch_lidar.fetch_planned(polygon, regions, predicate, planner, workers)
+
+  def fetch_lidar_tiled(self, polygon: Polygon, region: str, tile_size: float = None,
+                        buffer: float = None, workers: int = None):
+    return self._fetch_lidar.fetch_tiled(polygon, region, tile_size, buffer, workers)
+
+  def fetch_lidar_preview(self, polygon: Polygon, region: str, resolution: float = None,
+                          point_budget: int = None):
+    return self._fetch_lidar.fetch_lod(polygon, region, resolution, point_budget)
+
+  def iter_lidar_progressive(self, polygon: Polygon, region: str, levels: int = None,
+                             point_budget: int = None, resolution: float = None):
+    return self._fetch_lidar.iter_progressive(polygon, region, levels, point_budget, resolution)
+
+  def get_cache_stats(self) -> dict:
+    return self._cache.stats() if self._cache is not None else {}
+
+  def get_renderer(self, df) -> Vis:
     return Vis(df)
 
-  def get_sub_sampler(self, epsg, df: gpd.GeoDataFrame) -> SubSampler:
-    return SubSampler(self._input_epsg, epsg, df)
+  def get_sub_sampler(self, epsg, df, workers: int = None) -> SubSampler:
+    return SubSampler(self._input_epsg, epsg, df, workers)
 
+  def get_rasterizer(self, resolution: float = None) -> Rasterizer:
+    return Rasterizer(resolution)
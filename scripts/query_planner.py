@@ -0,0 +1,220 @@
+import json
+import math
+import urllib3
+import numpy as np
+from pathlib import Path
+from bounds import Bounds
+from config import Config
+from log import get_logger
+
+ROOT_KEY = "0-0-0-0"
+STRATEGIES = ("tile", "resolution")
+
+
+class EptResource:
+  """ ept.json and hierarchy of one EPT resource, read from the public bucket or a local directory.
+      Hierarchy pages are loaded on demand, only those of nodes overlapping a query.
+  """
+
+  def __init__(self, region: str, url: str = None, http: urllib3.PoolManager = None) -> None:
+    """
+    Args:
+        region (str): EPT resource name.
+        url (str, optional): Location of the resources, a URL or a local directory ending with "/".
+            Defaults to Config.USGS_3DEP_PUBLIC_DATA_PATH.
+        http (urllib3.PoolManager, optional): Connection pool for remote resources. Defaults to a new one.
+    """
+    self.region = region
+    self.url = (url or Config.USGS_3DEP_PUBLIC_DATA_PATH) + region + "/"
+    self._http = http
+    self.info = self._read_json("ept.json")
+    self.cube = np.asarray(self.info['bounds'], dtype=float)
+    self.width = self.cube[3] - self.cube[0]
+    self.span = self.info['span']
+    # bytes of a decoded point, the memory a fetched point takes before conversion
+    self.point_size = sum(d['size'] for d in self.info['schema'])
+    self.hierarchy = {}
+    self._pages = set()
+
+  def _read_json(self, path: str) -> dict:
+    if self.url.startswith(("http://", "https://")):
+      if self._http is None:
+        self._http = urllib3.PoolManager()
+      r = self._http.request('GET', self.url + path)
+      if r.status != 200:
+        raise RuntimeError(f"requesting {self.url + path} failed with status {r.status}")
+      return json.loads(r.data)
+    with open(Path(self.url) / path, 'r') as f:
+      return json.load(f)
+
+  def get_spacing(self, depth: int) -> float:
+    """ Point spacing of an octree depth, the readers.ept resolution selecting depths up to it.
+    """
+    return float(self.width / self.span / 2 ** depth)
+
+  def get_depth_end(self, resolution: float = None) -> int:
+    """ Number of octree depths readers.ept reads for a resolution, None when every depth is read.
+    """
+    if resolution is None:
+      return None
+    # the tolerance keeps a resolution equal to the spacing of a depth from selecting the next depth too
+    return max(1, math.ceil(math.log2(self.get_spacing(0) / resolution) - 1e-9) + 1)
+
+  def get_node_bounds(self, keys: np.ndarray) -> np.ndarray:
+    """ (xmin, ymin, xmax, ymax) of every (depth, x, y, z) node key.
+    """
+    size = self.width / 2.0 ** keys[:, 0]
+    xmin = self.cube[0] + keys[:, 1] * size
+    ymin = self.cube[1] + keys[:, 2] * size
+    return np.column_stack((xmin, ymin, xmin + size, ymin + size))
+
+  def _load_page(self, key: str) -> None:
+    self.hierarchy.update(self._read_json(f"ept-hierarchy/{key}.json"))
+    self._pages.add(key)
+
+  def get_nodes(self, bounds: Bounds) -> tuple:
+    """ Finds the nodes overlapping bounds, loading the hierarchy pages below them.
+
+    Args:
+        bounds (Bounds): Query area in the coordinates of the resource (EPSG:3857).
+
+    Returns:
+        tuple: (n, 4) int keys, point counts and (n, 4) bounds of the overlapping nodes
+    """
+    if ROOT_KEY not in self._pages:
+      self._load_page(ROOT_KEY)
+    while True:
+      keys, counts, boxes = self._query(bounds)
+      # a count of -1 marks a node whose subtree is described by a page of its own
+      unloaded = [k for k, c in zip(keys, counts) if c == -1 and "-".join(map(str, k)) not in self._pages]
+      if len(unloaded) == 0:
+        break
+      for key in unloaded:
+        self._load_page("-".join(map(str, key)))
+    pages = counts >= 0
+    return keys[pages], counts[pages], boxes[pages]
+
+  def _query(self, bounds: Bounds) -> tuple:
+    names = list(self.hierarchy)
+    keys = np.array([name.split("-") for name in names], dtype=np.int64).reshape(-1, 4)
+    counts = np.fromiter(self.hierarchy.values(), dtype=np.int64, count=len(names))
+    boxes = self.get_node_bounds(keys)
+    overlap = ((boxes[:, 0] < bounds.xmax) & (boxes[:, 2] > bounds.xmin)
+               & (boxes[:, 1] < bounds.ymax) & (boxes[:, 3] > bounds.ymin))
+    return keys[overlap], counts[overlap], boxes[overlap]
+
+
+class QueryPlanner:
+  """ Estimates how many points a fetch returns from the EPT hierarchy before running any pipeline,
+      and decides how to run it: in one pipeline, at a coarser resolution, split into tiles, or not at all.
+      Points are assumed to be spread evenly within an octree node.
+  """
+
+  def __init__(self, point_budget: int = None, max_points: int = None, strategy: str = "tile",
+               url: str = None) -> None:
+    """
+    Args:
+        point_budget (int, optional): Most points fetched by one pipeline. Defaults to Config.PLAN_POINT_BUDGET.
+        max_points (int, optional): Requests estimated above this many points are rejected.
+            Defaults to Config.PLAN_MAX_POINTS.
+        strategy (str, optional): How requests above the budget are run, "tile" at full density
+            or "resolution" at the finest resolution within the budget. Defaults to "tile".
+        url (str, optional): Location of the EPT resources. Defaults to Config.USGS_3DEP_PUBLIC_DATA_PATH.
+    """
+    if strategy not in STRATEGIES:
+      raise ValueError(f"unknown strategy '{strategy}', expected one of {list(STRATEGIES)}")
+    self.point_budget = Config.PLAN_POINT_BUDGET if point_budget is None else point_budget
+    self.max_points = Config.PLAN_MAX_POINTS if max_points is None else max_points
+    if self.point_budget <= 0:
+      raise ValueError(f"point budget must be positive, got {self.point_budget}")
+    self.strategy = strategy
+    self.url = url
+    self._http = urllib3.PoolManager()
+    self._resources = {}
+    self._logger = get_logger("QueryPlanner")
+
+  def get_resource(self, region: str) -> EptResource:
+    """ Returns the EptResource of a region, read once per planner.
+    """
+    if region not in self._resources:
+      self._resources[region] = EptResource(region, self.url, self._http)
+    return self._resources[region]
+
+  def estimate(self, region: str, bounds: Bounds, area: float = None, resolution: float = None) -> dict:
+    """ Estimates the points and bytes of fetching bounds from a region.
+
+    Args:
+        region (str): EPT resource name.
+        bounds (Bounds): Query bounds in EPSG:3857.
+        area (float, optional): Area of the crop polygon inside bounds, in square meters. Defaults to the area of bounds.
+        resolution (float, optional): readers.ept resolution. Defaults to None, full density.
+
+    Returns:
+        dict: region, points and bytes estimated after cropping, nodes and read_points of the overlapping
+            nodes, points_per_depth and spacing_per_depth
+    """
+    resource = self.get_resource(region)
+    keys, counts, boxes = resource.get_nodes(bounds)
+    depth_end = resource.get_depth_end(resolution)
+    if depth_end is not None:
+      selected = keys[:, 0] < depth_end
+      keys, counts, boxes = keys[selected], counts[selected], boxes[selected]
+
+    width = np.clip(np.minimum(boxes[:, 2], bounds.xmax) - np.maximum(boxes[:, 0], bounds.xmin), 0, None)
+    height = np.clip(np.minimum(boxes[:, 3], bounds.ymax) - np.maximum(boxes[:, 1], bounds.ymin), 0, None)
+    node_area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    points = counts * width * height / node_area
+    bounds_area = (bounds.xmax - bounds.xmin) * (bounds.ymax - bounds.ymin)
+    if area is not None and bounds_area > 0:
+      points = points * min(1.0, area / bounds_area)
+
+    depths = np.bincount(keys[:, 0], weights=points) if len(keys) > 0 else np.empty(0)
+    estimate = int(round(points.sum()))
+    return {'region': region,
+            'points': estimate,
+            'bytes': estimate * resource.point_size,
+            'nodes': len(keys),
+            'read_points': int(counts.sum()),
+            'points_per_depth': [int(round(p)) for p in depths],
+            'spacing_per_depth': [resource.get_spacing(d) for d in range(len(depths))]}
+
+  def plan(self, region: str, bounds: Bounds, area: float = None) -> dict:
+    """ Decides how to run the fetch of bounds from a region, without running it.
+
+    Args:
+        region (str): EPT resource name.
+        bounds (Bounds): Query bounds in EPSG:3857.
+        area (float, optional): Area of the crop polygon inside bounds, in square meters. Defaults to the area of bounds.
+
+    Returns:
+        dict: the estimate plus action, one of "fetch", "resolution", "tile" or "reject",
+            with the resolution or tile_size to run it with
+    """
+    plan = self.estimate(region, bounds, area)
+    plan.update({'action': "fetch", 'resolution': None, 'tile_size': None})
+    if plan['points'] <= self.point_budget:
+      return plan
+
+    if self.strategy == "resolution":
+      # finest depth whose cumulative points still fit the budget
+      cumulative = np.cumsum(plan['points_per_depth'])
+      fitting = np.flatnonzero(cumulative <= self.point_budget)
+      if len(fitting) == 0:
+        plan['action'] = "reject"
+      else:
+        plan['action'] = "resolution"
+        plan['resolution'] = plan['spacing_per_depth'][fitting[-1]]
+        plan['points'] = int(cumulative[fitting[-1]])
+        plan['bytes'] = plan['points'] * self.get_resource(region).point_size
+    elif plan['points'] > self.max_points:
+      plan['action'] = "reject"
+    else:
+      plan['action'] = "tile"
+      if area is None:
+        area = (bounds.xmax - bounds.xmin) * (bounds.ymax - bounds.ymin)
+      # tiles of the crop polygon's point density holding about point_budget points
+      plan['tile_size'] = math.sqrt(area * self.point_budget / plan['points'])
+
+    if plan['action'] == "reject":
+      self._logger.warning(f"rejecting request of about {plan['points']} points from {region}")
+    return plan
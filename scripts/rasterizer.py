@@ -0,0 +1,339 @@
+import os
+import math
+import numpy as np
+from config import Config
+from bounds import Bounds
+from point_cloud import PointCloud
+from file_handler import FileHandler
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+REDUCERS = ("min", "max", "mean", "count", "idw")
+
+
+class Raster:
+  """ An in-memory single band raster: a 2D array with north-up geotransform.
+      Row 0 is the northern edge, column 0 the western edge.
+  """
+
+  __slots__ = ("data", "xmin", "ymax", "resolution", "epsg", "nodata")
+
+  def __init__(self, data: np.ndarray, xmin: float, ymax: float, resolution: float,
+               epsg: int = None, nodata: float = np.nan) -> None:
+    """
+    Args:
+        data (np.ndarray): (rows, columns) cell values.
+        xmin (float): Western edge of the raster.
+        ymax (float): Northern edge of the raster.
+        resolution (float): Cell edge length.
+        epsg (int, optional): Coordinate reference system. Defaults to None.
+        nodata (float, optional): Value of cells without points. Defaults to NaN.
+    """
+    self.data = data
+    self.xmin = xmin
+    self.ymax = ymax
+    self.resolution = resolution
+    self.epsg = epsg
+    self.nodata = nodata
+
+  @property
+  def shape(self) -> tuple:
+    return self.data.shape
+
+  @property
+  def bounds(self) -> Bounds:
+    rows, columns = self.data.shape
+    return Bounds(self.xmin, self.xmin + columns * self.resolution, self.ymax - rows * self.resolution, self.ymax)
+
+  @property
+  def transform(self) -> tuple:
+    """ GDAL geotransform (xmin, resolution, 0, ymax, 0, -resolution).
+    """
+    return (self.xmin, self.resolution, 0.0, self.ymax, 0.0, -self.resolution)
+
+
+class RasterAccumulator:
+  """ Running per-cell statistics of a fixed grid, filled chunk by chunk so clouds larger than memory
+      can be rasterized. Accumulators of the same grid can be merged, e.g. from parallel workers.
+  """
+
+  def __init__(self, bounds: Bounds, resolution: float, radius: float = None, power: float = 2.0,
+               shape: tuple = None) -> None:
+    """
+    Args:
+        bounds (Bounds): Extent of the grid, the grid is anchored at (xmin, ymax).
+        resolution (float): Cell edge length.
+        radius (float, optional): IDW search radius around a cell center. Defaults to resolution * sqrt(2),
+            like writers.gdal.
+        power (float, optional): IDW distance exponent. Defaults to 2.
+        shape (tuple, optional): (rows, columns) of the grid. Defaults to the cells needed to cover bounds.
+    """
+    self.xmin = bounds.xmin
+    self.ymax = bounds.ymax
+    self.resolution = resolution
+    if shape is None:
+      shape = (max(1, math.ceil((bounds.ymax - bounds.ymin) / resolution)),
+               max(1, math.ceil((bounds.xmax - bounds.xmin) / resolution)))
+    self.rows, self.columns = shape
+    self.radius = resolution * math.sqrt(2) if radius is None else radius
+    self.power = power
+    size = self.rows * self.columns
+    self.count = np.zeros(size, dtype=np.int64)
+    self.sum = np.zeros(size)
+    self.min = np.full(size, np.inf)
+    self.max = np.full(size, -np.inf)
+    self.weights = np.zeros(size)
+    self.weighted = np.zeros(size)
+
+  def _cell_index(self, x: np.ndarray, y: np.ndarray) -> tuple:
+    """ Column and row of the cell holding each point, points on the eastern and southern edge go to the last cell.
+    """
+    column = np.floor((x - self.xmin) / self.resolution).astype(np.int64)
+    row = np.floor((self.ymax - y) / self.resolution).astype(np.int64)
+    # points exactly on the max edges belong to the last cell
+    column[column == self.columns] = self.columns - 1
+    row[row == self.rows] = self.rows - 1
+    return column, row
+
+  def add(self, points: np.ndarray, idw: bool = False) -> None:
+    """ Folds an (n, 3) chunk of points into the statistics, points outside the grid are ignored.
+
+    Args:
+        points (np.ndarray): x, y, z coordinates.
+        idw (bool, optional): Also accumulate the inverse distance weights, needed by the "idw" reducer only. Defaults to False.
+    """
+    x, y, z = points[:, 0], points[:, 1], points[:, 2]
+    column, row = self._cell_index(x, y)
+    self._add(x, y, z, column, row, idw)
+
+  def _add(self, x, y, z, column, row, idw: bool) -> None:
+    inside = (column >= 0) & (column < self.columns) & (row >= 0) & (row < self.rows)
+    index = row[inside] * self.columns + column[inside]
+    zi = z[inside]
+    size = self.rows * self.columns
+    self.count += np.bincount(index, minlength=size)
+    self.sum += np.bincount(index, weights=zi, minlength=size)
+    np.minimum.at(self.min, index, zi)
+    np.maximum.at(self.max, index, zi)
+    if idw:
+      self._add_idw(x, y, z, column, row)
+
+  def _add_idw(self, x, y, z, column, row) -> None:
+    """ Adds every point to the cells whose center lies within the search radius, weighted by 1 / distance^power.
+    """
+    reach = math.ceil(self.radius / self.resolution)
+    size = self.rows * self.columns
+    for dc in range(-reach, reach + 1):
+      for dr in range(-reach, reach + 1):
+        c, r = column + dc, row + dr
+        center_x = self.xmin + (c + 0.5) * self.resolution
+        center_y = self.ymax - (r + 0.5) * self.resolution
+        distance = np.hypot(x - center_x, y - center_y)
+        near = (distance <= self.radius) & (c >= 0) & (c < self.columns) & (r >= 0) & (r < self.rows)
+        if not near.any():
+          continue
+        # a point on the cell center dominates the cell, as in writers.gdal
+        weight = 1.0 / np.maximum(distance[near], 1e-9) ** self.power
+        index = r[near] * self.columns + c[near]
+        self.weights += np.bincount(index, weights=weight, minlength=size)
+        self.weighted += np.bincount(index, weights=weight * z[near], minlength=size)
+
+  def merge(self, other: "RasterAccumulator") -> None:
+    """ Adds the statistics of an accumulator over the same grid.
+    """
+    self.count += other.count
+    self.sum += other.sum
+    np.minimum(self.min, other.min, out=self.min)
+    np.maximum(self.max, other.max, out=self.max)
+    self.weights += other.weights
+    self.weighted += other.weighted
+
+  def result(self, reducer: str = "mean", epsg: int = None, nodata: float = np.nan) -> Raster:
+    """ Builds the raster of a reducer.
+
+    Args:
+        reducer (str, optional): One of REDUCERS. Defaults to "mean".
+        epsg (int, optional): Coordinate reference system of the raster. Defaults to None.
+        nodata (float, optional): Value of empty cells, count rasters use 0. Defaults to NaN.
+
+    Returns:
+        Raster
+    """
+    if reducer not in REDUCERS:
+      raise ValueError(f"unknown reducer '{reducer}', expected one of {list(REDUCERS)}")
+    if reducer == "count":
+      return Raster(self.count.reshape(self.rows, self.columns), self.xmin, self.ymax, self.resolution, epsg, 0)
+
+    empty = self.count == 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+      if reducer == "min":
+        values = self.min.copy()
+      elif reducer == "max":
+        values = self.max.copy()
+      elif reducer == "mean":
+        values = self.sum / self.count
+      else:
+        values = self.weighted / self.weights
+        empty = self.weights == 0
+    values[empty] = nodata
+    return Raster(values.reshape(self.rows, self.columns), self.xmin, self.ymax, self.resolution, epsg, nodata)
+
+
+def _rasterize_tile(points: np.ndarray, cells: np.ndarray, bounds: Bounds, resolution: float, reducer: str,
+                    radius: float, power: float) -> np.ndarray:
+  """ Rasterizes the points of one tile inside a worker process.
+      Cells are the (column, row) of every point within the tile, assigned once on the whole grid by the parent,
+      so points on tile seams land in the same cell as in a serial run.
+  """
+  rows = round((bounds.ymax - bounds.ymin) / resolution)
+  columns = round((bounds.xmax - bounds.xmin) / resolution)
+  accumulator = RasterAccumulator(bounds, resolution, radius, power, (rows, columns))
+  accumulator._add(points[:, 0], points[:, 1], points[:, 2], cells[:, 0], cells[:, 1], reducer == "idw")
+  return accumulator.result(reducer).data
+
+
+class Rasterizer:
+  """ Turns point arrays into in-memory DTM/DSM rasters, e.g. min for a terrain-like surface of ground points,
+      max for a surface model, mean, count or IDW like the writers.gdal stage.
+      Works on fetched data, so re-gridding at another resolution does not run the pdal pipeline again.
+  """
+
+  def __init__(self, resolution: float = None, radius: float = None, power: float = 2.0,
+               nodata: float = np.nan) -> None:
+    """
+    Args:
+        resolution (float, optional): Cell edge length in units of the points. Defaults to Config.RASTER_RESOLUTION.
+        radius (float, optional): IDW search radius. Defaults to resolution * sqrt(2).
+        power (float, optional): IDW distance exponent. Defaults to 2.
+        nodata (float, optional): Value of cells without points. Defaults to NaN.
+    """
+    self.resolution = resolution or Config.RASTER_RESOLUTION
+    self.radius = radius
+    self.power = power
+    self.nodata = nodata
+
+  def _get_xyz(self, df) -> tuple:
+    """ Coordinates and EPSG of a PointCloud, GeoDataFrame or (n, 3) array.
+    """
+    if isinstance(df, PointCloud):
+      return df.xyz(), df.epsg
+    if isinstance(df, np.ndarray):
+      return np.asarray(df, dtype=float).reshape(-1, 3), None
+    xyz = np.column_stack((df.geometry.x, df.geometry.y, df.elevation))
+    return xyz, df.crs.to_epsg() if df.crs is not None else None
+
+  def _get_bounds(self, xyz: np.ndarray) -> Bounds:
+    xmin, ymin = xyz[:, :2].min(axis=0)
+    xmax, ymax = xyz[:, :2].max(axis=0)
+    return Bounds(xmin, xmax, ymin, ymax)
+
+  def rasterize(self, df, reducer: str = "mean", bounds: Bounds = None) -> Raster:
+    """ Rasterizes a point cloud in memory.
+
+    Args:
+        df (PointCloud | gpd.GeoDataFrame | np.ndarray): Points to grid.
+        reducer (str, optional): "min", "max", "mean", "count" or "idw". Defaults to "mean".
+        bounds (Bounds, optional): Extent of the raster. Defaults to the extent of the points.
+
+    Returns:
+        Raster
+    """
+    xyz, epsg = self._get_xyz(df)
+    accumulator = RasterAccumulator(bounds or self._get_bounds(xyz), self.resolution, self.radius, self.power)
+    accumulator.add(xyz, idw=reducer == "idw")
+    return accumulator.result(reducer, epsg, self.nodata)
+
+  def rasterize_chunks(self, chunks, bounds: Bounds, reducer: str = "mean", epsg: int = None) -> Raster:
+    """ Rasterizes points arriving in chunks, holding only one chunk and the grid in memory.
+
+    Args:
+        chunks (iterable): (n, 3) coordinate arrays or PointClouds, e.g. from FetchLidar.iter_dep.
+        bounds (Bounds): Extent of the raster, it has to be known before the first chunk.
+        reducer (str, optional): One of REDUCERS. Defaults to "mean".
+        epsg (int, optional): Coordinate reference system of the points. Defaults to None.
+
+    Returns:
+        Raster
+    """
+    accumulator = RasterAccumulator(bounds, self.resolution, self.radius, self.power)
+    for points in chunks:
+      if isinstance(points, PointCloud):
+        points = points.xyz()
+      accumulator.add(points, idw=reducer == "idw")
+    return accumulator.result(reducer, epsg, self.nodata)
+
+  def rasterize_file(self, name: str, reducer: str = "mean", chunk_size: int = None) -> Raster:
+    """ Rasterizes a laz file under Config.LAZ_PATH chunk by chunk, with the extent from its header.
+
+    Args:
+        name (str): Name of the laz file.
+        reducer (str, optional): One of REDUCERS. Defaults to "mean".
+        chunk_size (int, optional): Number of points read at once. Defaults to Config.CHUNK_SIZE.
+
+    Returns:
+        Raster
+    """
+    file_handler = FileHandler()
+    header = file_handler.read_point_header(name)
+    crs = header.parse_crs()
+    bounds = Bounds(header.mins[0], header.maxs[0], header.mins[1], header.maxs[1])
+    chunks = file_handler.read_point_chunks(name, chunk_size or Config.CHUNK_SIZE)
+    return self.rasterize_chunks(chunks, bounds, reducer, crs.to_epsg() if crs is not None else None)
+
+  def rasterize_tiled(self, df, reducer: str = "mean", bounds: Bounds = None, tile_size: int = None,
+                      workers: int = None) -> Raster:
+    """ Rasterizes a large cloud as square tiles of the grid processed in parallel, then stitches them.
+        Each tile receives the points within the IDW radius of its edges, so tile seams do not change the result.
+
+    Args:
+        df (PointCloud | gpd.GeoDataFrame | np.ndarray): Points to grid.
+        reducer (str, optional): One of REDUCERS. Defaults to "mean".
+        bounds (Bounds, optional): Extent of the raster. Defaults to the extent of the points.
+        tile_size (int, optional): Tile edge length in cells. Defaults to Config.RASTER_TILE_SIZE.
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        Raster
+    """
+    xyz, epsg = self._get_xyz(df)
+    grid = RasterAccumulator(bounds or self._get_bounds(xyz), self.resolution, self.radius, self.power)
+    column, row = grid._cell_index(xyz[:, 0], xyz[:, 1])
+    # IDW tiles also need the points around them that reach into their cells
+    reach = math.ceil(grid.radius / self.resolution) if reducer == "idw" else 0
+    tile_size = tile_size or Config.RASTER_TILE_SIZE
+    data = np.empty((grid.rows, grid.columns), dtype=np.int64 if reducer == "count" else float)
+
+    def get_tiles():
+      for top in range(0, grid.rows, tile_size):
+        for left in range(0, grid.columns, tile_size):
+          rows = min(tile_size, grid.rows - top)
+          columns = min(tile_size, grid.columns - left)
+          selected = ((column >= left - reach) & (column < left + columns + reach)
+                      & (row >= top - reach) & (row < top + rows + reach))
+          xmin = grid.xmin + left * self.resolution
+          ymax = grid.ymax - top * self.resolution
+          tile = Bounds(xmin, xmin + columns * self.resolution, ymax - rows * self.resolution, ymax)
+          cells = np.column_stack((column[selected] - left, row[selected] - top))
+          yield (top, left), (xyz[selected], cells, tile)
+
+    workers = workers or os.cpu_count()
+    tiles = get_tiles()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+      # tiles are cut and submitted as workers free up, so only about one tile per worker is copied at a time
+      pending = {}
+      while True:
+        for position, (points, cells, tile) in tiles:
+          pending[executor.submit(_rasterize_tile, points, cells, tile, self.resolution, reducer,
+                                  grid.radius, self.power)] = position
+          if len(pending) >= workers:
+            break
+        if len(pending) == 0:
+          break
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+          top, left = pending.pop(future)
+          tile = future.result()
+          data[top:top + tile.shape[0], left:left + tile.shape[1]] = tile
+
+    if reducer != "count":
+      data[np.isnan(data)] = self.nodata
+    return Raster(data, grid.xmin, grid.ymax, self.resolution, epsg, 0 if reducer == "count" else self.nodata)
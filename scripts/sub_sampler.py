@@ -1,30 +1,145 @@
+from __future__ import annotations
 import numpy as np
-import geopandas as gpd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from lazy_import import lazy_import
+from config import Config
 from gpd_helper import GPDHelper
+from voxel_grid import VoxelGrid, VoxelAccumulator
+from point_cloud import PointCloud
+from point_index import PointIndex
+from file_handler import FileHandler
+
+gpd = lazy_import("geopandas")
+
+
+POINT_REDUCERS = ("barycenter", "median")
+INDEX_REDUCERS = ("candidate_center", "min_z", "max_z", "random")
+
+
+def _reduce(grid: VoxelGrid, reducer: str, seed: int = Config.RANDOM_SEED) -> np.ndarray:
+  """ Applies a VoxelGrid reducer, returning new points for POINT_REDUCERS and point indices otherwise.
+  """
+  if reducer == "barycenter":
+    return grid.barycenter()
+  if reducer == "median":
+    return grid.median()
+  if reducer == "candidate_center":
+    return grid.candidate_center_index()
+  if reducer == "min_z":
+    return grid.min_z_index()
+  if reducer == "max_z":
+    return grid.max_z_index()
+  return grid.random_index(seed)
+
+
+def _sample_slab(name: str, shape: tuple, origin: np.ndarray, voxel_size: float, reducer: str,
+                 start: int, stop: int) -> np.ndarray:
+  """ Reduces the voxels of rows [start, stop) of the shared, column-sorted points inside a worker process.
+      Returned indices point into the slab.
+  """
+  memory = shared_memory.SharedMemory(name=name)
+  try:
+    slab = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)[start:stop]
+    result = _reduce(VoxelGrid(slab, voxel_size, origin), reducer)
+    del slab
+    return result
+  finally:
+    memory.close()
 
 
 class SubSampler:
   """ Point Clouds Sampler Class that implements decimation and voxel grid sampling for reducing point cloud data density.
   """
 
-  def __init__(self, input_epsg: int, output_epsg: int, df: gpd.GeoDataFrame):
+  def __init__(self, input_epsg: int, output_epsg: int, df, workers: int = None):
     """
     Args:
         input_epsg (int): Coordinate reference system for use in transformations.
         output_epsg (int): A coordinate reference system that the user uses.
-        df (gpd.GeoDataFrame): Geopandas data frame
+        df (gpd.GeoDataFrame | PointCloud): Geopandas data frame or point cloud.
+            Sampling results are returned in the same type.
+        workers (int, optional): Worker processes of the voxel grid methods, clouds of at least
+            Config.SAMPLER_PARALLEL_MIN_POINTS points are split between them. Defaults to Config.SAMPLER_WORKERS.
     """
     self._gpd_helper = GPDHelper(input_epsg, output_epsg)
-    self.df = self._gpd_helper.covert_crs(df)
+    self.output_epsg = output_epsg
+    self.workers = workers or Config.SAMPLER_WORKERS
+    self._index = None
+    if isinstance(df, PointCloud):
+      self.df = df.to_crs(output_epsg)
+    else:
+      self.df = self._gpd_helper.covert_crs(df)
 
   def get_points(self):
     """ Generates a NumPy array from point clouds data.
     """
+    if isinstance(self.df, PointCloud):
+      return self.df.xyz()
     x = self.df.geometry.x
     y = self.df.geometry.y
     z = self.df.elevation
     return np.array([x, y, z]).transpose()
 
+  def _get_output(self, points: np.ndarray):
+    """ Wraps sampled points in the type the sampler was given.
+    """
+    if isinstance(self.df, PointCloud):
+      return PointCloud.from_xyz(points, self.output_epsg)
+    return self._gpd_helper.get_dep_points(points)
+
+  def get_index(self) -> PointIndex:
+    """ Returns the KD-tree of the points, kept with a PointCloud input so later queries reuse it.
+    """
+    if isinstance(self.df, PointCloud):
+      return self.df.get_index()
+    if self._index is None:
+      self._index = PointIndex(self.get_points())
+    return self._index
+
+  def _select(self, mask: np.ndarray):
+    """ Keeps the points of a mask, with every dimension of a PointCloud input.
+    """
+    if isinstance(self.df, PointCloud):
+      return self.df[mask]
+    return self._get_output(self.get_points()[mask])
+
+  def get_density(self, k: int = 8) -> np.ndarray:
+    """ Estimates the local density of every point from the distance to its k-th nearest neighbor.
+
+    Args:
+        k (int, optional): Number of neighbors. Defaults to 8.
+
+    Returns:
+        np.ndarray: Points per cubic unit of the output CRS
+    """
+    return self.get_index().density(k)
+
+  def remove_statistical_outliers(self, mean_k: int = 8, multiplier: float = 2.0) -> gpd.GeoDataFrame:
+    """ Removes noise left by the classification range filter: points whose mean distance to their mean_k
+        neighbors is more than multiplier standard deviations above the average, as filters.outlier does.
+
+    Args:
+        mean_k (int, optional): Number of neighbors. Defaults to 8.
+        multiplier (float, optional): Standard deviations above the mean that are still kept. Defaults to 2.
+
+    Returns:
+        gpd.GeoDataFrame: Points without outliers
+    """
+    return self._select(~self.get_index().statistical_outliers(mean_k, multiplier))
+
+  def remove_radius_outliers(self, radius: float = 1.0, min_k: int = 2) -> gpd.GeoDataFrame:
+    """ Removes isolated points having fewer than min_k neighbors within radius, as filters.outlier does.
+
+    Args:
+        radius (float, optional): Search radius in units of the output CRS. Defaults to 1.
+        min_k (int, optional): Least number of neighbors of a kept point. Defaults to 2.
+
+    Returns:
+        gpd.GeoDataFrame: Points without outliers
+    """
+    return self._select(~self.get_index().radius_outliers(radius, min_k))
+
   def decimation(self, factor: int = 20) -> gpd.GeoDataFrame:
     """ Performs Simple Subsampling type, selects samples with a constant jump scale(factor).
         If we define a point cloud as a matrix (m x n), then the decimated cloud is obtained by keeping one row out of n of this matrix
@@ -35,6 +150,8 @@ class SubSampler:
     Returns:
         gpd.GeoDataFrame: Interpolated geopandas data frame
     """
+    if isinstance(self.df, PointCloud):
+      return self.df[::factor]
     points = self.get_points()
     decimated_points = points[::factor]
     return self._gpd_helper.get_dep_points(decimated_points)
@@ -47,15 +164,67 @@ class SubSampler:
         voxel_size (float): Area of a typical cubic cell in the grid (in square meters) that represents a point.
 
     Returns:
-        tuple: [description]
+        tuple: number of voxels per axis, (i, j, k) keys of the non-empty voxels,
+            number of points per non-empty voxel and the point indices sorted by voxel.
     """
 
     nb_vox = np.ceil((np.max(points, axis=0)
                      - np.min(points, axis=0)) / voxel_size)
-    non_empty_voxel_keys, inverse, nb_pts_per_voxel = np.unique(
-        ((points - np.min(points, axis=0)) // voxel_size).astype(int), axis=0, return_inverse=True, return_counts=True)
-    idx_pts_vox_sorted = np.argsort(inverse)
-    return nb_vox, non_empty_voxel_keys, nb_pts_per_voxel, idx_pts_vox_sorted
+    grid = VoxelGrid(points, voxel_size)
+    return nb_vox, grid.voxel_index, grid.counts, grid.order
+
+  def _sample_grid(self, voxel_size: float, reducer: str, seed: int = Config.RANDOM_SEED):
+    """ Keeps one point per voxel using one of the VoxelGrid reducers.
+        Reducers picking an existing point keep every dimension of a PointCloud input.
+    """
+    if reducer not in POINT_REDUCERS + INDEX_REDUCERS:
+      raise ValueError(f"unknown reducer '{reducer}'")
+    points = self.get_points()
+    # the random reducer draws from one generator over the whole cloud, so it always runs serially
+    if self.workers > 1 and reducer != "random" and len(points) >= Config.SAMPLER_PARALLEL_MIN_POINTS:
+      result = self._reduce_parallel(points, voxel_size, reducer)
+    else:
+      result = _reduce(VoxelGrid(points, voxel_size), reducer, seed)
+
+    if reducer in POINT_REDUCERS:
+      return self._get_output(result)
+    if isinstance(self.df, PointCloud):
+      return self.df[result]
+    return self._get_output(points[result])
+
+  def _reduce_parallel(self, points: np.ndarray, voxel_size: float, reducer: str) -> np.ndarray:
+    """ Runs a reducer over slabs of whole voxel columns along x in worker processes.
+        The points are sorted by column once and placed in shared memory, so every worker attaches to it
+        and only reads the rows of its own slab. The sort is stable and slabs hold consecutive voxel keys,
+        so concatenating their results gives exactly the serial result.
+    """
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    origin = points.min(axis=0)
+    column = ((points[:, 0] - origin[0]) // voxel_size).astype(np.int64)
+    order = np.argsort(column, kind="stable")
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(column))))
+    del column
+    # about equally many points per slab, a few slabs per worker to even out voxel density
+    slabs = self.workers * 4
+    edges = np.searchsorted(offsets, len(points) * np.arange(1, slabs) / slabs)
+    starts = np.unique(np.concatenate(([0], offsets[edges], [len(points)])))
+
+    memory = shared_memory.SharedMemory(create=True, size=points.nbytes)
+    try:
+      shared = np.ndarray(points.shape, dtype=np.float64, buffer=memory.buf)
+      # the indices are valid, and unlike "raise" the "clip" mode writes into out without a buffer
+      np.take(points, order, axis=0, out=shared, mode="clip")
+      del shared
+      with ProcessPoolExecutor(max_workers=min(self.workers, len(starts) - 1)) as executor:
+        futures = [executor.submit(_sample_slab, memory.name, points.shape, origin, voxel_size, reducer, start, stop)
+                   for start, stop in zip(starts[:-1], starts[1:])]
+        parts = [future.result() for future in futures]
+    finally:
+      memory.close()
+      memory.unlink()
+    if reducer in POINT_REDUCERS:
+      return np.concatenate(parts)
+    return order[np.concatenate([start + part for start, part in zip(starts, parts)])]
 
   def grid_barycenter(self, voxel_size: int) -> gpd.GeoDataFrame:
     """ Performs Grid grid subsampling strategy that divides 3D space into regular cubic cells that are called voxels.
@@ -68,20 +237,7 @@ class SubSampler:
     Returns:
         gpd.GeoDataFrame: interpolated geopandas dataframe
     """
-    last_seen = 0
-    voxel_grid = {}
-    grid_barycenter = []
-    points = self.get_points()
-    nb_vox, non_empty_voxel_keys, nb_pts_per_voxel, idx_pts_vox_sorted = self.get_voxel_grid(
-      points, voxel_size)
-
-    for idx, vox in enumerate(non_empty_voxel_keys):
-      voxel_grid[tuple(
-        vox)] = points[idx_pts_vox_sorted[last_seen:last_seen + nb_pts_per_voxel[idx]]]
-      grid_barycenter.append(np.mean(voxel_grid[tuple(vox)], axis=0))
-      last_seen += nb_pts_per_voxel[idx]
-    sample_points = np.array(list(map(list, grid_barycenter)))
-    return self._gpd_helper.get_dep_points(sample_points)
+    return self._sample_grid(voxel_size, "barycenter")
 
   def grid_candidate_center(self, voxel_size: int) -> gpd.GeoDataFrame:
     """ Performs Grid grid subsampling strategy that divides 3D space into regular cubic cells that are called voxels.
@@ -94,19 +250,134 @@ class SubSampler:
     Returns:
         gpd.GeoDataFrame: Interpolated geopandas data frame
     """
-    last_seen = 0
-    voxel_grid = {}
-    grid_candidate_center = []
-    points = self.get_points()
-    nb_vox, non_empty_voxel_keys, nb_pts_per_voxel, idx_pts_vox_sorted = self.get_voxel_grid(
-      points, voxel_size)
-
-    for idx, vox in enumerate(non_empty_voxel_keys):
-      voxel_grid[tuple(
-        vox)] = points[idx_pts_vox_sorted[last_seen:last_seen + nb_pts_per_voxel[idx]]]
-      grid_candidate_center.append(voxel_grid[tuple(vox)][np.linalg.norm(
-        voxel_grid[tuple(vox)] - np.mean(voxel_grid[tuple(vox)], axis=0), axis=1).argmin()])
-      last_seen += nb_pts_per_voxel[idx]
-
-    sample_points = np.array(list(map(list, grid_candidate_center)))
-    return self._gpd_helper.get_dep_points(sample_points)
+    return self._sample_grid(voxel_size, "candidate_center")
+
+  def grid_min_z(self, voxel_size: int) -> gpd.GeoDataFrame:
+    """ Voxel grid subsampling that keeps the lowest point of every voxel, a cheap ground approximation.
+
+    Args:
+        voxel_size (int): Area of a typical cubic cell in the grid (in square meters) that represents a point.
+
+    Returns:
+        gpd.GeoDataFrame: Interpolated geopandas data frame
+    """
+    return self._sample_grid(voxel_size, "min_z")
+
+  def grid_max_z(self, voxel_size: int) -> gpd.GeoDataFrame:
+    """ Voxel grid subsampling that keeps the highest point of every voxel, e.g. for canopy or roof surfaces.
+
+    Args:
+        voxel_size (int): Area of a typical cubic cell in the grid (in square meters) that represents a point.
+
+    Returns:
+        gpd.GeoDataFrame: Interpolated geopandas data frame
+    """
+    return self._sample_grid(voxel_size, "max_z")
+
+  def grid_median(self, voxel_size: int) -> gpd.GeoDataFrame:
+    """ Voxel grid subsampling that keeps the coordinate-wise median of every voxel, which is robust to outliers.
+
+    Args:
+        voxel_size (int): Area of a typical cubic cell in the grid (in square meters) that represents a point.
+
+    Returns:
+        gpd.GeoDataFrame: Interpolated geopandas data frame
+    """
+    return self._sample_grid(voxel_size, "median")
+
+  def grid_random(self, voxel_size: int, seed: int = Config.RANDOM_SEED) -> gpd.GeoDataFrame:
+    """ Voxel grid subsampling that keeps a randomly drawn point of every voxel.
+
+    Args:
+        voxel_size (int): Area of a typical cubic cell in the grid (in square meters) that represents a point.
+        seed (int, optional): Seed of the random generator. Defaults to Config.RANDOM_SEED.
+
+    Returns:
+        gpd.GeoDataFrame: Interpolated geopandas data frame
+    """
+    return self._sample_grid(voxel_size, "random", seed)
+
+
+class ChunkSubSampler:
+  """ Out-of-core counterpart of SubSampler for points arriving in chunks, e.g. from FetchLidar.iter_dep.
+      Chunks are folded into incremental accumulators one at a time, so memory is bounded by the chunk size
+      and the number of voxels.
+  """
+
+  def __init__(self, chunks, epsg: int, mins: np.ndarray, maxs: np.ndarray):
+    """
+    Args:
+        chunks (iterable): (n, 3) coordinate arrays or PointClouds, consumed by the first sampling call.
+        epsg (int): Coordinate reference system of the points.
+        mins (np.ndarray): Minimum x, y, z of the points, the origin of the voxel grid.
+        maxs (np.ndarray): Maximum x, y, z of the points, points outside [mins, maxs] must not occur.
+    """
+    self.chunks = chunks
+    self.epsg = epsg
+    self.mins = np.asarray(mins, dtype=float)
+    self.maxs = np.asarray(maxs, dtype=float)
+
+  def _iter_chunks(self):
+    for points in self.chunks:
+      yield points.xyz() if isinstance(points, PointCloud) else points
+
+  def decimation(self, factor: int = 20) -> PointCloud:
+    """ Keeps one point out of factor, counting across chunk boundaries.
+
+    Args:
+        factor (int, optional): Jump scale. Defaults to 20.
+
+    Returns:
+        PointCloud: Decimated points
+    """
+    decimated = []
+    seen = 0
+    for points in self._iter_chunks():
+      first = (-seen) % factor
+      decimated.append(points[first::factor])
+      seen += len(points)
+    return PointCloud.from_xyz(np.concatenate(decimated) if decimated else np.empty((0, 3)), self.epsg)
+
+  def grid_barycenter(self, voxel_size: float) -> PointCloud:
+    """ Keeps the barycenter of every voxel, accumulating running sums and counts per voxel key.
+        The grid origin is mins, so voxels line up with the in-memory sampler when mins is the minimum of the cloud.
+
+    Args:
+        voxel_size (float): Area of a typical cubic cell in the grid (in square meters) that represents a point.
+
+    Returns:
+        PointCloud: Voxel barycenters ordered by voxel key
+    """
+    accumulator = VoxelAccumulator(voxel_size, self.mins, self.maxs)
+    for points in self._iter_chunks():
+      accumulator.add(points)
+    return PointCloud.from_xyz(accumulator.barycenter(), self.epsg)
+
+
+class StreamingSubSampler(ChunkSubSampler):
+  """ Out-of-core counterpart of SubSampler for laz files larger than memory.
+      Points are read in fixed-size chunks and folded into incremental accumulators,
+      giving the same result as the in-memory decimation and grid_barycenter of the whole file.
+  """
+
+  def __init__(self, name: str, epsg: int = None, chunk_size: int = None):
+    """
+    Args:
+        name (str): Name of the laz file under Config.LAZ_PATH.
+        epsg (int, optional): Coordinate reference system of the file. Defaults to the one in the laz header.
+        chunk_size (int, optional): Number of points read at once. Defaults to Config.CHUNK_SIZE.
+    """
+    self.name = name
+    self.chunk_size = chunk_size or Config.CHUNK_SIZE
+    self._file_handler = FileHandler()
+    self.header = self._file_handler.read_point_header(name)
+    if epsg is None:
+      crs = self.header.parse_crs()
+      epsg = crs.to_epsg() if crs is not None else None
+    # the grid origin is the minimum stored in the laz header, as for the in-memory sampler
+    super().__init__(None, epsg, self.header.mins, self.header.maxs)
+
+  def _iter_chunks(self):
+    """ Reads the file again for every sampling call.
+    """
+    return self._file_handler.read_point_chunks(self.name, self.chunk_size)
@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import numpy as np
+from pathlib import Path
+from config import Config
+from bounds import Bounds
+from log import get_logger
+from contextlib import contextmanager
+
+try:
+  import fcntl
+except ImportError:
+  # no advisory locks on this platform, access from several processes is then not synchronized
+  fcntl = None
+
+META_FILE = "meta.json"
+
+
+class TileCache:
+  """ Disk-backed, content-addressed cache of fetched point arrays and rasters.
+      Entries are keyed by region, bounds, pipeline definition and output EPSG and evicted least recently used first
+      once the cache grows beyond its size limit. Writes are atomic renames and eviction holds an exclusive file lock,
+      so several processes can share one cache directory.
+  """
+
+  def __init__(self, path: Path = None, max_bytes: int = None) -> None:
+    """
+    Args:
+        path (Path, optional): Cache directory. Defaults to Config.CACHE_PATH.
+        max_bytes (int, optional): Size limit of the cache. Defaults to Config.CACHE_MAX_BYTES.
+    """
+    self.path = Path(path or Config.CACHE_PATH)
+    self.max_bytes = max_bytes or Config.CACHE_MAX_BYTES
+    self.hits = 0
+    self.misses = 0
+    self._logger = get_logger("TileCache")
+
+  def __getstate__(self) -> dict:
+    state = self.__dict__.copy()
+    del state['_logger']
+    return state
+
+  def __setstate__(self, state: dict) -> None:
+    self.__dict__.update(state)
+    self._logger = get_logger("TileCache")
+
+  @staticmethod
+  def get_key(region: str, bounds: Bounds, pipeline: dict, epsg: int) -> str:
+    """ Computes the content address of a fetch.
+
+    Args:
+        region (str): EPT resource name.
+        bounds (Bounds): Boundary of the fetch.
+        pipeline (dict): Pipeline definition that is executed.
+        epsg (int): Output coordinate reference system.
+
+    Returns:
+        str: sha256 hex digest
+    """
+    pipeline_hash = hashlib.sha256(json.dumps(pipeline, sort_keys=True).encode()).hexdigest()
+    key = json.dumps([region, bounds.get_bound_name(), pipeline_hash, epsg])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+  def _entry_path(self, key: str) -> Path:
+    return self.path / key[:2] / key
+
+  @contextmanager
+  def _lock(self, exclusive: bool):
+    self.path.mkdir(parents=True, exist_ok=True)
+    with open(self.path / ".lock", 'a') as lock_file:
+      if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+      try:
+        yield
+      finally:
+        if fcntl is not None:
+          fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+  def get(self, key: str, restore: list = None) -> dict:
+    """ Loads a cached fetch and marks it as recently used.
+
+    Args:
+        key (str): Key from get_key.
+        restore (list, optional): Output paths of the fetch to copy back from the entry when they are missing.
+            They are copied while the entry is locked against eviction, a failed copy counts as a miss.
+            Defaults to None.
+
+    Returns:
+        dict: arrays (list of np.ndarray) and files (name to cached path), None on a miss.
+    """
+    entry = self._entry_path(key)
+    with self._lock(exclusive=False):
+      try:
+        with open(entry / META_FILE, 'r') as f:
+          meta = json.load(f)
+        arrays = [np.load(entry / name, allow_pickle=False) for name in meta['arrays']]
+        for file in restore or []:
+          file = Path(file)
+          if not file.exists() and file.name in meta['files']:
+            file.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(entry / file.name, file)
+        os.utime(entry / META_FILE)
+      except (OSError, ValueError):
+        self.misses += 1
+        return None
+    self.hits += 1
+    return {'arrays': arrays,
+            'files': {name: entry / name for name in meta['files']}}
+
+  def put(self, key: str, arrays: list, files: list = None) -> None:
+    """ Stores the arrays and output files of a fetch, then evicts old entries if the cache is too large.
+
+    Args:
+        key (str): Key from get_key.
+        arrays (list): Structured arrays of the pipeline output.
+        files (list, optional): Paths of files written by the pipeline writers. Defaults to None.
+    """
+    for _ in self.put_stream(key, arrays, files):
+      pass
+
+  def put_stream(self, key: str, arrays, files: list = None):
+    """ Stores arrays while passing them through, for pipeline output streamed in chunks.
+        The entry is only added once arrays is exhausted, an abandoned or failing stream stores nothing.
+
+    Args:
+        key (str): Key from get_key.
+        arrays (iterable): Structured arrays of the pipeline output.
+        files (list, optional): Paths of files written by the pipeline writers, stored after the last array.
+            Defaults to None.
+
+    Yields:
+        np.ndarray: the arrays
+    """
+    tmp = self.path / "tmp" / f"{key}.{uuid.uuid4().hex}"
+    tmp.mkdir(parents=True, exist_ok=True)
+    meta = {'arrays': [], 'files': [], 'created': time.time()}
+    try:
+      for i, array in enumerate(arrays):
+        name = f"points_{i}.npy"
+        np.save(tmp / name, array, allow_pickle=False)
+        meta['arrays'].append(name)
+        yield array
+    except BaseException:
+      shutil.rmtree(tmp, ignore_errors=True)
+      raise
+
+    for file in files or []:
+      if Path(file).exists():
+        shutil.copyfile(file, tmp / Path(file).name)
+        meta['files'].append(Path(file).name)
+    meta['size'] = sum(f.stat().st_size for f in tmp.iterdir())
+    with open(tmp / META_FILE, 'w') as f:
+      json.dump(meta, f)
+
+    entry = self._entry_path(key)
+    entry.parent.mkdir(parents=True, exist_ok=True)
+    try:
+      os.rename(tmp, entry)
+    except OSError:
+      # another process stored the same key first
+      shutil.rmtree(tmp, ignore_errors=True)
+    self.evict()
+
+  def _entries(self) -> list:
+    entries = []
+    for meta_file in self.path.glob(f"??/*/{META_FILE}"):
+      try:
+        with open(meta_file, 'r') as f:
+          size = json.load(f)['size']
+        entries.append((meta_file.stat().st_mtime, size, meta_file.parent))
+      except (FileNotFoundError, ValueError, KeyError):
+        continue
+    return entries
+
+  def evict(self, max_bytes: int = None) -> int:
+    """ Removes least recently used entries until the cache fits into max_bytes.
+
+    Args:
+        max_bytes (int, optional): Size limit. Defaults to the limit of the cache.
+
+    Returns:
+        int: Number of removed entries
+    """
+    max_bytes = self.max_bytes if max_bytes is None else max_bytes
+    removed = 0
+    with self._lock(exclusive=True):
+      entries = sorted(self._entries(), key=lambda e: e[0])
+      total = sum(size for _, size, _ in entries)
+      for _, size, entry in entries:
+        if total <= max_bytes:
+          break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+        removed += 1
+    if removed > 0:
+      self._logger.info(f"evicted {removed} cache entries")
+    return removed
+
+  def clear(self) -> None:
+    """ Removes every entry.
+    """
+    self.evict(0)
+
+  def stats(self) -> dict:
+    """ Hit and miss counts of this process plus the current size of the cache.
+
+    Returns:
+        dict: hits, misses, hit_rate, entries and size in bytes
+    """
+    entries = self._entries()
+    lookups = self.hits + self.misses
+    return {'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(entries),
+            'size': sum(size for _, size, _ in entries)}
@@ -0,0 +1,169 @@
+import os
+import json
+import math
+import hashlib
+import numpy as np
+import shapely
+from pathlib import Path
+from config import Config
+from bounds import Bounds
+from log import get_logger
+from point_cloud import PointCloud
+from shapely.geometry import Polygon
+from transform import transform_xy
+
+
+def _get_polygonal(geometry):
+  """ Polygonal part of an intersection, which can also be or hold the lines and points where shapes only touch.
+      None when there is no area.
+  """
+  if geometry.geom_type not in ("Polygon", "MultiPolygon"):
+    parts = [part for part in shapely.get_parts(geometry) if part.geom_type in ("Polygon", "MultiPolygon")]
+    geometry = shapely.union_all(parts) if len(parts) > 0 else None
+  if geometry is None or geometry.is_empty:
+    return None
+  return geometry
+
+
+class Tile:
+  """ One cell of a tiling plan: the core area it owns and the buffered area it is fetched with.
+  """
+
+  __slots__ = ("id", "bounds", "buffered", "polygon_str", "closed")
+
+  def __init__(self, id: str, bounds: Bounds, buffered: Bounds, polygon_str: str,
+               closed: tuple = (False, False)) -> None:
+    """
+    Args:
+        id (str): Column and row of the tile, "<i>_<j>".
+        bounds (Bounds): Core area of the tile in EPSG:3857, points are kept if xmin <= x < xmax and ymin <= y < ymax.
+        buffered (Bounds): Core area grown by the overlap buffer, used as the readers.ept bounds.
+        polygon_str (str): WKT of the requested polygon clipped to the buffered area, used by filters.crop.
+        closed (tuple, optional): Whether the core also keeps points on its xmax and ymax edge,
+            set for the last column and row of a plan. Defaults to (False, False).
+    """
+    self.id = id
+    self.bounds = bounds
+    self.buffered = buffered
+    self.polygon_str = polygon_str
+    self.closed = closed
+
+  def clip(self, cloud: PointCloud, input_epsg: int = 3857) -> PointCloud:
+    """ Drops the points of the overlap buffer, keeping those inside the core area of the tile.
+
+    Args:
+        cloud (PointCloud): Points fetched for the buffered tile.
+        input_epsg (int, optional): Coordinate reference system of the tile bounds. Defaults to 3857.
+
+    Returns:
+        PointCloud
+    """
+    x, y = cloud.x, cloud.y
+    if cloud.epsg != input_epsg:
+      x, y = transform_xy(x, y, cloud.epsg, input_epsg)
+    inside_x = (x <= self.bounds.xmax) if self.closed[0] else (x < self.bounds.xmax)
+    inside_y = (y <= self.bounds.ymax) if self.closed[1] else (y < self.bounds.ymax)
+    inside = (x >= self.bounds.xmin) & inside_x & (y >= self.bounds.ymin) & inside_y
+    return cloud[inside]
+
+
+class TilePlanner:
+  """ Splits a large polygon into a grid of tiles with overlap buffers,
+      so each tile can be fetched (and ground classified) independently and in parallel.
+  """
+
+  def __init__(self, tile_size: float = None, buffer: float = None) -> None:
+    """
+    Args:
+        tile_size (float, optional): Edge length of a tile in meters (EPSG:3857). Defaults to Config.TILE_SIZE.
+        buffer (float, optional): Overlap added around every tile so SMRF has no edge artifacts. Defaults to Config.TILE_BUFFER.
+    """
+    self.tile_size = tile_size or Config.TILE_SIZE
+    self.buffer = Config.TILE_BUFFER if buffer is None else buffer
+
+  def plan(self, polygon: Polygon) -> list:
+    """ Computes the tiles covering a polygon, tiles not touching the polygon are left out.
+
+    Args:
+        polygon (Polygon): Polygon in EPSG:3857.
+
+    Returns:
+        list: List of Tile
+    """
+    xmin, ymin, xmax, ymax = polygon.bounds
+    columns = max(1, math.ceil((xmax - xmin) / self.tile_size))
+    rows = max(1, math.ceil((ymax - ymin) / self.tile_size))
+    shapely.prepare(polygon)
+
+    tiles = []
+    for i in range(columns):
+      for j in range(rows):
+        core = Bounds(xmin + i * self.tile_size, xmin + (i + 1) * self.tile_size,
+                      ymin + j * self.tile_size, ymin + (j + 1) * self.tile_size)
+        # a tile the polygon only touches along an edge or at a corner has no area to fetch
+        if _get_polygonal(polygon.intersection(shapely.box(core.xmin, core.ymin, core.xmax, core.ymax))) is None:
+          continue
+        buffered = Bounds(core.xmin - self.buffer, core.xmax + self.buffer,
+                          core.ymin - self.buffer, core.ymax + self.buffer)
+        # filters.crop needs a polygon, so lines of the polygon merely touching the buffer are dropped
+        area = _get_polygonal(polygon.intersection(
+            shapely.box(buffered.xmin, buffered.ymin, buffered.xmax, buffered.ymax)))
+        # the last column and row keep points on the max edge of the polygon, cores are half-open otherwise
+        tiles.append(Tile(f"{i}_{j}", core, buffered, area.wkt, (i == columns - 1, j == rows - 1)))
+    return tiles
+
+
+class TileJob:
+  """ Records which tiles of a tiled fetch are finished, so a failed job resumes where it stopped.
+      Clipped tile results are stored as .npy next to a manifest in the job directory.
+  """
+
+  def __init__(self, region: str, polygon: Polygon, planner: TilePlanner, epsg: int,
+               path: Path = None, pipeline: dict = None) -> None:
+    """
+    Args:
+        region (str): EPT resource name.
+        polygon (Polygon): Requested polygon in EPSG:3857.
+        planner (TilePlanner): Planner used to split the polygon.
+        epsg (int): Output coordinate reference system.
+        path (Path, optional): Parent directory of job directories. Defaults to Config.JOBS_PATH.
+        pipeline (dict, optional): Pipeline definition the tiles are fetched with, so a job run with another
+            profile never resumes from these tiles. Defaults to None.
+    """
+    job = json.dumps([region, polygon.wkt, planner.tile_size, planner.buffer, epsg, pipeline], sort_keys=True)
+    self.id = hashlib.sha256(job.encode()).hexdigest()[:16]
+    self.epsg = epsg
+    self.path = Path(path or Config.JOBS_PATH) / f"{region}_{self.id}"
+    self.path.mkdir(parents=True, exist_ok=True)
+    self._logger = get_logger("TileJob")
+    self.completed = self._read_manifest()
+
+  def _read_manifest(self) -> set:
+    try:
+      with open(self.path / "manifest.json", 'r') as f:
+        return set(json.load(f)['completed'])
+    except (FileNotFoundError, ValueError, KeyError):
+      return set()
+
+  def _write_manifest(self) -> None:
+    tmp = self.path / "manifest.json.tmp"
+    with open(tmp, 'w') as f:
+      json.dump({'completed': sorted(self.completed)}, f)
+    os.replace(tmp, self.path / "manifest.json")
+
+  def pending(self, tiles: list) -> list:
+    """ Returns the tiles that still have to be fetched.
+    """
+    return [t for t in tiles if t.id not in self.completed]
+
+  def complete(self, tile: Tile, cloud: PointCloud) -> None:
+    """ Stores the clipped points of a finished tile and marks it completed.
+    """
+    np.save(self.path / f"tile_{tile.id}.npy", cloud.points, allow_pickle=False)
+    self.completed.add(tile.id)
+    self._write_manifest()
+
+  def load(self, tile: Tile) -> PointCloud:
+    """ Loads the stored points of a completed tile.
+    """
+    return PointCloud(np.load(self.path / f"tile_{tile.id}.npy", allow_pickle=False), self.epsg)
@@ -0,0 +1,120 @@
+import os
+import threading
+import numpy as np
+import shapely
+from config import Config
+from lazy_import import lazy_import
+from concurrent.futures import ThreadPoolExecutor
+
+pyproj = lazy_import("pyproj")
+
+_transformers = {}
+_lock = threading.Lock()
+
+
+def _reset_after_fork() -> None:
+  global _lock
+  _lock = threading.Lock()
+  _transformers.clear()
+
+
+if hasattr(os, "register_at_fork"):
+  # POSIX only, processes are spawned without inheriting the cache elsewhere
+  os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _get_crs_key(crs):
+  """ Cache key of a CRS: EPSG codes as int, anything else pyproj accepts by its WKT,
+      so CRSs without an EPSG code, e.g. from ESRI .prj files, are cached too.
+  """
+  if isinstance(crs, (int, np.integer)):
+    return int(crs)
+  return pyproj.CRS.from_user_input(crs).to_wkt()
+
+
+def get_transformer(src, dst):
+  """ Returns the always_xy pyproj Transformer between two coordinate reference systems, created once per process.
+      Building a Transformer looks the operation up in the PROJ database, which costs far more than small transforms.
+      Transformers keep one PROJ context per thread, so the cached ones are safe to share between threads.
+
+  Args:
+      src (int | pyproj.CRS | str): EPSG code or any CRS pyproj accepts of the coordinates.
+      dst (int | pyproj.CRS | str): EPSG code or any CRS pyproj accepts to transform to.
+
+  Returns:
+      pyproj.Transformer
+  """
+  key = (_get_crs_key(src), _get_crs_key(dst))
+  transformer = _transformers.get(key)
+  if transformer is None:
+    with _lock:
+      transformer = _transformers.get(key)
+      if transformer is None:
+        transformer = pyproj.Transformer.from_crs(key[0], key[1], always_xy=True)
+        _transformers[key] = transformer
+  return transformer
+
+
+def transform_xy(x: np.ndarray, y: np.ndarray, src: int, dst: int, inplace: bool = False,
+                 chunk_size: int = None, workers: int = None) -> tuple:
+  """ Reprojects coordinate arrays in chunks, optionally spread over threads, as PROJ releases the GIL.
+
+  Args:
+      x (np.ndarray): x (longitude, easting) coordinates.
+      y (np.ndarray): y (latitude, northing) coordinates.
+      src (int): EPSG code of the coordinates.
+      dst (int): EPSG code to transform to.
+      inplace (bool, optional): Overwrite x and y, which must be contiguous float64 arrays. Defaults to False.
+      chunk_size (int, optional): Points transformed per call. Defaults to Config.CHUNK_SIZE.
+      workers (int, optional): Number of threads. Defaults to Config.TRANSFORM_WORKERS.
+
+  Returns:
+      tuple: transformed x and y arrays
+  """
+  if inplace:
+    for a in (x, y):
+      if not (isinstance(a, np.ndarray) and a.dtype == np.float64 and a.flags.c_contiguous and a.flags.writeable):
+        raise ValueError("inplace transforms need writeable, contiguous float64 arrays")
+  else:
+    x, y = np.array(x, dtype=np.float64), np.array(y, dtype=np.float64)
+  if src == dst or len(x) == 0:
+    return x, y
+
+  transformer = get_transformer(src, dst)
+  chunk_size = chunk_size or Config.CHUNK_SIZE
+  starts = range(0, len(x), chunk_size)
+
+  def transform_chunk(start):
+    transformer.transform(x[start:start + chunk_size], y[start:start + chunk_size], inplace=True)
+
+  workers = workers or Config.TRANSFORM_WORKERS or 1
+  if workers == 1 or len(starts) == 1:
+    for start in starts:
+      transform_chunk(start)
+  else:
+    with ThreadPoolExecutor(max_workers=min(workers, len(starts))) as executor:
+      list(executor.map(transform_chunk, starts))
+  return x, y
+
+
+def transform_geometries(geometries, src: int, dst: int) -> np.ndarray:
+  """ Reprojects shapely geometries by transforming all of their vertices in one batch.
+
+  Args:
+      geometries: A geometry or array-like of geometries.
+      src (int): EPSG code of the geometries.
+      dst (int): EPSG code to transform to.
+
+  Returns:
+      np.ndarray: transformed geometries, or a single geometry when one was given
+  """
+  if src == dst:
+    return geometries
+
+  def transform_coordinates(coordinates):
+    # z values, if any, pass through unchanged
+    coordinates = coordinates.copy()
+    coordinates[:, 0], coordinates[:, 1] = transform_xy(coordinates[:, 0], coordinates[:, 1], src, dst)
+    return coordinates
+
+  return shapely.transform(geometries, transform_coordinates, include_z=None)
@@ -1,18 +1,28 @@
 import numpy as np
-import geopandas as gpd
-import matplotlib.pyplot as plt
-import matplotlib.image as mpimg
+from config import Config
+from lazy_import import lazy_import
+from point_cloud import PointCloud
+from rasterizer import Rasterizer, Raster
+
+plt = lazy_import("matplotlib.pyplot")
+
 
 class Vis:
   """ This class is used for Visualizing geospatial data
   """
 
-  def __init__(self, df: gpd.GeoDataFrame):
+  def __init__(self, df):
+    """
+    Args:
+        df (gpd.GeoDataFrame | PointCloud): Geopandas data frame or point cloud to visualize.
+    """
     self.df = df
 
   def get_points(self):
     """ Generates a NumPy array from point clouds data.
     """
+    if isinstance(self.df, PointCloud):
+      return self.df.xyz()
     x = self.df.geometry.x
     y = self.df.geometry.y
     z = self.df.elevation
@@ -32,39 +42,77 @@ class Vis:
     plt.show()    
 
 
-  def render_3d(self, s: float = 0.01) -> None:
-    """ Plots a 3D terrain scatter plot for the cloud data points of geopandas data frame using matplotlib
+  def get_grid(self, bins: int = None, reducer: str = "max") -> Raster:
+    """ Bins the points into a 2D grid, datashader style, so rendering cost depends on the grid and not on the points.
+
+    Args:
+        bins (int, optional): Cells along the longer side of the extent. Defaults to Config.RENDER_BINS.
+        reducer (str, optional): Per-cell statistic of the elevation, one of rasterizer.REDUCERS. Defaults to "max".
+
+    Returns:
+        Raster
     """
     points = self.get_points()
-    fig, ax = plt.subplots(1, 1, figsize=(12, 10))
-    ax = plt.axes(projection='3d')
-    ax.scatter(points[:, 0], points[:, 1], points[:, 2], s=s)
+    extent = np.ptp(points[:, :2], axis=0).max()
+    resolution = extent / (bins or Config.RENDER_BINS) if extent > 0 else 1.0
+    raster = Rasterizer(resolution).rasterize(points, reducer)
+    if isinstance(self.df, PointCloud):
+      raster.epsg = self.df.epsg
+    return raster
+
+  def get_sample(self, point_budget: int = None) -> np.ndarray:
+    """ Returns at most point_budget points, a seeded random sample of them when the cloud is larger.
+
+    Args:
+        point_budget (int, optional): Maximum number of points. Defaults to Config.RENDER_POINT_BUDGET.
+
+    Returns:
+        np.ndarray: An (n, 3) array of x, y, z coordinates
+    """
+    points = self.get_points()
+    point_budget = point_budget or Config.RENDER_POINT_BUDGET
+    if len(points) <= point_budget:
+      return points
+    rng = np.random.default_rng(Config.RANDOM_SEED)
+    return points[np.sort(rng.choice(len(points), point_budget, replace=False))]
+
+  def render_3d(self, s: float = 0.01, point_budget: int = None, path: str = None) -> None:
+    """ Plots a 3D terrain scatter plot of the points using matplotlib.
+        Large clouds are downsampled to point_budget points, which keeps the figure responsive.
+
+    Args:
+        s (float, optional): Marker size. Defaults to 0.01.
+        point_budget (int, optional): Maximum number of points drawn. Defaults to Config.RENDER_POINT_BUDGET.
+        path (str, optional): Also save the figure to this file. Defaults to None.
+    """
+    points = self.get_sample(point_budget)
+    fig = plt.figure(figsize=(12, 10))
+    ax = fig.add_subplot(projection='3d')
+    ax.scatter(points[:, 0], points[:, 1], points[:, 2], s=s, c=points[:, 2], cmap="terrain")
     ax.set_xlabel('Longitude')
     ax.set_ylabel('Latitude')
-    plt.savefig('../assets/img/plot3d.png', dpi=120)
-    plt.axis('off')
-    plt.close()
-    fig, ax = plt.subplots(1, 1, figsize=(12, 10))
-    img = mpimg.imread('../assets/img/plot3d.png')
-    imgplot = plt.imshow(img)
-    plt.axis('off')
+    if path is not None:
+      fig.savefig(path, dpi=120)
     plt.show()
 
+  def plot_heatmap(self, title, bins: int = None, reducer: str = "max", path: str = None) -> None:
+    """ Plots a 2D heat map of the elevation using matplotlib, drawn from a binned grid instead of one shape per point.
 
-  def plot_heatmap(self, title) -> None:
-    """ Plots a 2D heat map for the point cloud data using matplotlib
+    Args:
+        title (str): Title of the plot.
+        bins (int, optional): Cells along the longer side of the extent. Defaults to Config.RENDER_BINS.
+        reducer (str, optional): Per-cell statistic of the elevation. Defaults to "max".
+        path (str, optional): Also save the figure to this file. Defaults to None.
     """
-
-    fig, ax = plt.subplots(1, 1, figsize=(12, 10))
-    self.df.plot(column='elevation', ax=ax, legend=True, cmap="terrain")
-    plt.title(title)
-    plt.xlabel('Longitude')
-    plt.ylabel('Latitude')
-    plt.savefig('../assets/img/heatmap.png', dpi=120)
-    plt.axis('off')
-    plt.close()
+    raster = self.get_grid(bins, reducer)
+    bounds = raster.bounds
     fig, ax = plt.subplots(1, 1, figsize=(12, 10))
-    img = mpimg.imread('../assets/img/heatmap.png')
-    imgplot = plt.imshow(img)
-    plt.axis('off')
+    image = ax.imshow(raster.data, cmap="terrain", interpolation="nearest",
+                      extent=(bounds.xmin, bounds.xmax, bounds.ymin, bounds.ymax))
+    fig.colorbar(image, ax=ax, fraction=0.03)
+    ax.set_title(title)
+    ax.set_xlabel('Longitude')
+    ax.set_ylabel('Latitude')
+    if path is not None:
+      fig.savefig(path, dpi=120)
     plt.show()
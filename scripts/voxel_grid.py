@@ -0,0 +1,184 @@
+import numpy as np
+from config import Config
+
+
+def get_voxel_index(points: np.ndarray, origin: np.ndarray, voxel_size: float) -> np.ndarray:
+  """ Computes the integer (i, j, k) voxel index of every point.
+
+  Args:
+      points (np.ndarray): An (n, 3) array of coordinates.
+      origin (np.ndarray): Corner of the grid, the minimum of the cloud.
+      voxel_size (float): Edge length of a cubic voxel.
+
+  Returns:
+      np.ndarray: An (n, 3) int64 array.
+  """
+  return ((points - origin) // voxel_size).astype(np.int64)
+
+
+def linearize(voxel_index: np.ndarray, shape: np.ndarray) -> np.ndarray:
+  """ Packs (i, j, k) voxel indices into one int64 key per point.
+      Keys sort in the same (i, j, k) lexicographic order as np.unique(axis=0) does on the index rows.
+  """
+  shape = np.asarray(shape, dtype=np.int64)
+  return (voxel_index[:, 0] * shape[1] + voxel_index[:, 1]) * shape[2] + voxel_index[:, 2]
+
+
+def delinearize(keys: np.ndarray, shape: np.ndarray) -> np.ndarray:
+  """ Unpacks int64 keys produced by linearize back into (i, j, k) voxel indices.
+  """
+  shape = np.asarray(shape, dtype=np.int64)
+  k = keys % shape[2]
+  j = (keys // shape[2]) % shape[1]
+  i = keys // (shape[1] * shape[2])
+  return np.column_stack((i, j, k))
+
+
+class VoxelGrid:
+  """ Sort-based voxel grid over a point array.
+      Points are ordered by their linearized voxel key once, after which every voxel is a contiguous segment
+      and all per-voxel reductions are single vectorized NumPy calls.
+  """
+
+  def __init__(self, points: np.ndarray, voxel_size: float, origin: np.ndarray = None) -> None:
+    """
+    Args:
+        points (np.ndarray): An (n, 3) array of coordinates.
+        voxel_size (float): Edge length of a cubic voxel.
+        origin (np.ndarray, optional): Corner of the grid. Defaults to the minimum of the points.
+    """
+    self.points = np.asarray(points, dtype=float)
+    self.voxel_size = voxel_size
+    self.origin = self.points.min(axis=0) if origin is None else np.asarray(origin, dtype=float)
+
+    voxel_index = get_voxel_index(self.points, self.origin, voxel_size)
+    self.shape = voxel_index.max(axis=0) + 1
+    keys = linearize(voxel_index, self.shape)
+    self.order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[self.order]
+    self.starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_keys)) + 1))
+    self.keys = sorted_keys[self.starts]
+    self.counts = np.diff(np.append(self.starts, len(sorted_keys)))
+    self.inverse = np.empty(len(keys), dtype=np.int64)
+    self.inverse[self.order] = np.repeat(np.arange(len(self.keys)), self.counts)
+
+  def __len__(self) -> int:
+    return len(self.keys)
+
+  @property
+  def voxel_index(self) -> np.ndarray:
+    """ (i, j, k) index of every non-empty voxel, in key order.
+    """
+    return delinearize(self.keys, self.shape)
+
+  @property
+  def sorted_points(self) -> np.ndarray:
+    return self.points[self.order]
+
+  def _first_by(self, values: np.ndarray) -> np.ndarray:
+    """ Per-voxel argmin of values, returned as indices into the original points.
+        Ties go to the point that comes first in the input.
+    """
+    return np.lexsort((values, self.inverse))[self.starts]
+
+  def barycenter(self) -> np.ndarray:
+    """ Mean of the points of every voxel.
+    """
+    # summing offsets from the origin keeps precision for large projected coordinates
+    sums = np.add.reduceat(self.sorted_points - self.origin, self.starts, axis=0)
+    return sums / self.counts[:, None] + self.origin
+
+  def candidate_center_index(self) -> np.ndarray:
+    """ Index of the point closest to its voxel barycenter, for every voxel.
+    """
+    offset = self.points - self.barycenter()[self.inverse]
+    return self._first_by(np.einsum('ij,ij->i', offset, offset))
+
+  def min_z_index(self) -> np.ndarray:
+    """ Index of the lowest point of every voxel.
+    """
+    return self._first_by(self.points[:, 2])
+
+  def max_z_index(self) -> np.ndarray:
+    """ Index of the highest point of every voxel.
+    """
+    return self._first_by(-self.points[:, 2])
+
+  def random_index(self, seed: int = Config.RANDOM_SEED) -> np.ndarray:
+    """ Index of a uniformly drawn point of every voxel.
+    """
+    rng = np.random.default_rng(seed)
+    return self._first_by(rng.random(len(self.points)))
+
+  def median(self) -> np.ndarray:
+    """ Coordinate-wise median of the points of every voxel.
+    """
+    lower = self.starts + (self.counts - 1) // 2
+    upper = self.starts + self.counts // 2
+    median = np.empty((len(self), 3))
+    for axis in range(3):
+      values = self.points[np.lexsort((self.points[:, axis], self.inverse)), axis]
+      median[:, axis] = (values[lower] + values[upper]) / 2
+    return median
+
+
+class VoxelAccumulator:
+  """ Incremental voxel grid for clouds that do not fit into memory.
+      Chunks of points are added one at a time and only running sums and counts per voxel key are kept.
+  """
+
+  def __init__(self, voxel_size: float, origin: np.ndarray, maximum: np.ndarray) -> None:
+    """
+    Args:
+        voxel_size (float): Edge length of a cubic voxel.
+        origin (np.ndarray): Corner of the grid, the minimum of the whole cloud.
+        maximum (np.ndarray): Maximum of the whole cloud, used to size the key space.
+    """
+    self.voxel_size = voxel_size
+    self.origin = np.asarray(origin, dtype=float)
+    self.shape = get_voxel_index(np.asarray(maximum, dtype=float)[None, :], self.origin, voxel_size)[0] + 1
+    self.keys = np.empty(0, dtype=np.int64)
+    self.sums = np.empty((0, 3))
+    self.counts = np.empty(0, dtype=np.int64)
+
+  def __len__(self) -> int:
+    return len(self.keys)
+
+  def add(self, points: np.ndarray) -> None:
+    """ Folds a chunk of points into the running per-voxel sums and counts.
+        The chunk is reduced on its own and merged into the sorted keys, so a chunk costs
+        time linear in the number of voxels seen so far rather than a sort of all of them.
+
+    Args:
+        points (np.ndarray): An (n, 3) array of coordinates inside [origin, maximum].
+
+    Raises:
+        ValueError: Points lie outside [origin, maximum], e.g. because of stale LAS header bounds.
+    """
+    if len(points) == 0:
+      return
+    index = get_voxel_index(points, self.origin, self.voxel_size)
+    if (index < 0).any() or (index >= self.shape).any():
+      raise ValueError("points lie outside the bounds the accumulator was created with")
+    keys, inverse = np.unique(linearize(index, self.shape), return_inverse=True)
+    inverse = inverse.ravel()
+    counts = np.bincount(inverse, minlength=len(keys))
+    sums = np.empty((len(keys), 3))
+    offset = points - self.origin
+    for axis in range(3):
+      sums[:, axis] = np.bincount(inverse, weights=offset[:, axis], minlength=len(keys))
+
+    positions = np.searchsorted(self.keys, keys)
+    found = positions < len(self.keys)
+    found[found] = self.keys[positions[found]] == keys[found]
+    self.counts[positions[found]] += counts[found]
+    self.sums[positions[found]] += sums[found]
+    new = ~found
+    self.keys = np.insert(self.keys, positions[new], keys[new])
+    self.counts = np.insert(self.counts, positions[new], counts[new])
+    self.sums = np.insert(self.sums, positions[new], sums[new], axis=0)
+
+  def barycenter(self) -> np.ndarray:
+    """ Mean of the points of every voxel, in key order like VoxelGrid.barycenter.
+    """
+    return self.sums / self.counts[:, None] + self.origin
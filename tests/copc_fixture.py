@@ -0,0 +1,111 @@
+import io
+import struct
+import laspy
+import lazrs
+import numpy as np
+from pathlib import Path
+
+SCALE = 0.01
+HIERARCHY_RECORD_ID = 1000
+
+
+def _compress_chunk(raw: bytes, laz_vlr) -> bytes:
+  """ Compresses points as one independent LAZ chunk, without the chunk table offset and the chunk table.
+  """
+  buffer = io.BytesIO()
+  compressor = lazrs.LasZipCompressor(buffer, laz_vlr)
+  compressor.compress_many(raw)
+  compressor.done()
+  data = buffer.getvalue()
+  chunk_table_offset = struct.unpack("<q", data[:8])[0]
+  return data[8:chunk_table_offset]
+
+
+def make_copc_fixture(path: Path, points: np.ndarray, depth: int = 3, seed: int = 27) -> dict:
+  """ Writes a small Cloud Optimized Point Cloud, so COPC readers can be tested without PDAL.
+      Points are assigned to octree levels with probability growing 4x per level, every node is one LAZ chunk
+      and the hierarchy is a single page in an EVLR.
+
+  Args:
+      path (Path): Output .copc.laz file.
+      points (np.ndarray): (n, 3) coordinates.
+      depth (int, optional): Number of octree levels. Defaults to 3.
+      seed (int, optional): Random seed of the level assignment. Defaults to 27.
+
+  Returns:
+      dict: point count per node key "d-x-y-z"
+  """
+  rng = np.random.default_rng(seed + 1)
+  mins = points.min(axis=0)
+  halfsize = (points.max(axis=0) - mins).max() / 2 + 1
+  center = mins + halfsize - 0.5
+
+  weights = 4.0 ** np.arange(depth)
+  levels = rng.choice(depth, size=len(points), p=weights / weights.sum())
+  cube_min = center - halfsize
+  keys = np.empty((len(points), 4), dtype=np.int64)
+  keys[:, 0] = levels
+  node_size = (2 * halfsize) / 2.0 ** levels
+  keys[:, 1:] = np.minimum((points - cube_min) // node_size[:, None], (2 ** levels - 1)[:, None])
+  order = np.lexsort(keys.T[::-1])
+  points, keys = points[order], keys[order]
+  unique, starts, counts = np.unique(keys, axis=0, return_index=True, return_counts=True)
+
+  header = laspy.LasHeader(version="1.4", point_format=6)
+  header.scales = np.array([SCALE] * 3)
+  header.offsets = np.round(cube_min)
+  las = laspy.LasData(header)
+  las.x, las.y, las.z = points[:, 0], points[:, 1], points[:, 2]
+  las.intensity = np.arange(len(points)) % 1000
+  las.classification = np.full(len(points), 2, dtype=np.uint8)
+  las.update_header()
+  raw = las.points.array
+
+  laz_vlr = lazrs.LazVlr.new_for_compression(6, 0, use_variable_size_chunks=True)
+  chunks = [_compress_chunk(raw[s:s + c].tobytes(), laz_vlr) for s, c in zip(starts, counts)]
+
+  header = las.header
+  header.vlrs = laspy.vlrs.vlrlist.VLRList()
+  header.vlrs.append(laspy.VLR("copc", 1, "copc info", b"\0" * 160))
+  header.vlrs.append(laspy.VLR("laszip encoded", 22204, "lazrs", laz_vlr.record_data()))
+  header.set_compressed(True)
+  with io.BytesIO() as tmp:
+    header.write_to(tmp)
+  offset = header.offset_to_point_data + 8
+
+  entries = b""
+  chunk_table = []
+  for key, count, chunk in zip(unique, counts, chunks):
+    entries += struct.pack("<4iQii", *key, offset, len(chunk), count)
+    chunk_table.append((int(count), len(chunk)))
+    offset += len(chunk)
+  # readers walk the octree from the root, so ancestors of every node must be listed, empty ones with 0 points
+  present = {tuple(key) for key in unique}
+  for key in unique:
+    d, x, y, z = key
+    while d > 0:
+      d, x, y, z = d - 1, x // 2, y // 2, z // 2
+      if (d, x, y, z) not in present:
+        present.add((d, x, y, z))
+        entries += struct.pack("<4iQii", d, x, y, z, 0, 0, 0)
+  with io.BytesIO() as tmp:
+    lazrs.write_chunk_table(tmp, chunk_table, laz_vlr)
+    chunk_table_bytes = tmp.getvalue()
+  chunk_table_offset = offset
+  evlr_offset = offset + len(chunk_table_bytes)
+
+  spacing = 2 * halfsize / 128
+  info = struct.pack("<3d2d2Q2d", *center, halfsize, spacing, evlr_offset + 60, len(entries), 0.0, 0.0)
+  header.vlrs[0] = laspy.VLR("copc", 1, "copc info", info + b"\0" * 88)
+  header.start_of_first_evlr = evlr_offset
+  header.number_of_evlrs = 1
+
+  with open(path, 'wb') as f:
+    header.write_to(f)
+    f.write(struct.pack("<q", chunk_table_offset))
+    for chunk in chunks:
+      f.write(chunk)
+    f.write(chunk_table_bytes)
+    f.write(struct.pack("<H16sHQ32s", 0, b"copc", HIERARCHY_RECORD_ID, len(entries), b"EPT hierarchy"))
+    f.write(entries)
+  return {f"{k[0]}-{k[1]}-{k[2]}-{k[3]}": int(c) for k, c in zip(unique, counts)}
@@ -0,0 +1,105 @@
+import json
+import laspy
+import numpy as np
+from pathlib import Path
+
+SPAN = 128
+SCALE = 0.01
+SCHEMA = [
+    {"name": "Intensity", "type": "unsigned", "size": 2},
+    {"name": "ReturnNumber", "type": "unsigned", "size": 1},
+    {"name": "NumberOfReturns", "type": "unsigned", "size": 1},
+    {"name": "ScanDirectionFlag", "type": "unsigned", "size": 1},
+    {"name": "EdgeOfFlightLine", "type": "unsigned", "size": 1},
+    {"name": "Classification", "type": "unsigned", "size": 1},
+    {"name": "ScanAngleRank", "type": "float", "size": 4},
+    {"name": "UserData", "type": "unsigned", "size": 1},
+    {"name": "PointSourceId", "type": "unsigned", "size": 2},
+    {"name": "GpsTime", "type": "float", "size": 8},
+    {"name": "Red", "type": "unsigned", "size": 2},
+    {"name": "Green", "type": "unsigned", "size": 2},
+    {"name": "Blue", "type": "unsigned", "size": 2},
+]
+
+
+def make_points(n: int, bounds: tuple, seed: int = 27) -> np.ndarray:
+  """ Synthetic terrain: a gentle slope with noise over the (xmin, ymin, xmax, ymax) bounds.
+  """
+  rng = np.random.default_rng(seed)
+  xmin, ymin, xmax, ymax = bounds
+  x = rng.uniform(xmin, xmax, n)
+  y = rng.uniform(ymin, ymax, n)
+  z = 300 + 0.01 * (x - xmin) + 0.02 * (y - ymin) + rng.normal(0, 0.5, n)
+  return np.column_stack((x, y, z))
+
+
+def make_ept_fixture(path: Path, n: int = 100_000, bounds: tuple = (-10436900, 5148000, -10435900, 5149000),
+                     depth: int = 3, write_data: bool = True, seed: int = 27) -> dict:
+  """ Writes a small Entwine Point Tile dataset (ept.json, ept-hierarchy, ept-data) to a local directory,
+      so fetches and planners can run without network access.
+      Points are assigned to octree depths with probability growing 4x per level, like a 2.5D survey.
+
+  Args:
+      path (Path): Directory of the dataset, its name is the region name.
+      n (int, optional): Number of points. Defaults to 100_000.
+      bounds (tuple, optional): (xmin, ymin, xmax, ymax) in EPSG:3857. Defaults to an area in Iowa.
+      depth (int, optional): Number of octree levels. Defaults to 3.
+      write_data (bool, optional): Also write the laz node files. Defaults to True.
+      seed (int, optional): Random seed. Defaults to 27.
+
+  Returns:
+      dict: the ept.json content
+  """
+  path = Path(path)
+  (path / "ept-hierarchy").mkdir(parents=True, exist_ok=True)
+  (path / "ept-data").mkdir(parents=True, exist_ok=True)
+  points = make_points(n, bounds, seed)
+  rng = np.random.default_rng(seed + 1)
+
+  xmin, ymin, xmax, ymax = bounds
+  zmin, zmax = points[:, 2].min(), points[:, 2].max()
+  width = max(xmax - xmin, ymax - ymin, zmax - zmin)
+  cube = np.array([xmin, ymin, zmin])
+
+  weights = 4.0 ** np.arange(depth)
+  levels = rng.choice(depth, size=n, p=weights / weights.sum())
+  hierarchy = {}
+  for d in range(depth):
+    selected = points[levels == d]
+    node_size = width / 2 ** d
+    keys = np.minimum((selected - cube) // node_size, 2 ** d - 1).astype(int)
+    unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    for i, key in enumerate(unique):
+      name = f"{d}-{key[0]}-{key[1]}-{key[2]}"
+      node_points = selected[inverse.ravel() == i]
+      hierarchy[name] = len(node_points)
+      if write_data:
+        header = laspy.LasHeader(point_format=3, version="1.2")
+        header.scales = np.array([SCALE] * 3)
+        header.offsets = cube
+        las = laspy.LasData(header)
+        las.x, las.y, las.z = node_points[:, 0], node_points[:, 1], node_points[:, 2]
+        las.classification = np.full(len(node_points), 2, dtype=np.uint8)
+        las.write(path / "ept-data" / f"{name}.laz")
+
+  if "0-0-0-0" not in hierarchy:
+    hierarchy["0-0-0-0"] = 0
+  with open(path / "ept-hierarchy" / "0-0-0-0.json", 'w') as f:
+    json.dump(hierarchy, f)
+
+  coordinates = [{"name": axis, "type": "signed", "size": 4, "scale": SCALE, "offset": float(offset)}
+                 for axis, offset in zip("XYZ", cube)]
+  ept = {
+      "bounds": [xmin, ymin, float(zmin), xmin + width, ymin + width, float(zmin) + width],
+      "boundsConforming": [xmin, ymin, float(zmin), xmax, ymax, float(zmax)],
+      "dataType": "laszip",
+      "hierarchyType": "json",
+      "points": int(n),
+      "schema": coordinates + SCHEMA,
+      "span": SPAN,
+      "srs": {"authority": "EPSG", "horizontal": "3857"},
+      "version": "1.0.0",
+  }
+  with open(path / "ept.json", 'w') as f:
+    json.dump(ept, f)
+  return ept
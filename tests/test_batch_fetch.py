@@ -0,0 +1,54 @@
+import os
+import sys
+import unittest
+import numpy as np
+import shapely
+import geopandas as gpd
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from point_cloud import PointCloud
+from fetch_lidar import FetchLidar
+
+
+class TestBatchFetch(unittest.TestCase):
+
+  def setUp(self):
+    self.fetcher = FetchLidar(epsg=26915)
+    # three footprints within a block and one about 3 km away, in EPSG:26915 inside IA_FullState
+    boxes = [(437000, 4641000), (437030, 4641000), (437060, 4641040), (440000, 4641000)]
+    self.features = gpd.GeoDataFrame({'id': ["a", "b", "c", "d"]},
+                                     geometry=[shapely.box(x, y, x + 20, y + 15) for x, y in boxes],
+                                     crs="EPSG:26915").set_index('id')
+
+  def test_plan_clusters_nearby_features(self):
+    plan = self.fetcher.plan_batch(self.features, ["IA_FullState"], cluster_size=1000)
+    self.assertEqual(len(plan), 2)
+    self.assertListEqual(sorted(len(c['features']) for c in plan), [1, 3])
+    for cluster in plan:
+      self.assertEqual(cluster['filename'], "IA_FullState")
+      geometries = self.fetcher._get_batch_geometries(self.features)[cluster['features']]
+      area = shapely.from_wkt(cluster['polygon_str'])
+      self.assertTrue(all(area.contains(g) for g in geometries))
+      b = cluster['bounds']
+      self.assertTrue(shapely.box(b.xmin, b.ymin, b.xmax, b.ymax).contains(area))
+
+  def test_plan_searches_regions(self):
+    plan = self.fetcher.plan_batch(self.features, cluster_size=100000)
+    self.assertIn("IA_FullState", [c['filename'] for c in plan])
+    self.assertTrue(all(len(c['features']) == 4 for c in plan))
+
+  def test_clip_features(self):
+    rng = np.random.default_rng(27)
+    xyz = np.column_stack((rng.random(20000) * 100, rng.random(20000) * 100, rng.random(20000)))
+    cloud = PointCloud.from_xyz(xyz, 3857, {"Intensity": np.arange(20000)})
+    geometries = [shapely.box(10, 10, 40, 30), shapely.Polygon([(50, 50), (90, 50), (70, 90)]),
+                  shapely.box(200, 200, 210, 210)]
+    clipped = self.fetcher.clip_features(cloud, geometries)
+    for geometry, part in zip(geometries, clipped):
+      expected = np.flatnonzero(shapely.contains_xy(geometry, xyz[:, 0], xyz[:, 1]))
+      self.assertTrue(np.array_equal(part.points["Intensity"], expected))
+    self.assertEqual(len(clipped[2]), 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+import json
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+import shapely
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+import fetch_lidar
+from bounds import Bounds
+from fetch_lidar import FetchLidar
+from profiler import PipelineProfiler, JsonLinesWriter
+
+
+def fake_fetch_region(bounds, polygon_str, region, resolution=None):
+  if region.startswith("slow"):
+    time.sleep(30)
+  if region == "fail":
+    raise RuntimeError("pipeline failed")
+  if region == "crash":
+    os._exit(3)
+  if region == "empty":
+    return None
+  return f"points of {region}"
+
+
+@unittest.skipUnless(multiprocessing.get_start_method() == "fork", "stubs reach the workers through fork")
+class FakePipeline:
+
+  def __init__(self, definition):
+    pass
+
+  def execute(self):
+    self.arrays = [np.zeros(3, dtype=[("X", float), ("Y", float), ("Z", float)])]
+    self.metadata = "{}"
+
+
+class TestConcurrentFetch(unittest.TestCase):
+
+  def setUp(self):
+    self.fetcher = FetchLidar(epsg=26915)
+    self.bounds = Bounds(0, 1, 0, 1)
+    patches = [mock.patch.object(fetch_lidar, "_init_worker", lambda options: None),
+               mock.patch.object(fetch_lidar, "_fetch_region", fake_fetch_region)]
+    for patch in patches:
+      patch.start()
+      self.addCleanup(patch.stop)
+
+  def get_regions(self, names):
+    return pd.DataFrame({'filename': names, 'region': names, 'year': [2020] * len(names)})
+
+  def test_results_and_failures(self):
+    regions = self.get_regions(["a", "fail", "b", "empty", "crash", "c"])
+    results = dict(self.fetcher._iter_concurrent(self.bounds, "", regions, workers=2))
+    self.assertListEqual(sorted(results), [0, 2, 5])
+    self.assertEqual(results[2]['geo_data'], "points of b")
+    self.assertEqual(results[5]['region'], "c")
+
+  def test_timeout_counts_from_start(self):
+    # the fast regions wait for a slot behind the slow one without timing out themselves
+    regions = self.get_regions(["slow", "a", "b", "c"])
+    start = time.monotonic()
+    results = dict(self.fetcher._iter_concurrent(self.bounds, "", regions, workers=2, timeout=1.5))
+    self.assertListEqual(sorted(results), [1, 2, 3])
+    self.assertLess(time.monotonic() - start, 10)
+
+  def test_close_stops_workers(self):
+    regions = self.get_regions(["a", "slow 1", "slow 2"])
+    iterator = self.fetcher._iter_concurrent(self.bounds, "", regions, workers=3)
+    self.assertEqual(next(iterator)[0], 0)
+    start = time.monotonic()
+    iterator.close()
+    self.assertLess(time.monotonic() - start, 5)
+    self.assertEqual(len(multiprocessing.active_children()), 0)
+
+  def test_iter_lidar_data(self):
+    polygon = shapely.box(437000, 4641000, 437100, 4641100)
+    results = list(self.fetcher.iter_lidar_data(polygon, ["IA_FullState"], workers=2))
+    self.assertEqual(len(results), 1)
+    self.assertEqual(results[0]['geo_data'], "points of IA_FullState")
+    fetched = self.fetcher.fetch_lidar_data(polygon, ["IA_FullState"], workers=2)
+    self.assertListEqual([r['geo_data'] for r in fetched], ["points of IA_FullState"])
+
+  def test_get_regions(self):
+    bound, _ = self.fetcher._gdf_helper.get_bound_from_polygon(shapely.box(437000, 4641000, 437100, 4641100))
+    self.assertListEqual(list(self.fetcher.get_regions(bound, ["IA_FullState"])['filename']), ["IA_FullState"])
+    self.assertIn("IA_FullState", list(self.fetcher.get_regions(bound, [])['filename']))
+
+
+
+@unittest.skipUnless(multiprocessing.get_start_method() == "fork", "stubs reach the workers through fork")
+class TestWorkerProfiling(unittest.TestCase):
+
+  def setUp(self):
+    self.path = Path(tempfile.mkdtemp())
+    self.addCleanup(shutil.rmtree, self.path)
+    patch = mock.patch.object(fetch_lidar, "pdal", mock.Mock(Pipeline=FakePipeline))
+    patch.start()
+    self.addCleanup(patch.stop)
+
+  def test_hooks_run_in_workers(self):
+    records = []
+    profiler = PipelineProfiler([records.append, JsonLinesWriter(self.path / "fetch.jsonl")])
+    fetcher = FetchLidar(epsg=26915, as_point_cloud=True, profiler=profiler)
+    regions = pd.DataFrame({'filename': ["a", "b"], 'region': ["a", "b"], 'year': [2020, 2020]})
+    results = dict(fetcher._iter_concurrent(Bounds(0, 1, 0, 1), "POLYGON((0 0, 1 0, 1 1, 0 0))", regions, workers=2))
+    self.assertEqual(len(results), 2)
+    # profiling is per process, only the shared file sees the records of the workers
+    self.assertListEqual(records, [])
+    with open(self.path / "fetch.jsonl", 'r') as f:
+      lines = [json.loads(line) for line in f]
+    self.assertListEqual(sorted(line['region'] for line in lines), ["a", "b"])
+    self.assertTrue(all(line['pid'] != os.getpid() for line in lines))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,78 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from bounds import Bounds
+from config import Config
+from file_handler import FileHandler
+from copc_reader import CopcPointReader
+from pipeline_builder import PipelineBuilder
+from copc_fixture import make_copc_fixture
+
+
+class TestCopcPointReader(unittest.TestCase):
+
+  def setUp(self):
+    self.path = Path(tempfile.mkdtemp())
+    rng = np.random.default_rng(27)
+    n = 20000
+    self.points = np.round(np.column_stack((rng.random(n) * 100 + 500000,
+                                            rng.random(n) * 100 + 4600000,
+                                            rng.random(n) * 20)), 2)
+    self.nodes = make_copc_fixture(self.path / "tile.copc.laz", self.points)
+    self.reader = CopcPointReader(self.path / "tile.copc.laz")
+    self.bounds = Bounds(500010, 500030, 4600010, 4600030)
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def test_bounds_query(self):
+    points = self.reader.read(self.bounds, dimensions=["Intensity"])
+    p = self.points
+    inside = ((p[:, 0] >= 500010) & (p[:, 0] <= 500030) & (p[:, 1] >= 4600010) & (p[:, 1] <= 4600030))
+    self.assertEqual(len(points), inside.sum())
+    self.assertTrue(np.allclose(np.sort(points['X']), np.sort(p[inside, 0])))
+    self.assertEqual(points.dtype.names, ("X", "Y", "Z", "Intensity"))
+
+  def test_bounds_query_reads_only_overlapping_nodes(self):
+    nodes = self.reader.get_nodes(self.bounds)
+    self.assertLess(len(nodes), len(self.nodes))
+    self.assertLess(sum(n['points'] for n in nodes), len(self.points))
+
+  def test_level_query(self):
+    self.assertEqual(len(self.reader.read(level=0)), self.nodes["0-0-0-0"])
+    coarse = sum(c for key, c in self.nodes.items() if key[0] in "01")
+    self.assertEqual(len(self.reader.read(level=range(0, 2))), coarse)
+    self.assertEqual(len(self.reader.read()), len(self.points))
+
+  def test_resolution_query(self):
+    spacing = self.reader.info.spacing
+    self.assertListEqual(list(self.reader._get_levels(None, spacing)), [0])
+    self.assertListEqual(list(self.reader._get_levels(None, spacing * 4)), [0])
+    self.assertListEqual(list(self.reader._get_levels(None, spacing / 2)), [0, 1])
+    self.assertEqual(len(self.reader.read(resolution=spacing * 4)), self.nodes["0-0-0-0"])
+
+  def test_file_handler(self):
+    laz_path = Config.LAZ_PATH
+    Config.LAZ_PATH = self.path
+    try:
+      points = FileHandler().read_copc("tile", level=0)
+    finally:
+      Config.LAZ_PATH = laz_path
+    self.assertEqual(len(points), self.nodes["0-0-0-0"])
+
+  def test_copc_profile(self):
+    with open('../assets/usgs_3dep_pipeline.json') as f:
+      pipeline = PipelineBuilder(json.load(f)).build("copc")
+    self.assertEqual(pipeline['pipeline'][-1]['type'], "writers.copc")
+    self.assertEqual(pipeline['pipeline'][-1]['inputs'], ["reprojection"])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,55 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import laspy
+import numpy as np
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from ept_fixture import make_ept_fixture
+
+
+class TestEptFixture(unittest.TestCase):
+  """ The fixture feeds readers.ept in the benchmarks, so it is checked against the EPT layout here.
+  """
+
+  def setUp(self):
+    self.path = Path(tempfile.mkdtemp()) / "BENCH_EPT"
+    self.ept = make_ept_fixture(self.path, n=20000)
+    with open(self.path / "ept-hierarchy" / "0-0-0-0.json", 'r') as f:
+      self.hierarchy = json.load(f)
+
+  def tearDown(self):
+    shutil.rmtree(self.path.parent)
+
+  def test_nodes_match_hierarchy(self):
+    nodes = {k: c for k, c in self.hierarchy.items() if c > 0}
+    self.assertEqual(sum(nodes.values()), 20000)
+    self.assertSetEqual({f.stem for f in (self.path / "ept-data").glob("*.laz")}, set(nodes))
+    cube = np.asarray(self.ept['bounds'])
+    for name, count in nodes.items():
+      las = laspy.read(self.path / "ept-data" / f"{name}.laz")
+      self.assertEqual(len(las.points), count)
+      d, x, y, z = map(int, name.split("-"))
+      size = (cube[3] - cube[0]) / 2 ** d
+      node_min = cube[:3] + np.array([x, y, z]) * size
+      xyz = np.column_stack((las.x, las.y, las.z))
+      tolerance = 0.01
+      self.assertTrue((xyz >= node_min - tolerance).all() and (xyz <= node_min + size + tolerance).all(), name)
+
+  def test_schema_matches_point_format(self):
+    las = laspy.read(next((self.path / "ept-data").glob("*.laz")))
+    names = [d['name'] for d in self.ept['schema']]
+    self.assertListEqual(names[:3], ["X", "Y", "Z"])
+    point_format = [n.replace("_", "").lower() for n in las.point_format.dimension_names]
+    for name in names[3:]:
+      self.assertIn(name.lower(), point_format)
+    self.assertEqual(self.ept['points'], 20000)
+    self.assertEqual(las.header.point_format.id, 3)
+
+
+if __name__ == '__main__':
+  unittest.main()
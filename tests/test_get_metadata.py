@@ -0,0 +1,80 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from get_metadata import GetMetadata
+
+RESOURCES = ["AK_BrooksCamp_2012/", "IA_FullState/", "NE_Rainwater-2_2009/"]
+
+
+class CountingHandler(SimpleHTTPRequestHandler):
+  requests = []
+
+  def do_GET(self):
+    CountingHandler.requests.append((self.path, self.headers.get('If-Modified-Since')))
+    super().do_GET()
+
+  def log_message(self, format, *args):
+    pass
+
+
+class TestGetMetadata(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = Path(tempfile.mkdtemp())
+    for i, resource in enumerate(RESOURCES):
+      (self.dir / resource).mkdir()
+      self.write_ept(resource, i)
+    CountingHandler.requests = []
+    handler = partial(CountingHandler, directory=str(self.dir))
+    self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{self.server.server_port}/"
+    self.metadata = GetMetadata(target_url=url)
+    self.checkpoint = self.dir / "checkpoint.jsonl"
+
+  def tearDown(self):
+    self.server.shutdown()
+    self.server.server_close()
+    shutil.rmtree(self.dir)
+
+  def write_ept(self, resource, i, points=100):
+    ept = {'bounds': [i, 10 + i, 0, i + 1, 11 + i, 1], 'points': points}
+    with open(self.dir / resource / "ept.json", 'w') as f:
+      json.dump(ept, f)
+
+  def test_crawl(self):
+    df = self.metadata.crawl(RESOURCES + ["missing/"], workers=4)
+    self.assertListEqual(list(df['filename']), [r.replace('/', '') for r in RESOURCES])
+    self.assertListEqual(list(df['region']), ['AK_BrooksCamp', 'IA_FullState', 'NE_Rainwater-2'])
+    self.assertListEqual(list(df['xmax']), [1, 2, 3])
+    self.assertListEqual(list(df['ymin']), [10, 11, 12])
+
+  def test_resume_from_checkpoint(self):
+    self.metadata.crawl(RESOURCES[:2], workers=2, checkpoint=self.checkpoint)
+    CountingHandler.requests = []
+    df = self.metadata.crawl(RESOURCES, workers=2, checkpoint=self.checkpoint)
+    self.assertEqual(len(df), 3)
+    self.assertListEqual([p for p, _ in CountingHandler.requests], ["/NE_Rainwater-2_2009/ept.json"])
+
+  def test_refresh_refetches_changed_resources(self):
+    self.metadata.crawl(RESOURCES, workers=2, checkpoint=self.checkpoint)
+    self.write_ept(RESOURCES[1], 1, points=500)
+    os.utime(self.dir / RESOURCES[1] / "ept.json", (2e9, 2e9))
+    CountingHandler.requests = []
+    df = self.metadata.crawl(RESOURCES, workers=2, checkpoint=self.checkpoint, refresh=True)
+    self.assertEqual(len(CountingHandler.requests), 3)
+    self.assertTrue(all(since is not None for _, since in CountingHandler.requests))
+    self.assertListEqual(list(df['points']), [100, 500, 100])
+
+
+if __name__ == '__main__':
+  unittest.main()
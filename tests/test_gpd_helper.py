@@ -0,0 +1,51 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from gpd_helper import GPDHelper, EXTRA_DIMENSIONS
+
+
+class TestGPDHelper(unittest.TestCase):
+
+  def setUp(self):
+    self.helper = GPDHelper(3857, 26915)
+    dtype = [("X", float), ("Y", float), ("Z", float), ("Intensity", np.uint16),
+             ("Classification", np.uint8), ("ReturnNumber", np.uint8), ("GpsTime", float)]
+    self.arrays = [np.zeros(3, dtype=dtype), np.zeros(0, dtype=dtype), np.zeros(2, dtype=dtype)]
+    for i, a in enumerate(self.arrays):
+      a["X"], a["Y"], a["Z"] = i + np.arange(len(a)), 10 + np.arange(len(a)), 100 + i
+      a["Intensity"] = 7 * (i + 1)
+
+  def test_get_dep_points_columns(self):
+    points = np.array([[1, 2, 3, 9], [4, 5, 6, 9]])
+    df = self.helper.get_dep_points(points)
+    self.assertListEqual(list(df.geometry.x), [1, 4])
+    self.assertListEqual(list(df.geometry.y), [2, 5])
+    self.assertListEqual(list(df.elevation), [3, 6])
+    self.assertEqual(df.crs.to_epsg(), 26915)
+
+  def test_get_dep_points_single_and_square(self):
+    self.assertListEqual(list(self.helper.get_dep_points([1, 2, 3]).elevation), [3])
+    df = self.helper.get_dep_points(np.arange(9).reshape(3, 3), {"Intensity": np.array([1, 2, 3])})
+    self.assertListEqual(list(df.geometry.x), [0, 3, 6])
+    self.assertListEqual(list(df.Intensity), [1, 2, 3])
+
+  def test_get_dep(self):
+    df = self.helper.get_dep(self.arrays)
+    self.assertEqual(len(df), 5)
+    self.assertListEqual(list(df.columns), ["elevation", "geometry"])
+    self.assertListEqual(list(df.elevation), [100, 100, 100, 102, 102])
+
+  def test_get_dep_extra_dimensions(self):
+    df = self.helper.get_dep(self.arrays, EXTRA_DIMENSIONS + ["Missing"])
+    self.assertListEqual(list(df.columns), ["elevation"] + EXTRA_DIMENSIONS + ["geometry"])
+    self.assertListEqual(list(df.Intensity), [7, 7, 7, 21, 21])
+
+  def test_get_dep_empty(self):
+    self.assertEqual(len(self.helper.get_dep([])), 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import unittest
+import multiprocessing
+import shapely
+import numpy as np
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+import fetch_lidar
+from bounds import Bounds
+from fetch_lidar import FetchLidar
+
+
+def fake_init_worker(options):
+  global worker_options
+  worker_options = options
+
+
+def fake_fetch_region(bounds, polygon_str, region, resolution=None):
+  # full density is slow, previews are quick
+  if resolution is None:
+    time.sleep(30)
+  return f"{region} at {resolution}"
+
+
+def fake_fetch_profile(bounds, polygon_str, region, resolution=None):
+  return (worker_options['profile'], worker_options['in_memory'])
+
+
+class TestLevelOfDetail(unittest.TestCase):
+
+  def setUp(self):
+    self.fetcher = FetchLidar(epsg=26915)
+    self.polygon = shapely.box(437000, 4641000, 437100, 4641100)
+
+  def test_get_resolution(self):
+    bounds = Bounds(0, 100, 0, 400)
+    self.assertAlmostEqual(self.fetcher.get_resolution(bounds, 10000), 2)
+    self.assertAlmostEqual(self.fetcher.get_resolution(bounds, 40000), 1)
+    for budget in (0, -5):
+      with self.assertRaises(ValueError):
+        self.fetcher.get_resolution(bounds, budget)
+
+  def test_resolution_suffix(self):
+    arrays = [np.zeros(3, dtype=[("X", float), ("Y", float), ("Z", float)])]
+    with mock.patch.object(self.fetcher, "_execute", return_value=arrays) as execute:
+      self.fetcher.get_dep(Bounds(0, 1, 0, 1), "POLYGON((0 0, 1 0, 1 1, 0 0))", "IA_FullState", 2.5)
+      self.fetcher.get_dep(Bounds(0, 1, 0, 1), "POLYGON((0 0, 1 0, 1 1, 0 0))", "IA_FullState")
+    coarse, full = [call.args[0]['pipeline'] for call in execute.call_args_list]
+    self.assertEqual(coarse[0]['resolution'], 2.5)
+    self.assertTrue(coarse[-1]['filename'].endswith("_r2.5.tif"))
+    self.assertNotIn('resolution', full[0])
+    self.assertNotIn("_r", os.path.basename(full[-1]['filename']))
+
+  @unittest.skipUnless(multiprocessing.get_start_method() == "fork", "stubs reach the workers through fork")
+  def test_progressive_close_after_preview(self):
+    with mock.patch.object(fetch_lidar, "_init_worker", lambda options: None), \
+         mock.patch.object(fetch_lidar, "_fetch_region", fake_fetch_region):
+      levels = self.fetcher.iter_progressive(self.polygon, "IA_FullState", levels=2, point_budget=100)
+      first, second = next(levels), next(levels)
+      self.assertEqual((first['level'], second['level']), (0, 1))
+      self.assertAlmostEqual(first['resolution'], 2 * second['resolution'])
+      start = time.monotonic()
+      levels.close()
+      self.assertLess(time.monotonic() - start, 5)
+      self.assertEqual(len(multiprocessing.active_children()), 0)
+
+
+  @unittest.skipUnless(multiprocessing.get_start_method() == "fork", "stubs reach the workers through fork")
+  def test_progressive_previews_skip_filters_and_writers(self):
+    with mock.patch.object(fetch_lidar, "_init_worker", fake_init_worker), \
+         mock.patch.object(fetch_lidar, "_fetch_region", fake_fetch_profile):
+      levels = list(self.fetcher.iter_progressive(self.polygon, "IA_FullState", levels=2, point_budget=100))
+    self.assertListEqual([level['geo_data'] for level in levels],
+                         [("raw", True), ("raw", True), ("default", False)])
+
+  def test_progressive_zero_budget(self):
+    with self.assertRaises(ValueError):
+      next(self.fetcher.iter_progressive(self.polygon, "IA_FullState", point_budget=0))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+import log
+from config import Config
+from log import get_logger, set_level, RateLimitFilter, SampleFilter
+
+
+def make_record(level=logging.INFO, msg="tile done"):
+  return logging.LogRecord("test", level, __file__, 1, msg, None, None)
+
+
+class TestLog(unittest.TestCase):
+
+  def setUp(self):
+    self.log_file = Config.LOG_FILE
+    self.path = Path(tempfile.mkdtemp())
+    log._stop_listener()
+    Config.LOG_FILE = self.path / "test.log"
+
+  def tearDown(self):
+    log._stop_listener()
+    Config.LOG_FILE = self.log_file
+    shutil.rmtree(self.path)
+
+  def test_handlers_are_not_duplicated(self):
+    first = get_logger("TestLog")
+    second = get_logger("TestLog")
+    self.assertIs(first, second)
+    self.assertEqual(first.handlers.count(log.QUEUE_HANDLER), 1)
+
+  def test_restart_does_not_add_exit_hooks(self):
+    import atexit
+    import multiprocessing.util
+    get_logger("TestLog").info("start")
+    hooks = (atexit._ncallbacks(), len(multiprocessing.util._finalizer_registry))
+    for _ in range(3):
+      log._stop_listener()
+      get_logger("TestLog").info("restart")
+    self.assertEqual((atexit._ncallbacks(), len(multiprocessing.util._finalizer_registry)), hooks)
+
+  def test_background_writer(self):
+    logger = get_logger("TestLog")
+    for i in range(100):
+      logger.info(f"line {i}")
+    log._stop_listener()
+    lines = (self.path / "test.log").read_text().splitlines()
+    self.assertEqual(len(lines), 100)
+    self.assertTrue(lines[-1].endswith("line 99"))
+
+  def test_subsystem_level(self):
+    Config.LOG_LEVELS["TestLevel"] = "WARNING"
+    try:
+      self.assertEqual(get_logger("TestLevel.tiles").level, logging.WARNING)
+      set_level("TestLevel.tiles", "DEBUG")
+      self.assertEqual(get_logger("TestLevel.tiles").level, logging.DEBUG)
+    finally:
+      del Config.LOG_LEVELS["TestLevel"]
+
+  def test_rate_limit(self):
+    limit = RateLimitFilter(rate=2, burst=2)
+    passed = [limit.filter(make_record()) for _ in range(10)]
+    self.assertEqual(sum(passed), 2)
+    time.sleep(0.6)
+    record = make_record()
+    self.assertTrue(limit.filter(record))
+    self.assertIn("8 similar messages suppressed", record.getMessage())
+    self.assertTrue(all(limit.filter(make_record(logging.ERROR)) for _ in range(10)))
+
+  def test_sample(self):
+    sample = SampleFilter(every=10)
+    self.assertEqual(sum(sample.filter(make_record()) for _ in range(100)), 10)
+    self.assertTrue(sample.filter(make_record(logging.WARNING)))
+
+
+if __name__ == '__main__':
+  unittest.main()
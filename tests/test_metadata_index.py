@@ -0,0 +1,79 @@
+import os
+import sys
+import unittest
+import pandas as pd
+import shapely
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from bounds import Bounds
+from metadata_index import MetadataIndex, to_catalog, from_catalog, get_shared_index
+
+
+class TestMetadataIndex(unittest.TestCase):
+
+  def setUp(self):
+    self.metadata = pd.read_csv('../assets/usgs_3dep_metadata.csv')
+    self.index = MetadataIndex(self.metadata)
+    # IA_FullState in EPSG:3857
+    self.bounds = Bounds(-10436887, -10435905, 5148019, 5148529)
+
+  def test_contains_matches_scan(self):
+    md = self.metadata
+    expected = md.loc[(md['xmin'] <= self.bounds.xmin) & (md['xmax'] >= self.bounds.xmax)
+                      & (md['ymin'] <= self.bounds.ymin) & (md['ymax'] >= self.bounds.ymax)]
+    result = self.index.contains(self.bounds)
+    self.assertListEqual(list(result['filename']), list(expected['filename']))
+    self.assertIn('IA_FullState', list(result['filename']))
+
+  def test_intersects_includes_partial_overlap(self):
+    row = self.metadata.iloc[0]
+    bounds = Bounds(row['xmax'] - 10, row['xmax'] + 10, row['ymin'], row['ymin'] + 10)
+    self.assertNotIn(row['filename'], list(self.index.contains(bounds)['filename']))
+    self.assertIn(row['filename'], list(self.index.intersects(bounds)['filename']))
+
+  def test_contains_boundary_on_edge(self):
+    row = self.metadata.iloc[0]
+    edge = Bounds(row['xmin'], row['xmin'] + 10, row['ymin'], row['ymin'] + 10)
+    line = Bounds(row['xmin'], row['xmin'], row['ymin'], row['ymin'] + 10)
+    point = Bounds(row['xmax'], row['xmax'], row['ymax'], row['ymax'])
+    for bounds in (edge, line, point):
+      self.assertIn(row['filename'], list(self.index.contains(bounds)['filename']))
+
+  def test_nearest(self):
+    row = self.metadata.iloc[0]
+    bounds = Bounds(row['xmin'] - 110, row['xmin'] - 100, row['ymin'], row['ymin'] + 10)
+    result = self.index.nearest(bounds)
+    self.assertIn(row['filename'], list(result['filename']))
+    self.assertTrue((result['distance'] > 0).all())
+
+  def test_query_bulk(self):
+    b = self.bounds
+    geometries = [shapely.box(b.xmin, b.ymin, b.xmax, b.ymax), shapely.box(0, 0, 1, 1)]
+    result = self.index.query_bulk(geometries, predicate="contains")
+    self.assertListEqual(sorted(set(result['input_index'])), [0])
+    self.assertListEqual(list(result['filename']), list(self.index.contains(b)['filename']))
+
+  def test_unknown_predicate(self):
+    with self.assertRaises(ValueError):
+      self.index.query(self.bounds, "touches")
+
+
+class TestCatalog(unittest.TestCase):
+
+  def test_round_trip(self):
+    metadata = pd.read_csv('../assets/usgs_3dep_metadata.csv')
+    catalog = to_catalog(metadata)
+    self.assertEqual(catalog.dtype.names, tuple(metadata.columns))
+    result = from_catalog(catalog)
+    self.assertListEqual(list(result['filename']), list(metadata['filename']))
+    pd.testing.assert_frame_equal(result.drop(columns=['filename', 'region']),
+                                  metadata.drop(columns=['filename', 'region']))
+
+  def test_shared_index(self):
+    index = get_shared_index()
+    self.assertIs(index, get_shared_index())
+    self.assertIn('IA_FullState', list(index.metadata['filename']))
+
+
+if __name__ == '__main__':
+  unittest.main()
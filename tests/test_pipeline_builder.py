@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from pipeline_builder import PipelineBuilder, PROFILES
+
+
+class TestPipelineBuilder(unittest.TestCase):
+
+  def setUp(self):
+    with open("../assets/usgs_3dep_pipeline.json", 'r') as f:
+      self.template = json.load(f)
+    self.builder = PipelineBuilder(self.template)
+
+  def get_types(self, pipeline: dict) -> list:
+    return [(stage['tag'], stage['type']) for stage in pipeline['pipeline']]
+
+  def assertChained(self, pipeline: dict):
+    stages = pipeline['pipeline']
+    self.assertNotIn('inputs', stages[0])
+    for previous, stage in zip(stages, stages[1:]):
+      self.assertListEqual(stage['inputs'], [previous['tag']])
+
+  def test_raw(self):
+    pipeline = self.builder.build("raw")
+    self.assertListEqual(self.get_types(pipeline), [("read_data", "readers.ept"), ("crop", "filters.crop"),
+                                                    ("reprojection", "filters.reprojection")])
+    # the template feeds reprojection from classify, the profile rewires it to crop
+    self.assertListEqual(pipeline['pipeline'][2]['inputs'], ["crop"])
+    self.assertChained(pipeline)
+
+  def test_ground(self):
+    pipeline = self.builder.build("ground")
+    self.assertListEqual(self.get_types(pipeline), [
+        ("read_data", "readers.ept"), ("crop", "filters.crop"), ("no_noise", "filters.range"),
+        ("wipe_classes", "filters.assign"), ("groundify", "filters.smrf"), ("classify", "filters.range"),
+        ("reprojection", "filters.reprojection")])
+    self.assertChained(pipeline)
+
+  def test_dtm(self):
+    pipeline = self.builder.build("dtm")
+    self.assertListEqual([tag for tag, _ in self.get_types(pipeline)], PROFILES["ground"] + ["writers_gdal"])
+    # the template feeds the raster writer from writers_las, which is not part of this profile
+    self.assertListEqual(pipeline['pipeline'][-1]['inputs'], ["reprojection"])
+    self.assertChained(pipeline)
+
+  def test_default(self):
+    pipeline = self.builder.build()
+    self.assertListEqual([tag for tag, _ in self.get_types(pipeline)], PROFILES["ground"] + ["writers_las", "writers_gdal"])
+    self.assertEqual(pipeline['pipeline'][-1]['output_type'], "idw")
+    self.assertChained(pipeline)
+
+  def test_every_profile_in_memory(self):
+    for name in PROFILES:
+      pipeline = self.builder.build(name, in_memory=True)
+      self.assertTrue(all(not t.startswith("writers.") for _, t in self.get_types(pipeline)), name)
+      self.assertListEqual([tag for tag, _ in self.get_types(pipeline)],
+                           [tag for tag in PROFILES[name] if not tag.startswith("writers_")])
+      self.assertChained(pipeline)
+
+  def test_options(self):
+    pipeline = self.builder.build("raw", options={'crop': {'polygon': "POLYGON((0 0, 1 0, 1 1, 0 0))"},
+                                                  'writers_las': {'filename': "ignored.laz"}})
+    self.assertEqual(pipeline['pipeline'][1]['polygon'], "POLYGON((0 0, 1 0, 1 1, 0 0))")
+    # building never changes the template
+    self.assertEqual(self.builder.stages['crop']['polygon'], "")
+    self.assertListEqual(self.builder.build(["read_data", "reprojection"])['pipeline'][1]['inputs'], ["read_data"])
+
+  def test_unknown_profile(self):
+    with self.assertRaises(ValueError):
+      self.builder.build("dsm")
+    with self.assertRaises(ValueError):
+      self.builder.build(["read_data", "thin"])
+
+
+if __name__ == '__main__':
+  unittest.main()
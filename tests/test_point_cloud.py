@@ -0,0 +1,44 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from point_cloud import PointCloud
+
+
+class TestPointCloud(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.default_rng(27)
+    self.xyz = np.column_stack((rng.random(1000) * 100 + 500000,
+                                rng.random(1000) * 100 + 4600000,
+                                rng.random(1000) * 10))
+    self.cloud = PointCloud.from_xyz(self.xyz, 26915, {'Intensity': np.arange(1000, dtype=np.uint16)})
+
+  def test_bounds(self):
+    self.assertEqual(self.cloud.bounds.xmin, self.xyz[:, 0].min())
+    self.assertEqual(self.cloud.bounds.ymax, self.xyz[:, 1].max())
+
+  def test_quantize(self):
+    quantized = self.cloud.quantize()
+    self.assertEqual(quantized.points['X'].dtype, np.int32)
+    self.assertLess(quantized.nbytes, self.cloud.nbytes)
+    self.assertTrue(np.allclose(quantized.xyz(), self.xyz, atol=0.005))
+
+  def test_geodataframe_round_trip(self):
+    df = self.cloud.to_geodataframe()
+    self.assertListEqual(list(df.columns), ['elevation', 'Intensity', 'geometry'])
+    self.assertEqual(df.crs.to_epsg(), 26915)
+    cloud = PointCloud.from_geodataframe(df)
+    self.assertTrue(np.allclose(cloud.xyz(), self.xyz))
+    self.assertListEqual(cloud.dimensions, self.cloud.dimensions)
+
+  def test_concat_and_select(self):
+    cloud = PointCloud.concat([self.cloud[:400], self.cloud[400:]])
+    self.assertTrue(np.array_equal(cloud.points, self.cloud.points))
+    self.assertEqual(len(self.cloud[self.cloud.z > 5]), (self.xyz[:, 2] > 5).sum())
+
+
+if __name__ == '__main__':
+  unittest.main()
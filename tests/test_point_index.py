@@ -0,0 +1,68 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from point_cloud import PointCloud
+from point_index import PointIndex
+from sub_sampler import SubSampler
+
+
+class TestPointIndex(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.default_rng(27)
+    self.points = np.column_stack((rng.random(3000) * 50, rng.random(3000) * 50, rng.random(3000) * 5))
+    # isolated noise far above the surface
+    self.noise = np.array([[10, 10, 60], [40, 20, -50], [25, 45, 90]], dtype=float)
+    self.cloud = np.vstack((self.points, self.noise))
+    self.index = PointIndex(self.cloud)
+    self.distances = np.linalg.norm(self.cloud[:200, None] - self.cloud[None], axis=2)
+
+  def test_knn(self):
+    distances, indices = self.index.knn(5, batch_size=64)
+    expected = np.sort(self.distances, axis=1)[:, 1:6]
+    self.assertTrue(np.allclose(distances[:200], expected))
+    self.assertFalse((indices[:200] == np.arange(200)[:, None]).any())
+
+  def test_knn_queries(self):
+    queries = np.array([[0, 0, 0], [25, 25, 2.5]])
+    distances, indices = self.index.knn(3, queries)
+    expected = np.sort(np.linalg.norm(self.cloud - queries[1], axis=1))[:3]
+    self.assertTrue(np.allclose(distances[1], expected))
+    self.assertEqual(indices.shape, (2, 3))
+
+  def test_radius(self):
+    neighbors = self.index.radius(2.0, batch_size=64)
+    counts = self.index.radius_count(2.0, batch_size=64)
+    expected = (self.distances <= 2.0).sum(axis=1) - 1
+    self.assertListEqual([len(n) for n in neighbors[:200]], list(expected))
+    self.assertTrue(np.array_equal(counts[:200], expected))
+    expected = np.flatnonzero(self.distances[7] <= 2.0)
+    self.assertTrue(np.array_equal(np.sort(neighbors[7]), expected[expected != 7]))
+
+  def test_density(self):
+    density = self.index.density(k=8)
+    self.assertTrue((density[-3:] < density[:-3].min()).all())
+
+  def test_outliers(self):
+    statistical = self.index.statistical_outliers(mean_k=8, multiplier=2.0)
+    self.assertTrue(statistical[-3:].all())
+    radius = self.index.radius_outliers(radius=5.0, min_k=2)
+    self.assertTrue(radius[-3:].all())
+    self.assertFalse(radius[:-3].any())
+
+  def test_sub_sampler_filters(self):
+    cloud = PointCloud.from_xyz(self.cloud, 26915, {"Intensity": np.arange(len(self.cloud))})
+    sampler = SubSampler(26915, 26915, cloud)
+    filtered = sampler.remove_radius_outliers(radius=5.0, min_k=2)
+    self.assertEqual(len(filtered), len(self.points))
+    self.assertIn("Intensity", filtered.dimensions)
+    self.assertIs(sampler.get_index(), cloud.get_index())
+    filtered = sampler.remove_statistical_outliers()
+    self.assertLessEqual(filtered.z.max(), 5)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,96 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import laspy
+import numpy as np
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from bounds import Bounds
+from config import Config
+from file_handler import FileHandler
+from point_reader import PointReader, ChunkBoundsIndex
+
+
+class TestPointReader(unittest.TestCase):
+
+  def setUp(self):
+    self.path = Path(tempfile.mkdtemp())
+    rng = np.random.default_rng(27)
+    n = 23456
+    header = laspy.LasHeader(point_format=3, version="1.2")
+    header.scales = np.array([0.01, 0.01, 0.01])
+    header.offsets = np.array([500000, 4600000, 0])
+    las = laspy.LasData(header)
+    # sorted along x like a spatially ordered pipeline output, so chunks cover distinct areas
+    las.x = np.sort(rng.random(n) * 100) + 500000
+    las.y = rng.random(n) * 100 + 4600000
+    las.z = rng.random(n) * 20
+    las.intensity = rng.integers(0, 1000, n)
+    las.classification = rng.integers(0, 3, n)
+    las.write(self.path / "tile.laz")
+    las.write(self.path / "tile.las")
+    self.las = laspy.read(self.path / "tile.las")
+    self.bounds = Bounds(500020, 500030.5, 4600010, 4600060)
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def expected(self, stride=1):
+    x, y = self.las.x, self.las.y
+    mask = ((x >= self.bounds.xmin) & (x <= self.bounds.xmax)
+            & (y >= self.bounds.ymin) & (y <= self.bounds.ymax))
+    mask &= np.arange(len(x)) % stride == 0
+    return np.flatnonzero(mask)
+
+  def check(self, points, idx):
+    self.assertTrue(np.allclose(points['X'], self.las.x[idx]))
+    self.assertTrue(np.allclose(points['Y'], self.las.y[idx]))
+    self.assertTrue(np.array_equal(points['Intensity'], self.las.intensity[idx]))
+    self.assertTrue(np.array_equal(points['Classification'], self.las.classification[idx]))
+
+  def test_las_window(self):
+    points = PointReader(self.path / "tile.las").read(self.bounds, ["Intensity", "Classification"], stride=3)
+    self.check(points, self.expected(3))
+
+  def test_laz_window(self):
+    points = PointReader(self.path / "tile.laz").read(self.bounds, ["Intensity", "Classification"],
+                                                      stride=3, chunk_size=1000)
+    self.check(points, self.expected(3))
+
+  def test_laz_index_skips_chunks(self):
+    index = ChunkBoundsIndex.load(self.path / "tile.laz", 1000)
+    self.assertEqual(index.chunks['count'].sum(), len(self.las.x))
+    self.assertLess(len(index.query(self.bounds)), len(index.chunks) / 2)
+    self.assertTrue(ChunkBoundsIndex.get_path(self.path / "tile.laz").exists())
+
+  def test_laz_index_on_shuffled_points(self):
+    # runs of shuffled points all span the whole extent, so nothing is skipped but the window is still right
+    rng = np.random.default_rng(5)
+    shuffled = laspy.LasData(self.las.header)
+    shuffled.points = self.las.points[rng.permutation(len(self.las.points))]
+    shuffled.write(self.path / "shuffled.laz")
+    index = ChunkBoundsIndex.load(self.path / "shuffled.laz", 1000)
+    self.assertEqual(len(index.query(self.bounds)), len(index.chunks))
+    points = PointReader(self.path / "shuffled.laz").read(self.bounds)
+    self.assertEqual(len(points), len(self.expected()))
+
+  def test_whole_file(self):
+    points = PointReader(self.path / "tile.laz").read()
+    self.assertEqual(points.dtype.names, ("X", "Y", "Z"))
+    self.assertTrue(np.allclose(points['Z'], self.las.z))
+
+  def test_file_handler(self):
+    laz_path = Config.LAZ_PATH
+    Config.LAZ_PATH = self.path
+    try:
+      points = FileHandler().read_point_window("tile", self.bounds, ["Intensity", "Classification"])
+    finally:
+      Config.LAZ_PATH = laz_path
+    self.check(points, self.expected())
+
+
+if __name__ == '__main__':
+  unittest.main()
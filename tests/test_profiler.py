@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import pickle
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from pathlib import Path
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+import fetch_lidar
+from bounds import Bounds
+from fetch_lidar import FetchLidar
+from profiler import PipelineProfiler, JsonLinesWriter, PrometheusTextfileWriter, measure_stage
+
+
+class FakePipeline:
+  """ Stands in for pdal.Pipeline: readers return ten points, filters drop the first point.
+  """
+  runs = []
+
+  def __init__(self, definition, arrays=None):
+    self.stage = json.loads(definition)['pipeline'][0]
+    self.inputs = arrays
+    FakePipeline.runs.append(self)
+
+  def execute(self):
+    if self.inputs is None:
+      self.arrays = [np.zeros(10, dtype=[("X", float), ("Y", float), ("Z", float)])]
+    elif self.stage['type'].startswith("filters."):
+      self.arrays = [a[1:] for a in self.inputs]
+    else:
+      self.arrays = self.inputs
+
+
+class MetadataPipeline:
+  """ Stands in for pdal.Pipeline running a whole pipeline, only the reader reports a point count.
+  """
+
+  def __init__(self, definition):
+    self.definition = json.loads(definition)
+
+  def execute(self):
+    if "fail" in json.dumps(self.definition):
+      raise RuntimeError("reader failed")
+    self.arrays = [np.zeros(10, dtype=[("X", float), ("Y", float), ("Z", float)])]
+    self.metadata = json.dumps({'metadata': {'readers.ept': {'count': 10}, 'filters.crop': {}}})
+
+
+class TestPipelineProfiler(unittest.TestCase):
+
+  def setUp(self):
+    self.path = Path(tempfile.mkdtemp())
+    self.records = []
+    self.profiler = PipelineProfiler([self.records.append])
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def fetch(self, profiler):
+    record = profiler.start("IA_FullState", "bound", "default")
+    with record.stage("read_data", "readers.ept") as stage:
+      stage['points_out'] = 100
+    with record.stage("crop", "filters.crop", 100) as stage:
+      stage['points_out'] = 60
+    profiler.finish(record, 60)
+    return record
+
+  def test_record(self):
+    self.fetch(self.profiler)
+    self.assertEqual(len(self.records), 1)
+    record = self.records[0]
+    self.assertEqual([s['tag'] for s in record['stages']], ["read_data", "crop"])
+    self.assertEqual(record['stages'][1]['points_in'], 100)
+    self.assertEqual(record['stages'][1]['points_out'], 60)
+    self.assertGreaterEqual(record['seconds'], sum(s['seconds'] for s in record['stages']))
+    self.assertGreater(record['process_peak_rss'], 0)
+    self.assertGreaterEqual(record['peak_rss_increase'], 0)
+    self.assertFalse(self.profiler.per_stage)
+
+  def test_failing_hook_is_ignored(self):
+    def fail(record):
+      raise ValueError("hook failed")
+    self.profiler.hooks.insert(0, fail)
+    self.fetch(self.profiler)
+    self.assertEqual(len(self.records), 1)
+
+  def test_measure_stage_without_record(self):
+    with measure_stage(None, "crop") as stage:
+      stage['points_out'] = 1
+
+  def test_json_lines(self):
+    profiler = PipelineProfiler([JsonLinesWriter(self.path / "fetch.jsonl")])
+    profiler = pickle.loads(pickle.dumps(profiler))
+    self.fetch(profiler)
+    self.fetch(profiler)
+    with open(self.path / "fetch.jsonl", 'r') as f:
+      lines = [json.loads(line) for line in f]
+    self.assertEqual(len(lines), 2)
+    self.assertEqual(lines[0]['points'], 60)
+
+  def test_prometheus_textfile(self):
+    profiler = PipelineProfiler([PrometheusTextfileWriter(self.path / "fetch.prom")])
+    self.fetch(profiler)
+    self.fetch(profiler)
+    text = (self.path / "fetch.prom").read_text()
+    self.assertIn('pythonlidar_fetches_total{region="IA_FullState",cached="0"} 2', text)
+    self.assertIn('pythonlidar_stage_points_total{stage="crop",direction="in"} 200', text)
+    self.assertIn('pythonlidar_fetch_duration_seconds_bucket{le="+Inf"} 2', text)
+    self.assertIn('pythonlidar_fetch_duration_seconds_count 2', text)
+
+  def test_failed_fetch_is_exported(self):
+    profiler = PipelineProfiler([PrometheusTextfileWriter(self.path / "fetch.prom"), self.records.append])
+    record = profiler.start("IA_FullState", "bound", "default")
+    profiler.finish(record, 0, error="RuntimeError: reader failed")
+    self.assertEqual(self.records[0]['error'], "RuntimeError: reader failed")
+    text = (self.path / "fetch.prom").read_text()
+    self.assertIn('pythonlidar_fetch_failures_total{region="IA_FullState"} 1', text)
+
+
+class TestExecutePipeline(unittest.TestCase):
+
+  def setUp(self):
+    patch = mock.patch.object(fetch_lidar, "pdal", mock.Mock(Pipeline=MetadataPipeline))
+    patch.start()
+    self.addCleanup(patch.stop)
+    self.records = []
+    self.fetcher = FetchLidar(epsg=26915, as_point_cloud=True, profiler=PipelineProfiler([self.records.append]))
+
+  def test_stages_from_metadata(self):
+    self.fetcher.get_dep(Bounds(0, 1, 0, 1), "POLYGON((0 0, 1 0, 1 1, 0 0))", "IA_FullState")
+    stages = self.records[0]['stages']
+    self.assertEqual(stages[0]['tag'], "pipeline")
+    self.assertEqual(stages[0]['points_out'], 10)
+    pipe = self.fetcher.get_pipeline_definition("([0, 1], [0, 1])", "POLYGON((0 0, 1 0, 1 1, 0 0))",
+                                                "IA_FullState", "tile")
+    self.assertListEqual([s['type'] for s in stages[1:-1]], [s['type'] for s in pipe['pipeline']])
+    self.assertEqual(stages[1]['points_out'], 10)
+    self.assertEqual(stages[2]['points_in'], 10)
+    self.assertIsNone(stages[2]['points_out'])
+    self.assertIsNone(self.records[0]['error'])
+
+  def test_failed_fetch(self):
+    self.assertIsNone(self.fetcher.get_dep(Bounds(0, 1, 0, 1), "POLYGON((0 0, 1 0, 1 1, 0 0))", "fail"))
+    self.assertEqual(len(self.records), 1)
+    self.assertEqual(self.records[0]['points'], 0)
+    self.assertEqual(self.records[0]['error'], "RuntimeError: reader failed")
+
+
+class TestExecuteStages(unittest.TestCase):
+
+  def setUp(self):
+    FakePipeline.runs = []
+    patch = mock.patch.object(fetch_lidar, "pdal", mock.Mock(Pipeline=FakePipeline))
+    patch.start()
+    self.addCleanup(patch.stop)
+    self.records = []
+    self.fetcher = FetchLidar(epsg=26915, as_point_cloud=True,
+                              profiler=PipelineProfiler([self.records.append], per_stage=True))
+
+  def test_stages(self):
+    pipe = self.fetcher.get_pipeline_definition("([0, 1], [0, 1])", "POLYGON((0 0, 1 0, 1 1, 0 0))",
+                                                "IA_FullState", "tile")
+    record = self.fetcher.profiler.start("IA_FullState", "tile", "default")
+    arrays = self.fetcher._execute_stages(pipe, record)
+    types = [stage['type'] for stage in pipe['pipeline']]
+    self.assertListEqual([run.stage['type'] for run in FakePipeline.runs], types)
+    self.assertListEqual([stage['type'] for stage in record.stages], types)
+    self.assertTrue(all('inputs' not in run.stage for run in FakePipeline.runs))
+    filters = sum(t.startswith("filters.") for t in types)
+    self.assertEqual(len(arrays[0]), 10 - filters)
+    self.assertEqual(record.stages[-1]['points_out'], 10 - filters)
+    for run in FakePipeline.runs:
+      if run.stage['type'] == "writers.las":
+        self.assertEqual(run.stage['a_srs'], "EPSG:26915")
+      if run.stage['type'] == "writers.gdal":
+        self.assertEqual(run.stage['override_srs'], "EPSG:26915")
+
+  def test_get_dep_per_stage(self):
+    cloud = self.fetcher.get_dep(Bounds(0, 1, 0, 1), "POLYGON((0 0, 1 0, 1 1, 0 0))", "IA_FullState")
+    self.assertEqual(len(self.records), 1)
+    self.assertEqual(self.records[0]['points'], len(cloud))
+    self.assertGreater(len(FakePipeline.runs), 1)
+    self.assertEqual(self.records[0]['stages'][-1]['tag'], "PointCloud.from_arrays")
+
+
+if __name__ == '__main__':
+  unittest.main()
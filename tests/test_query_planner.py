@@ -0,0 +1,112 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import shapely
+import numpy as np
+from pathlib import Path
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from bounds import Bounds
+from config import Config
+from fetch_lidar import FetchLidar
+from query_planner import EptResource, QueryPlanner
+from ept_fixture import make_ept_fixture
+
+
+class TestQueryPlanner(unittest.TestCase):
+
+  def setUp(self):
+    self.path = Path(tempfile.mkdtemp())
+    self.url = str(self.path) + "/"
+    self.ept = make_ept_fixture(self.path / "IA_Fixture", n=100_000, write_data=False)
+    with open(self.path / "IA_Fixture" / "ept-hierarchy" / "0-0-0-0.json") as f:
+      self.hierarchy = json.load(f)
+    self.bounds = Bounds(-10436900, -10435900, 5148000, 5149000)
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def test_whole_resource(self):
+    estimate = QueryPlanner(url=self.url).estimate("IA_Fixture", self.bounds)
+    self.assertEqual(estimate['points'], 100_000)
+    self.assertEqual(estimate['read_points'], 100_000)
+    self.assertEqual(estimate['nodes'], sum(1 for c in self.hierarchy.values() if c > 0))
+    self.assertEqual(estimate['bytes'], 100_000 * EptResource("IA_Fixture", self.url).point_size)
+
+  def test_window_estimate(self):
+    window = Bounds(-10436900, -10436400, 5148000, 5148500)
+    estimate = QueryPlanner(url=self.url).estimate("IA_Fixture", window)
+    self.assertAlmostEqual(estimate['points'] / 25_000, 1, delta=0.05)
+    self.assertLess(estimate['read_points'], 100_000)
+    half = QueryPlanner(url=self.url).estimate("IA_Fixture", window, area=500 * 500 / 2)
+    self.assertAlmostEqual(half['points'] / estimate['points'], 0.5, delta=0.01)
+
+  def test_resolution_selects_depths(self):
+    planner = QueryPlanner(url=self.url)
+    spacing = planner.get_resource("IA_Fixture").get_spacing(1)
+    estimate = planner.estimate("IA_Fixture", self.bounds, resolution=spacing)
+    coarse = sum(c for key, c in self.hierarchy.items() if key[0] in "01")
+    self.assertEqual(estimate['points'], coarse)
+    self.assertEqual(len(estimate['points_per_depth']), 2)
+
+  def test_hierarchy_pages(self):
+    # move the subtree of a depth 1 node into a page of its own, as large resources do
+    page_key = next(k for k in self.hierarchy if k.startswith("1-"))
+    d, x, y, z = map(int, page_key.split("-"))
+    page = {k: c for k, c in self.hierarchy.items()
+            if k == page_key or (k.startswith("2-") and [v // 2 for v in map(int, k.split("-")[1:])] == [x, y, z])}
+    root = {k: c for k, c in self.hierarchy.items() if k not in page}
+    root[page_key] = -1
+    hierarchy_path = self.path / "IA_Fixture" / "ept-hierarchy"
+    with open(hierarchy_path / "0-0-0-0.json", 'w') as f:
+      json.dump(root, f)
+    with open(hierarchy_path / f"{page_key}.json", 'w') as f:
+      json.dump(page, f)
+    estimate = QueryPlanner(url=self.url).estimate("IA_Fixture", self.bounds)
+    self.assertEqual(estimate['points'], 100_000)
+
+  def test_plan_actions(self):
+    self.assertEqual(QueryPlanner(url=self.url).plan("IA_Fixture", self.bounds)['action'], "fetch")
+    tiled = QueryPlanner(point_budget=10_000, url=self.url).plan("IA_Fixture", self.bounds)
+    self.assertEqual(tiled['action'], "tile")
+    self.assertAlmostEqual(tiled['tile_size'], 1000 * np.sqrt(0.1), delta=1)
+    rejected = QueryPlanner(point_budget=10_000, max_points=50_000, url=self.url).plan("IA_Fixture", self.bounds)
+    self.assertEqual(rejected['action'], "reject")
+    coarse = QueryPlanner(point_budget=30_000, strategy="resolution", url=self.url).plan("IA_Fixture", self.bounds)
+    self.assertEqual(coarse['action'], "resolution")
+    self.assertLessEqual(coarse['points'], 30_000)
+    self.assertEqual(coarse['resolution'], coarse['spacing_per_depth'][1])
+
+  def test_explicit_limits(self):
+    rejected = QueryPlanner(point_budget=10_000, max_points=0, url=self.url).plan("IA_Fixture", self.bounds)
+    self.assertEqual(rejected['action'], "reject")
+    with self.assertRaises(ValueError):
+      QueryPlanner(point_budget=0, url=self.url)
+
+  def test_fetch_planned_reprojects_once(self):
+    fetcher = FetchLidar(epsg=26915)
+    planner = mock.Mock(plan=lambda region, bound, area: {'region': region, 'action': "fetch", 'resolution': None})
+    get_bound = mock.Mock(wraps=fetcher._gdf_helper.get_bound_from_polygon)
+    with mock.patch.object(fetcher._gdf_helper, "get_bound_from_polygon", get_bound), \
+         mock.patch.object(fetcher, "get_dep", return_value="points") as get_dep:
+      fetched = fetcher.fetch_planned(shapely.box(437000, 4641000, 437100, 4641100), ["IA_FullState"],
+                                      planner=planner)
+    self.assertEqual(get_bound.call_count, 1)
+    self.assertListEqual([f['geo_data'] for f in fetched], ["points"])
+    self.assertEqual(get_dep.call_args.args[2], "IA_FullState")
+
+  def test_default_url(self):
+    url = Config.USGS_3DEP_PUBLIC_DATA_PATH
+    Config.USGS_3DEP_PUBLIC_DATA_PATH = self.url
+    try:
+      self.assertEqual(QueryPlanner().estimate("IA_Fixture", self.bounds)['points'], 100_000)
+    finally:
+      Config.USGS_3DEP_PUBLIC_DATA_PATH = url
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,129 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import laspy
+import numpy as np
+from pathlib import Path
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor, wait
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from bounds import Bounds
+from config import Config
+from point_cloud import PointCloud
+import rasterizer as rasterizer_module
+from rasterizer import Rasterizer, RasterAccumulator
+
+
+class TestRasterizer(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.default_rng(27)
+    n = 5000
+    self.xyz = np.column_stack((rng.random(n) * 20 + 500000, rng.random(n) * 10 + 4600000, rng.random(n) * 30))
+    self.bounds = Bounds(500000, 500020, 4600000, 4600010)
+    self.rasterizer = Rasterizer(resolution=2)
+
+  def brute_force(self, reducer):
+    x, y, z = self.xyz.T
+    expected = np.full((5, 10), np.nan)
+    for row in range(5):
+      for column in range(10):
+        inside = ((x >= 500000 + column * 2) & (x < 500002 + column * 2)
+                  & (y <= 4600010 - row * 2) & (y > 4600008 - row * 2))
+        if inside.any():
+          expected[row, column] = {"min": np.min, "max": np.max, "mean": np.mean}[reducer](z[inside])
+    return expected
+
+  def test_reducers(self):
+    for reducer in ("min", "max", "mean"):
+      raster = self.rasterizer.rasterize(self.xyz, reducer, self.bounds)
+      self.assertEqual(raster.shape, (5, 10))
+      self.assertTrue(np.allclose(raster.data, self.brute_force(reducer), equal_nan=True))
+    count = self.rasterizer.rasterize(self.xyz, "count", self.bounds)
+    self.assertEqual(count.data.sum(), len(self.xyz))
+
+  def test_idw(self):
+    raster = self.rasterizer.rasterize(self.xyz, "idw", self.bounds)
+    x, y, z = self.xyz.T
+    center_x, center_y = 500000 + 3 * 2 + 1, 4600010 - 2 * 2 - 1
+    distance = np.hypot(x - center_x, y - center_y)
+    near = distance <= 2 * np.sqrt(2)
+    weight = 1 / distance[near] ** 2
+    self.assertAlmostEqual(raster.data[2, 3], (weight * z[near]).sum() / weight.sum())
+    self.assertTrue((raster.data >= 0).all() and (raster.data <= 30).all())
+
+  def test_empty_cells(self):
+    raster = Rasterizer(resolution=1, nodata=-9999).rasterize(self.xyz[:3], "max", self.bounds)
+    self.assertEqual((raster.data != -9999).sum(), len(np.unique(np.floor(self.xyz[:3, :2]), axis=0)))
+    self.assertEqual(raster.transform, (500000, 1, 0.0, 4600010, 0.0, -1))
+
+  def test_point_cloud_input(self):
+    cloud = PointCloud.from_xyz(self.xyz, epsg=26915)
+    raster = self.rasterizer.rasterize(cloud, "mean", self.bounds)
+    self.assertEqual(raster.epsg, 26915)
+    self.assertTrue(np.allclose(raster.data, self.brute_force("mean"), equal_nan=True))
+
+  def test_chunks_match_in_memory(self):
+    chunks = np.array_split(self.xyz, 7)
+    for reducer in ("min", "mean", "idw"):
+      expected = self.rasterizer.rasterize(self.xyz, reducer, self.bounds)
+      raster = self.rasterizer.rasterize_chunks(chunks, self.bounds, reducer)
+      self.assertTrue(np.allclose(raster.data, expected.data, equal_nan=True))
+
+  def test_merge(self):
+    first = RasterAccumulator(self.bounds, 2)
+    second = RasterAccumulator(self.bounds, 2)
+    first.add(self.xyz[:2000])
+    second.add(self.xyz[2000:])
+    first.merge(second)
+    self.assertTrue(np.allclose(first.result("max").data, self.brute_force("max"), equal_nan=True))
+
+  def test_tiled_matches_serial(self):
+    rasterizer = Rasterizer(resolution=0.5)
+    for reducer in ("count", "max", "idw"):
+      expected = rasterizer.rasterize(self.xyz, reducer, self.bounds)
+      raster = rasterizer.rasterize_tiled(self.xyz, reducer, self.bounds, tile_size=7, workers=2)
+      self.assertTrue(np.allclose(raster.data, expected.data, equal_nan=True))
+
+  def test_tiled_bounds_pending_tiles(self):
+    pending = []
+    def record_wait(futures, return_when):
+      pending.append(len(futures))
+      return wait(futures, return_when=return_when)
+    rasterizer = Rasterizer(resolution=0.5)
+    expected = rasterizer.rasterize(self.xyz, "mean", self.bounds)
+    with mock.patch.object(rasterizer_module, "ProcessPoolExecutor", ThreadPoolExecutor), \
+         mock.patch.object(rasterizer_module, "wait", record_wait):
+      raster = rasterizer.rasterize_tiled(self.xyz, "mean", self.bounds, tile_size=5, workers=3)
+    self.assertTrue(np.allclose(raster.data, expected.data, equal_nan=True))
+    self.assertGreater(len(pending), 3)
+    self.assertLessEqual(max(pending), 3)
+
+  def test_rasterize_file(self):
+    path = Path(tempfile.mkdtemp())
+    laz_path = Config.LAZ_PATH
+    try:
+      header = laspy.LasHeader(point_format=3, version="1.2")
+      header.scales = np.array([0.01, 0.01, 0.01])
+      header.offsets = np.array([500000, 4600000, 0])
+      las = laspy.LasData(header)
+      las.x, las.y, las.z = self.xyz.T
+      las.write(path / "tile.laz")
+      Config.LAZ_PATH = path
+      raster = self.rasterizer.rasterize_file("tile", "max", chunk_size=1000)
+    finally:
+      Config.LAZ_PATH = laz_path
+      shutil.rmtree(path)
+    expected = self.rasterizer.rasterize(np.column_stack((las.x, las.y, las.z)), "max")
+    self.assertTrue(np.allclose(raster.data, expected.data, equal_nan=True))
+
+  def test_unknown_reducer(self):
+    with self.assertRaises(ValueError):
+      self.rasterizer.rasterize(self.xyz, "median")
+
+
+if __name__ == '__main__':
+  unittest.main()
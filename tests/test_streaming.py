@@ -0,0 +1,132 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import laspy
+import numpy as np
+from pathlib import Path
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+import fetch_lidar
+from bounds import Bounds
+from fetch_lidar import FetchLidar
+from tile_cache import TileCache
+from config import Config
+from file_handler import FileHandler
+from point_cloud import PointCloud
+from rasterizer import Rasterizer
+from sub_sampler import SubSampler, ChunkSubSampler, StreamingSubSampler
+
+
+class TestStreaming(unittest.TestCase):
+
+  def setUp(self):
+    self.path = Path(tempfile.mkdtemp())
+    self.laz_path = Config.LAZ_PATH
+    Config.LAZ_PATH = self.path
+    rng = np.random.default_rng(27)
+    n = 12345
+    self.xyz = np.round(np.column_stack((rng.random(n) * 100 + 500000,
+                                         rng.random(n) * 100 + 4600000,
+                                         rng.random(n) * 20)), 2)
+    self.intensity = rng.integers(0, 1000, n).astype(np.uint16)
+    cloud = PointCloud.from_xyz(self.xyz, 26915, {"Intensity": self.intensity})
+    self.chunks = [cloud[start:start + 1000] for start in range(0, n, 1000)]
+
+  def tearDown(self):
+    Config.LAZ_PATH = self.laz_path
+    shutil.rmtree(self.path)
+
+  def test_write_point_chunks(self):
+    written = FileHandler().write_point_chunks(iter(self.chunks), "stream")
+    self.assertEqual(written, len(self.xyz))
+    las = laspy.read(self.path / "stream.laz")
+    self.assertTrue(np.allclose(np.column_stack((las.x, las.y, las.z)), self.xyz))
+    self.assertTrue(np.array_equal(las.intensity, self.intensity))
+    self.assertEqual(las.header.parse_crs().to_epsg(), 26915)
+    self.assertTrue(np.allclose(las.header.mins, self.xyz.min(axis=0)))
+
+  def test_chunk_sub_sampler_matches_in_memory(self):
+    sampler = SubSampler(26915, 26915, PointCloud.from_xyz(self.xyz, 26915))
+    streamed = ChunkSubSampler(iter(self.chunks), 26915, self.xyz.min(axis=0), self.xyz.max(axis=0))
+    self.assertTrue(np.allclose(streamed.grid_barycenter(5).xyz(), sampler.grid_barycenter(5).xyz()))
+    streamed = ChunkSubSampler(iter(self.chunks), 26915, self.xyz.min(axis=0), self.xyz.max(axis=0))
+    self.assertTrue(np.array_equal(streamed.decimation(7).xyz(), self.xyz[::7]))
+
+  def test_streaming_sub_sampler_rereads_file(self):
+    FileHandler().write_point_chunks(iter(self.chunks), "stream")
+    sampler = StreamingSubSampler("stream", chunk_size=999)
+    self.assertEqual(sampler.epsg, 26915)
+    self.assertEqual(len(sampler.decimation(1)), len(self.xyz))
+    self.assertEqual(len(sampler.decimation(1)), len(self.xyz))
+
+  def test_rasterize_chunks(self):
+    bounds = Bounds(500000, 500100, 4600000, 4600100)
+    rasterizer = Rasterizer(resolution=5)
+    expected = rasterizer.rasterize(self.xyz, "max", bounds)
+    raster = rasterizer.rasterize_chunks(iter(self.chunks), bounds, "max", 26915)
+    self.assertTrue(np.allclose(raster.data, expected.data, equal_nan=True))
+
+
+class StreamingPipeline:
+  """ Stands in for a streamable pdal.Pipeline handing out 2500 points, failing after `fail_after` chunks.
+  """
+  created = 0
+  fail_after = None
+
+  def __init__(self, definition):
+    StreamingPipeline.created += 1
+    self.streamable = True
+
+  def iterator(self, chunk_size):
+    points = np.zeros(2500, dtype=[("X", float), ("Y", float), ("Z", float)])
+    points["Z"] = np.arange(2500)
+    for i, start in enumerate(range(0, len(points), chunk_size)):
+      if i == StreamingPipeline.fail_after:
+        raise RuntimeError("reading the EPT resource failed")
+      yield points[start:start + chunk_size]
+
+
+class TestIterDep(unittest.TestCase):
+
+  def setUp(self):
+    self.path = Path(tempfile.mkdtemp())
+    StreamingPipeline.created = 0
+    StreamingPipeline.fail_after = None
+    patch = mock.patch.object(fetch_lidar, "pdal", mock.Mock(Pipeline=StreamingPipeline))
+    patch.start()
+    self.addCleanup(patch.stop)
+    self.fetcher = FetchLidar(epsg=3857, cache=TileCache(self.path), in_memory=True, profile="raw")
+    self.args = (Bounds(0, 1, 0, 1), "POLYGON((0 0, 1 0, 1 1, 0 0))", "IA_FullState")
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def test_failure_mid_stream_raises(self):
+    StreamingPipeline.fail_after = 2
+    chunks = []
+    with self.assertRaises(RuntimeError):
+      for chunk in self.fetcher.iter_dep(*self.args, chunk_size=1000):
+        chunks.append(chunk)
+    self.assertEqual(len(chunks), 2)
+    self.assertEqual(self.fetcher.cache.stats()['entries'], 0)
+
+  def test_stream_populates_cache(self):
+    streamed = [c.z for c in self.fetcher.iter_dep(*self.args, chunk_size=1000)]
+    self.assertEqual(self.fetcher.cache.stats()['entries'], 1)
+    cached = [c.z for c in self.fetcher.iter_dep(*self.args, chunk_size=1000)]
+    self.assertEqual(StreamingPipeline.created, 1)
+    self.assertTrue(np.array_equal(np.concatenate(cached), np.concatenate(streamed)))
+
+  def test_abandoned_stream_is_not_cached(self):
+    chunks = self.fetcher.iter_dep(*self.args, chunk_size=1000)
+    next(chunks)
+    chunks.close()
+    self.assertEqual(self.fetcher.cache.stats()['entries'], 0)
+    self.assertListEqual(list((self.path / "tmp").iterdir()), [])
+
+
+if __name__ == '__main__':
+  unittest.main()
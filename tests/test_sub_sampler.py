@@ -0,0 +1,148 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import laspy
+import numpy as np
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from config import Config
+from voxel_grid import VoxelGrid, VoxelAccumulator
+from point_cloud import PointCloud
+from sub_sampler import SubSampler, StreamingSubSampler
+
+
+class TestSubSampler(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.default_rng(27)
+    self.points = np.column_stack((rng.random(5000) * 100 + 500000,
+                                   rng.random(5000) * 100 + 4600000,
+                                   rng.random(5000) * 20))
+    self.voxel_size = 5
+    keys, inverse = np.unique(((self.points - self.points.min(axis=0)) // self.voxel_size).astype(int),
+                              axis=0, return_inverse=True)
+    self.keys = keys
+    self.voxels = [np.flatnonzero(inverse.ravel() == v) for v in range(len(keys))]
+    self.sampler = SubSampler(3857, 26915, PointCloud.from_xyz(self.points, 26915))
+
+  def test_voxel_keys_match_unique(self):
+    grid = VoxelGrid(self.points, self.voxel_size)
+    self.assertTrue(np.array_equal(grid.voxel_index, self.keys))
+    self.assertListEqual(list(grid.counts), [len(v) for v in self.voxels])
+
+  def test_grid_barycenter(self):
+    expected = np.array([self.points[v].mean(axis=0) for v in self.voxels])
+    self.assertTrue(np.allclose(self.sampler.grid_barycenter(self.voxel_size).xyz(), expected))
+
+  def test_grid_candidate_center(self):
+    result = self.sampler.grid_candidate_center(self.voxel_size).xyz()
+    for v, point in zip(self.voxels, result):
+      distance = np.linalg.norm(self.points[v] - self.points[v].mean(axis=0), axis=1)
+      self.assertAlmostEqual(np.linalg.norm(point - self.points[v].mean(axis=0)), distance.min())
+
+  def test_grid_reducers(self):
+    min_z = self.sampler.grid_min_z(self.voxel_size).z
+    max_z = self.sampler.grid_max_z(self.voxel_size).z
+    median = self.sampler.grid_median(self.voxel_size).xyz()
+    self.assertTrue(np.array_equal(min_z, [self.points[v, 2].min() for v in self.voxels]))
+    self.assertTrue(np.array_equal(max_z, [self.points[v, 2].max() for v in self.voxels]))
+    self.assertTrue(np.allclose(median, [np.median(self.points[v], axis=0) for v in self.voxels]))
+
+  def test_grid_random(self):
+    first = self.sampler.grid_random(self.voxel_size, seed=1).xyz()
+    self.assertTrue(np.array_equal(first, self.sampler.grid_random(self.voxel_size, seed=1).xyz()))
+    for v, point in zip(self.voxels, first):
+      self.assertTrue((self.points[v] == point).all(axis=1).any())
+
+  def test_decimation(self):
+    self.assertTrue(np.array_equal(self.sampler.decimation(20).xyz(), self.points[::20]))
+
+
+class TestParallelSubSampler(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.default_rng(27)
+    # a clustered cloud, so slabs hold very different numbers of voxels
+    self.points = np.column_stack((rng.gamma(2, 20, 20000) + 500000,
+                                   rng.random(20000) * 100 + 4600000,
+                                   rng.random(20000) * 20))
+    self.min_points = Config.SAMPLER_PARALLEL_MIN_POINTS
+    Config.SAMPLER_PARALLEL_MIN_POINTS = 0
+    cloud = PointCloud.from_xyz(self.points, 26915, {"Intensity": np.arange(20000, dtype=np.uint32)})
+    self.serial = SubSampler(26915, 26915, cloud)
+    self.parallel = SubSampler(26915, 26915, cloud, workers=3)
+
+  def tearDown(self):
+    Config.SAMPLER_PARALLEL_MIN_POINTS = self.min_points
+
+  def test_matches_serial(self):
+    for method in ("grid_barycenter", "grid_candidate_center", "grid_min_z", "grid_max_z", "grid_median"):
+      expected = getattr(self.serial, method)(3)
+      result = getattr(self.parallel, method)(3)
+      self.assertTrue(np.array_equal(result.xyz(), expected.xyz()), method)
+    self.assertTrue(np.array_equal(self.parallel.grid_min_z(3).points["Intensity"],
+                                   self.serial.grid_min_z(3).points["Intensity"]))
+
+  def test_geodataframe_and_random(self):
+    df = self.serial.df.to_geodataframe()
+    serial = SubSampler(26915, 26915, df).grid_max_z(3)
+    parallel = SubSampler(26915, 26915, df, workers=2).grid_max_z(3)
+    self.assertTrue(np.array_equal(parallel.geometry.x, serial.geometry.x))
+    self.assertTrue(np.array_equal(parallel.elevation, serial.elevation))
+    self.assertTrue(np.array_equal(self.parallel.grid_random(3, seed=1).xyz(), self.serial.grid_random(3, seed=1).xyz()))
+
+
+class TestStreamingSubSampler(unittest.TestCase):
+
+  def setUp(self):
+    self.laz_path = Config.LAZ_PATH
+    Config.LAZ_PATH = Path(tempfile.mkdtemp())
+    rng = np.random.default_rng(27)
+    header = laspy.LasHeader(point_format=3, version="1.2")
+    header.scales = np.array([0.01, 0.01, 0.01])
+    header.offsets = np.array([500000, 4600000, 0])
+    las = laspy.LasData(header)
+    las.x = rng.random(10007) * 100 + 500000
+    las.y = rng.random(10007) * 100 + 4600000
+    las.z = rng.random(10007) * 20
+    las.write(Config.LAZ_PATH / "tile.laz")
+    self.points = np.column_stack((las.x, las.y, las.z))
+    self.in_memory = SubSampler(26915, 26915, PointCloud.from_xyz(self.points, 26915))
+    self.streaming = StreamingSubSampler("tile", epsg=26915, chunk_size=1000)
+
+  def tearDown(self):
+    shutil.rmtree(Config.LAZ_PATH)
+    Config.LAZ_PATH = self.laz_path
+
+  def test_decimation(self):
+    expected = self.in_memory.decimation(7).xyz()
+    self.assertTrue(np.array_equal(self.streaming.decimation(7).xyz(), expected))
+
+  def test_grid_barycenter(self):
+    expected = self.in_memory.grid_barycenter(5).xyz()
+    self.assertTrue(np.allclose(self.streaming.grid_barycenter(5).xyz(), expected))
+
+  def test_accumulator_merges_chunks(self):
+    accumulator = VoxelAccumulator(5, self.points.min(axis=0), self.points.max(axis=0))
+    # chunks sorted along x add mostly new voxels, shuffled ones mostly existing voxels
+    order = np.concatenate((np.argsort(self.points[:5000, 0]), 5000 + np.arange(len(self.points) - 5000)))
+    for start in range(0, len(order), 997):
+      accumulator.add(self.points[order[start:start + 997]])
+    grid = VoxelGrid(self.points, 5)
+    self.assertTrue(np.array_equal(accumulator.counts, grid.counts))
+    self.assertTrue(np.allclose(accumulator.barycenter(), grid.barycenter()))
+
+  def test_accumulator_rejects_points_outside_bounds(self):
+    accumulator = VoxelAccumulator(5, self.points.min(axis=0), self.points.max(axis=0))
+    with self.assertRaises(ValueError):
+      accumulator.add(np.vstack((self.points[:10], self.points.min(axis=0) - [1, 0, 0])))
+    with self.assertRaises(ValueError):
+      accumulator.add(np.vstack((self.points[:10], self.points.max(axis=0) + [0, 0, 10])))
+    self.assertEqual(len(accumulator), 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
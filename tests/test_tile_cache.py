@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from pathlib import Path
+from multiprocessing import Pool
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from bounds import Bounds
+from tile_cache import TileCache
+
+
+def put_entry(args):
+  path, key = args
+  cache = TileCache(path)
+  cache.put(key, [np.arange(1000)])
+  return cache.get(key)['arrays'][0].sum()
+
+
+class TestTileCache(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = Path(tempfile.mkdtemp())
+    self.cache = TileCache(self.dir, max_bytes=10 ** 6)
+    self.bounds = Bounds(0, 1, 0, 1)
+    self.arrays = [np.zeros(10, dtype=[('X', 'f8'), ('Y', 'f8'), ('Z', 'f8')])]
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def test_key(self):
+    key = self.cache.get_key("IA_FullState", self.bounds, {'pipeline': [1]}, 26915)
+    self.assertEqual(key, self.cache.get_key("IA_FullState", self.bounds, {'pipeline': [1]}, 26915))
+    self.assertNotEqual(key, self.cache.get_key("IA_FullState", self.bounds, {'pipeline': [2]}, 26915))
+    self.assertNotEqual(key, self.cache.get_key("IA_FullState", self.bounds, {'pipeline': [1]}, 4326))
+
+  def test_put_get(self):
+    raster = self.dir / "raster.tif"
+    raster.write_bytes(b"tif")
+    self.assertIsNone(self.cache.get("a" * 64))
+    self.cache.put("a" * 64, self.arrays, [raster])
+    cached = self.cache.get("a" * 64)
+    self.assertTrue(np.array_equal(cached['arrays'][0], self.arrays[0]))
+    self.assertEqual(cached['files']['raster.tif'].read_bytes(), b"tif")
+    stats = self.cache.stats()
+    self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+
+  def test_restore_files(self):
+    laz, tif = self.dir / "out" / "tile.laz", self.dir / "out" / "tile.tif"
+    laz.parent.mkdir()
+    laz.write_bytes(b"laz")
+    tif.write_bytes(b"tif")
+    self.cache.put("a" * 64, self.arrays, [laz, tif])
+    laz.unlink()
+    tif.unlink()
+    self.assertIsNotNone(self.cache.get("a" * 64, restore=[laz, tif]))
+    self.assertEqual((laz.read_bytes(), tif.read_bytes()), (b"laz", b"tif"))
+
+  def test_failed_restore_is_miss(self):
+    tif = self.dir / "tile.tif"
+    tif.write_bytes(b"tif")
+    self.cache.put("a" * 64, self.arrays, [tif])
+    tif.unlink()
+    # an entry losing its files, as when another process evicts it, is treated as a miss
+    (self.dir / "aa" / ("a" * 64) / "tile.tif").unlink()
+    self.assertIsNone(self.cache.get("a" * 64, restore=[tif]))
+    self.assertEqual(self.cache.stats()['misses'], 1)
+
+  def test_lru_eviction(self):
+    array = [np.zeros(50000)]
+    for key in ["a" * 64, "b" * 64]:
+      self.cache.put(key, array)
+      time.sleep(0.01)
+    self.cache.get("a" * 64)
+    self.cache.put("c" * 64, array)
+    self.assertIsNotNone(self.cache.get("a" * 64))
+    self.assertIsNone(self.cache.get("b" * 64))
+    self.assertLessEqual(self.cache.stats()['size'], 10 ** 6)
+
+  def test_concurrent_processes(self):
+    with Pool(4) as pool:
+      results = pool.map(put_entry, [(self.dir, "d" * 64)] * 8)
+    self.assertListEqual(results, [sum(range(1000))] * 8)
+    self.assertEqual(self.cache.stats()['entries'], 1)
+
+
+if __name__ == '__main__':
+  unittest.main()
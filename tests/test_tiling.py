@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+import numpy as np
+import shapely
+from pathlib import Path
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from config import Config
+from point_cloud import PointCloud
+from fetch_lidar import FetchLidar
+from tiling import TileJob, TilePlanner
+
+CLOUD = np.column_stack((np.random.default_rng(27).random((3000, 2)) * [990, 590] + [1005, 2005], np.zeros(3000)))
+# xmin of the buffered bounds of tiles whose fetch fails
+FAILING = set()
+
+
+def fake_get_dep(self, bounds, polygon_str, region, resolution=None):
+  if bounds.xmin in FAILING:
+    raise RuntimeError("pipeline failed")
+  inside = shapely.contains_xy(shapely.from_wkt(polygon_str), CLOUD[:, 0], CLOUD[:, 1])
+  return PointCloud.from_xyz(CLOUD[inside], 3857)
+
+
+class TestTiling(unittest.TestCase):
+
+  def setUp(self):
+    self.polygon = shapely.box(1000, 2000, 2000, 2600)
+    self.planner = TilePlanner(tile_size=300, buffer=20)
+    rng = np.random.default_rng(27)
+    xyz = np.column_stack((rng.random(5000) * 1000 + 1000, rng.random(5000) * 600 + 2000, rng.random(5000)))
+    xyz[:2, :2] = [[2000, 2600], [1000, 2000]]
+    self.cloud = PointCloud.from_xyz(xyz, 3857)
+
+  def test_plan(self):
+    tiles = self.planner.plan(self.polygon)
+    self.assertEqual(len(tiles), 4 * 2)
+    tile = tiles[0]
+    self.assertEqual(tile.buffered.xmin, tile.bounds.xmin - 20)
+    self.assertTrue(shapely.from_wkt(tile.polygon_str).within(self.polygon))
+
+  def test_plan_exact_multiple(self):
+    # 1000 x 600 in tiles of 200 and 300 needs no extra row or column for points on the max edges
+    self.assertEqual(len(TilePlanner(tile_size=200, buffer=0).plan(self.polygon)), 5 * 3)
+    tiles = TilePlanner(tile_size=200, buffer=0).plan(self.polygon)
+    self.assertEqual(sum(len(tile.clip(self.cloud)) for tile in tiles), len(self.cloud))
+
+  def test_plan_skips_touching_tiles(self):
+    # the L-shaped polygon only touches the upper right tile along its edges
+    polygon = shapely.union(shapely.box(1000, 2000, 1200, 2100), shapely.box(1000, 2100, 1100, 2200))
+    for buffer in (0, 20):
+      tiles = TilePlanner(tile_size=100, buffer=buffer).plan(polygon)
+      self.assertListEqual(sorted(tile.id for tile in tiles), ["0_0", "0_1", "1_0"])
+      for tile in tiles:
+        self.assertIn(shapely.from_wkt(tile.polygon_str).geom_type, ("Polygon", "MultiPolygon"))
+
+  def test_job_id_includes_pipeline(self):
+    path = tempfile.mkdtemp()
+    raw = TileJob("IA_FullState", self.polygon, self.planner, 3857, path, {'pipeline': ["raw"]})
+    ground = TileJob("IA_FullState", self.polygon, self.planner, 3857, path, {'pipeline': ["ground"]})
+    self.assertNotEqual(raw.path, ground.path)
+    self.assertEqual(raw.path, TileJob("IA_FullState", self.polygon, self.planner, 3857, path, {'pipeline': ["raw"]}).path)
+    shutil.rmtree(path)
+
+  def test_clip_partitions_points(self):
+    tiles = self.planner.plan(self.polygon)
+    counts = [len(tile.clip(self.cloud)) for tile in tiles]
+    self.assertEqual(sum(counts), len(self.cloud))
+
+  def test_job_resume(self):
+    path = tempfile.mkdtemp()
+    tiles = self.planner.plan(self.polygon)
+    job = TileJob("IA_FullState", self.polygon, self.planner, 3857, path)
+    job.complete(tiles[0], tiles[0].clip(self.cloud))
+    job = TileJob("IA_FullState", self.polygon, self.planner, 3857, path)
+    self.assertEqual(len(job.pending(tiles)), len(tiles) - 1)
+    self.assertEqual(len(job.load(tiles[0])), len(tiles[0].clip(self.cloud)))
+    shutil.rmtree(path)
+
+
+@unittest.skipUnless(multiprocessing.get_start_method() == "fork", "stubs reach the workers through fork")
+class TestFetchTiled(unittest.TestCase):
+
+  def setUp(self):
+    self.jobs_path = Config.JOBS_PATH
+    Config.JOBS_PATH = Path(tempfile.mkdtemp())
+    patch = mock.patch.object(FetchLidar, "get_dep", fake_get_dep)
+    patch.start()
+    self.addCleanup(patch.stop)
+    self.fetcher = FetchLidar(epsg=3857, as_point_cloud=True, profile="raw")
+    self.polygon = shapely.box(1000, 2000, 2000, 2600)
+
+  def tearDown(self):
+    FAILING.clear()
+    shutil.rmtree(Config.JOBS_PATH)
+    Config.JOBS_PATH = self.jobs_path
+
+  def fetch(self):
+    return self.fetcher.fetch_tiled(self.polygon, "IA_FullState", tile_size=300, buffer=20, workers=2)
+
+  def get_manifest(self) -> list:
+    manifest, = Config.JOBS_PATH.glob("IA_FullState_*/manifest.json")
+    with open(manifest, 'r') as f:
+      return json.load(f)['completed']
+
+  def test_fetch_merges_tiles(self):
+    cloud = self.fetch()
+    self.assertEqual(len(cloud), len(CLOUD))
+    self.assertTrue(np.array_equal(np.sort(cloud.x), np.sort(CLOUD[:, 0])))
+    self.assertEqual(len(self.get_manifest()), 8)
+
+  def test_resume(self):
+    FAILING.add(1000 + 300 - 20)
+    with self.assertRaises(RuntimeError):
+      self.fetch()
+    self.assertEqual(len(self.get_manifest()), 6)
+    # only the two failed tiles of column 1 are fetched again, every other tile would fail now
+    FAILING.clear()
+    FAILING.update(1000 + 300 * i - 20 for i in (0, 2, 3))
+    self.assertEqual(len(self.fetch()), len(CLOUD))
+    self.assertEqual(len(self.get_manifest()), 8)
+
+  def test_profile_starts_new_job(self):
+    self.fetch()
+    self.fetcher.profile = "ground"
+    FAILING.add(1000 - 20)
+    with self.assertRaises(RuntimeError):
+      self.fetch()
+    self.assertEqual(len(list(Config.JOBS_PATH.glob("IA_FullState_*"))), 2)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,77 @@
+import os
+import sys
+import unittest
+import numpy as np
+import pyproj
+import shapely
+import geopandas as gpd
+
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from gpd_helper import GPDHelper
+from transform import get_transformer, transform_xy, transform_geometries
+
+
+class TestTransform(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.default_rng(27)
+    self.x = rng.random(10000) * 1000 - 10437000
+    self.y = rng.random(10000) * 1000 + 5148000
+    transformer = pyproj.Transformer.from_crs(3857, 26915, always_xy=True)
+    self.expected = transformer.transform(self.x, self.y)
+
+  def test_transformer_cache(self):
+    self.assertIs(get_transformer(3857, 26915), get_transformer(3857, 26915))
+    self.assertIsNot(get_transformer(3857, 26915), get_transformer(26915, 3857))
+
+  def test_crs_without_epsg(self):
+    # a CRS pyproj cannot match to an EPSG code, like many ESRI .prj files
+    custom = pyproj.CRS.from_proj4("+proj=tmerc +lat_0=0 +lon_0=-93.1 +k=0.9996 +x_0=500000 +y_0=0 +datum=NAD83 +units=m")
+    self.assertIsNone(custom.to_epsg())
+    self.assertIs(get_transformer(3857, custom), get_transformer(3857, custom.to_wkt()))
+    x, y = transform_xy(self.x, self.y, 3857, custom)
+    expected = pyproj.Transformer.from_crs(3857, custom, always_xy=True).transform(self.x, self.y)
+    self.assertTrue(np.allclose(x, expected[0]) and np.allclose(y, expected[1]))
+    df = gpd.GeoDataFrame(geometry=gpd.points_from_xy(*expected), crs=custom)
+    converted = GPDHelper(3857, 26915).covert_crs(df)
+    self.assertTrue(np.allclose(converted.geometry.x, self.expected[0], atol=1e-3))
+
+  def test_transform_xy(self):
+    x, y = transform_xy(self.x, self.y, 3857, 26915)
+    self.assertTrue(np.allclose(x, self.expected[0]) and np.allclose(y, self.expected[1]))
+    self.assertFalse(np.allclose(x, self.x))
+
+  def test_chunked_threads_inplace(self):
+    x, y = self.x.copy(), self.y.copy()
+    tx, ty = transform_xy(x, y, 3857, 26915, inplace=True, chunk_size=999, workers=4)
+    self.assertIs(tx, x)
+    self.assertTrue(np.array_equal(x, transform_xy(self.x, self.y, 3857, 26915)[0]))
+    with self.assertRaises(ValueError):
+      transform_xy(self.x[::2], self.y[::2], 3857, 26915, inplace=True)
+
+  def test_transform_geometries(self):
+    polygon = shapely.Polygon([(-10437000, 5148000, 1), (-10436000, 5148000, 2), (-10436000, 5149000, 3)])
+    transformed = transform_geometries(polygon, 3857, 26915)
+    expected = gpd.GeoSeries([polygon], crs=3857).to_crs(26915)[0]
+    self.assertTrue(shapely.equals_exact(transformed, expected, tolerance=1e-6))
+    self.assertTrue(transformed.has_z)
+
+  def test_covert_crs(self):
+    df = gpd.GeoDataFrame({'elevation': np.arange(len(self.x))},
+                          geometry=gpd.points_from_xy(self.x, self.y), crs="EPSG:3857")
+    converted = GPDHelper(3857, 26915).covert_crs(df.copy())
+    self.assertEqual(converted.crs.to_epsg(), 26915)
+    self.assertTrue(np.allclose(converted.geometry.x, self.expected[0]))
+    self.assertTrue(np.array_equal(converted['elevation'], df['elevation']))
+
+  def test_bound_from_polygon(self):
+    polygon = shapely.box(437000, 4641000, 437500, 4641400)
+    bound, polygon_str = GPDHelper(3857, 26915).get_bound_from_polygon(polygon)
+    expected = gpd.GeoSeries([polygon], crs=26915).to_crs(3857)[0]
+    xmin, ymin, xmax, ymax = expected.bounds
+    self.assertTrue(np.allclose(bound.get_bound_tuple(), ([xmin, xmax], [ymin, ymax])))
+    self.assertTrue(shapely.equals_exact(shapely.from_wkt(polygon_str), expected, tolerance=1e-6))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,45 @@
+import os
+import sys
+import unittest
+import matplotlib
+import numpy as np
+
+matplotlib.use("Agg")
+sys.path.append(os.path.abspath(os.path.join('../scripts')))
+from point_cloud import PointCloud
+from vis import Vis
+
+
+class TestVis(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.default_rng(27)
+    n = 20000
+    self.xyz = np.column_stack((rng.random(n) * 200 + 500000, rng.random(n) * 100 + 4600000, rng.random(n) * 30))
+    self.vis = Vis(PointCloud.from_xyz(self.xyz, epsg=26915))
+
+  def test_grid(self):
+    raster = self.vis.get_grid(bins=50, reducer="count")
+    self.assertEqual(raster.shape[1], 50)
+    self.assertIn(raster.shape[0], (25, 26))
+    self.assertEqual(raster.data.sum(), len(self.xyz))
+    self.assertEqual(raster.epsg, 26915)
+    self.assertAlmostEqual(np.nanmax(self.vis.get_grid(bins=50).data), self.xyz[:, 2].max())
+
+  def test_sample(self):
+    sample = self.vis.get_sample(point_budget=1000)
+    self.assertEqual(len(sample), 1000)
+    self.assertEqual(len(np.unique(sample, axis=0)), 1000)
+    self.assertTrue(np.array_equal(sample, self.vis.get_sample(point_budget=1000)))
+    self.assertEqual(len(self.vis.get_sample(point_budget=10 ** 6)), len(self.xyz))
+
+  def test_plots_do_not_write_files(self):
+    before = set(os.listdir('../assets/img')) if os.path.isdir('../assets/img') else set()
+    self.vis.plot_heatmap("tile", bins=50)
+    self.vis.render_3d(point_budget=1000)
+    after = set(os.listdir('../assets/img')) if os.path.isdir('../assets/img') else set()
+    self.assertEqual(before, after)
+
+
+if __name__ == '__main__':
+  unittest.main()